@@ -0,0 +1,161 @@
+"""
+Utilidades para no bloquear el event loop de la interfaz web
+
+BlockingPool ejecuta llamadas bloqueantes (ccxt/requests, lectura de JSON y
+logs, parada del bot, backtesting) en un pool de hilos con nombre y tamaño
+acotado. LoopLatencyProbe mide periódicamente cuánto tarda el event loop en
+despertar respecto a lo programado: si una llamada bloquea el loop, el
+retraso aparece en esta medida.
+"""
+import asyncio
+import functools
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+class BlockingPool:
+    def __init__(self, max_workers: int = 8, name: str = 'web-io'):
+        self.logger = logging.getLogger(__name__)
+        self.max_workers = max_workers
+        self.name = name
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+        return self._executor
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Ejecutar func(*args, **kwargs) en el pool sin bloquear el loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    def shutdown(self, wait: bool = False):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+
+class LoopLatencyProbe:
+    def __init__(self, interval: float = 0.05, window: int = 200):
+        self.interval = interval
+        self.samples = deque(maxlen=window)
+        self.max_lag_ms = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def reset(self):
+        self.samples.clear()
+        self.max_lag_ms = 0.0
+
+    async def _run(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag_ms = max(time.perf_counter() - expected, 0.0) * 1000
+            self.samples.append(lag_ms)
+            if lag_ms > self.max_lag_ms:
+                self.max_lag_ms = lag_ms
+
+    def stats(self) -> Dict:
+        samples = sorted(self.samples)
+        if not samples:
+            return {'samples': 0, 'last_ms': 0.0, 'p99_ms': 0.0, 'max_ms': self.max_lag_ms}
+        return {
+            'samples': len(samples),
+            'last_ms': round(self.samples[-1], 3),
+            'p99_ms': round(samples[min(int(len(samples) * 0.99), len(samples) - 1)], 3),
+            'max_ms': round(self.max_lag_ms, 3)
+        }
+
+
+if __name__ == "__main__":
+    # Demostración: latencia del loop mientras se llama a un exchange lento (stub)
+    def slow_exchange_call(delay: float = 0.5) -> float:
+        time.sleep(delay)  # simula fetch_balance / fetch_tickers lentos
+        return 1000.0
+
+    async def scenario(offload: bool) -> Dict:
+        pool = BlockingPool(max_workers=4)
+        probe = LoopLatencyProbe(interval=0.005)
+        probe.start()
+        await asyncio.sleep(0.05)
+        probe.reset()
+
+        for _ in range(3):
+            if offload:
+                await asyncio.gather(*(pool.run(slow_exchange_call, 0.3) for _ in range(4)))
+            else:
+                slow_exchange_call(0.3)
+        await asyncio.sleep(0.05)
+
+        await probe.stop()
+        pool.shutdown(wait=True)
+        return probe.stats()
+
+    async def routes_scenario() -> Dict:
+        """Rutas reales de la web (/api/portfolio y /api/snapshot) con el exchange lento"""
+        import httpx
+        import web_interface
+
+        class _SlowExchange:
+            calls = 0
+
+            def get_usdc_balance(self) -> float:
+                _SlowExchange.calls += 1
+                return slow_exchange_call(0.3)
+
+        exchange = _SlowExchange()
+        web_interface._get_exchange = lambda: exchange
+
+        probe = LoopLatencyProbe(interval=0.005)
+        transport = httpx.ASGITransport(app=web_interface.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+            probe.start()
+            # Ronda de calentamiento sin medir (imports perezosos, primera conexión del cliente)
+            await asyncio.gather(*(client.get(path) for path in ('/api/portfolio', '/api/snapshot')))
+            await asyncio.sleep(0.05)
+            probe.reset()
+
+            for _ in range(3):
+                # Sin caché: cada ronda llega al exchange lento
+                web_interface.balance_cache.clear()
+                web_interface.portfolio_cache.clear()
+                responses = await asyncio.gather(*(client.get(path) for path in ('/api/portfolio', '/api/snapshot')))
+                assert all(response.status_code == 200 for response in responses), \
+                    [response.status_code for response in responses]
+            await asyncio.sleep(0.05)
+
+            await probe.stop()
+        web_interface.blocking_pool.shutdown()
+        return {**probe.stats(), 'exchange_calls': exchange.calls}
+
+    inline = asyncio.run(scenario(offload=False))
+    offloaded = asyncio.run(scenario(offload=True))
+    print(f"Llamada inline:       latencia máxima del loop {inline['max_ms']:.1f} ms")
+    print(f"Llamada en el pool:   latencia máxima del loop {offloaded['max_ms']:.1f} ms "
+          f"(p99 {offloaded['p99_ms']:.1f} ms, {offloaded['samples']} muestras)")
+    assert offloaded['max_ms'] < 10, "El event loop se bloqueó más de 10 ms"
+
+    routes = asyncio.run(routes_scenario())
+    print(f"Rutas de la web:      latencia máxima del loop {routes['max_ms']:.1f} ms "
+          f"(p99 {routes['p99_ms']:.1f} ms, {routes['exchange_calls']} llamadas al exchange)")
+    assert routes['exchange_calls'] > 0, "Las rutas no llegaron al exchange"
+    assert routes['max_ms'] < 10, "Las rutas de la web bloquearon el event loop más de 10 ms"
+    print("✅ Latencia del event loop < 10 ms con el exchange lento en el pool")
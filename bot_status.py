@@ -1,46 +1,49 @@
 #!/usr/bin/env python3
 """
 Almacenamiento compartido del estado del bot
+
+El estado se publica en un canal de memoria compartida (shm_channel): el
+dashboard lo lee sin abrir ni parsear archivos y nunca ve una escritura a
+medias.
 """
-import json
-import os
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Optional
+
+from shm_channel import SharedMemoryChannel
+
+_channel: Optional[SharedMemoryChannel] = None
+
+
+def _get_channel() -> SharedMemoryChannel:
+    global _channel
+    if _channel is None:
+        _channel = SharedMemoryChannel('bot_status', capacity=4096)
+    return _channel
 
-STATUS_FILE = 'data/bot_status.json'
 
 def save_status(is_running: bool, last_activity: datetime = None):
     """Guardar estado del bot"""
     try:
-        os.makedirs('data', exist_ok=True)
-        
         data = {
             'running': is_running,
             'last_update': (last_activity or datetime.now()).isoformat()
         }
-        
-        with open(STATUS_FILE, 'w') as f:
-            json.dump(data, f, indent=2)
-            
+        _get_channel().publish(data)
+
     except Exception as e:
         print(f"Error guardando estado: {e}")
 
 def load_status() -> Dict:
     """Cargar estado del bot"""
     try:
-        if not os.path.exists(STATUS_FILE):
-            return {
-                'running': False,
-                'last_update': datetime.now().isoformat()
-            }
-        
-        with open(STATUS_FILE, 'r') as f:
-            return json.load(f)
-            
+        status = _get_channel().read()
+        if status is not None:
+            return status
+
     except Exception as e:
         print(f"Error cargando estado: {e}")
-        return {
-            'running': False,
-            'last_update': datetime.now().isoformat()
-        }
 
+    return {
+        'running': False,
+        'last_update': datetime.now().isoformat()
+    }
@@ -27,10 +27,10 @@ def cleanup_corrupted_files():
     print("🧹 Iniciando limpieza de archivos corruptos...")
     print("=" * 60)
     
-    # Lista de archivos a limpiar
+    # Lista de archivos a limpiar (el estado del bot ya no se guarda en data/:
+    # va por el canal de memoria compartida de bot_status en Config.SHM_DIR)
     files_to_clean = [
         "open_positions.json",
-        "bot_status.json",
     ]
     
     for filename in files_to_clean:
@@ -80,15 +80,7 @@ def cleanup_corrupted_files():
             backup_file(filepath)
             
             # Crear archivo limpio
-            if filename == "open_positions.json":
-                clean_data = {}
-            elif filename == "bot_status.json":
-                clean_data = {
-                    "running": False,
-                    "last_update": datetime.now().isoformat()
-                }
-            else:
-                clean_data = {}
+            clean_data = {}
             
             try:
                 with open(filepath, 'w') as f:
@@ -16,6 +16,17 @@ class Config:
     # Configuración de Telegram
     TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
     TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
+    # Envío en segundo plano: API (configurable para pruebas), hilos, cola y reintentos
+    TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
+    TELEGRAM_WORKERS = int(os.getenv('TELEGRAM_WORKERS', 2))
+    TELEGRAM_QUEUE_SIZE = int(os.getenv('TELEGRAM_QUEUE_SIZE', 100))
+    TELEGRAM_MAX_RETRIES = int(os.getenv('TELEGRAM_MAX_RETRIES', 3))
+    TELEGRAM_TIMEOUT_SECONDS = float(os.getenv('TELEGRAM_TIMEOUT_SECONDS', 10))
+    # Límites de Telegram (~1 msg/s por chat, ~30/s en total) y ventana de agrupación en resúmenes
+    TELEGRAM_CHAT_RATE_PER_SECOND = float(os.getenv('TELEGRAM_CHAT_RATE_PER_SECOND', 1))
+    TELEGRAM_CHAT_BURST = int(os.getenv('TELEGRAM_CHAT_BURST', 3))
+    TELEGRAM_GLOBAL_RATE_PER_SECOND = float(os.getenv('TELEGRAM_GLOBAL_RATE_PER_SECOND', 30))
+    TELEGRAM_DIGEST_WINDOW_SECONDS = float(os.getenv('TELEGRAM_DIGEST_WINDOW_SECONDS', 2))
     
     # Configuración del bot
     INVESTMENT_AMOUNT = float(os.getenv('INVESTMENT_AMOUNT', 1000))
@@ -26,10 +37,14 @@ class Config:
     
     # Configuración de monitoreo
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    # Registros pendientes de escribir antes de empezar a descartar (el hot path nunca espera al disco)
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
     ENABLE_NOTIFICATIONS = os.getenv('ENABLE_NOTIFICATIONS', 'True').lower() == 'true'
     
     # Configuración de trading
     TIMEFRAME = '1h'
+    # Datos de mercado obtenidos por otro bot/proceso hace menos de esto se reutilizan
+    MARKET_DATA_MAX_AGE_SECONDS = float(os.getenv('MARKET_DATA_MAX_AGE_SECONDS', 60))
     # Solo 10 símbolos principales con mayor liquidez
     # Reducido para optimizar rendimiento con capital limitado
     SYMBOLS = [
@@ -58,7 +73,45 @@ class Config:
     # Gestión de riesgo
     MAX_DAILY_LOSS = 5.0  # Porcentaje máximo de pérdida diaria
     POSITION_SIZE_PERCENTAGE = 20  # Porcentaje del capital por posición
-    
+    TRAILING_STOP_PERCENTAGE = float(os.getenv('TRAILING_STOP_PERCENTAGE', 0))  # 0 = desactivado
+    BREAK_EVEN_TRIGGER_PERCENTAGE = float(os.getenv('BREAK_EVEN_TRIGGER_PERCENTAGE', 0))  # 0 = desactivado
+    PRICE_MONITOR_INTERVAL_SECONDS = float(os.getenv('PRICE_MONITOR_INTERVAL_SECONDS', 2))
+    MAX_LOTS_PER_SYMBOL = int(os.getenv('MAX_LOTS_PER_SYMBOL', 1))  # >1 permite escalar entradas
+    SCALE_OUT_PERCENTAGE = float(os.getenv('SCALE_OUT_PERCENTAGE', 100))  # % vendido por señal de venta
+    POSITION_ACCOUNTING_METHOD = os.getenv('POSITION_ACCOUNTING_METHOD', 'fifo').lower()  # fifo | average
+
+    # Analítica de riesgo de cartera (covarianza EWMA y VaR)
+    RISK_EWMA_DECAY = float(os.getenv('RISK_EWMA_DECAY', 0.94))
+    VAR_CONFIDENCE = float(os.getenv('VAR_CONFIDENCE', 0.99))
+    VAR_HISTORY_SIZE = int(os.getenv('VAR_HISTORY_SIZE', 500))  # velas en el buffer de VaR histórico
+    CORRELATION_THRESHOLD = float(os.getenv('CORRELATION_THRESHOLD', 0.8))
+    MAX_CORRELATED_EXPOSURE_PERCENTAGE = float(os.getenv('MAX_CORRELATED_EXPOSURE_PERCENTAGE', 0))  # 0 = desactivado
+    MAX_PORTFOLIO_VAR_PERCENTAGE = float(os.getenv('MAX_PORTFOLIO_VAR_PERCENTAGE', 0))  # 0 = desactivado
+    MAX_ASSET_EXPOSURE_PERCENTAGE = float(os.getenv('MAX_ASSET_EXPOSURE_PERCENTAGE', 0))  # 0 = desactivado
+
+    # Recuperación de estado (snapshot + WAL)
+    SNAPSHOT_INTERVAL_MINUTES = int(os.getenv('SNAPSHOT_INTERVAL_MINUTES', 15))
+    WAL_FSYNC = os.getenv('WAL_FSYNC', 'False').lower() == 'true'
+
+    # Interfaz web
+    PORTFOLIO_CACHE_TTL_SECONDS = float(os.getenv('PORTFOLIO_CACHE_TTL_SECONDS', 10))
+    BALANCE_CACHE_TTL_SECONDS = float(os.getenv('BALANCE_CACHE_TTL_SECONDS', 30))
+    WEB_WORKER_THREADS = int(os.getenv('WEB_WORKER_THREADS', 8))
+    DASHBOARD_CACHE_MAX_AGE_SECONDS = int(os.getenv('DASHBOARD_CACHE_MAX_AGE_SECONDS', 86400))
+    WS_CLIENT_QUEUE_SIZE = int(os.getenv('WS_CLIENT_QUEUE_SIZE', 100))
+    WS_SEND_TIMEOUT_SECONDS = float(os.getenv('WS_SEND_TIMEOUT_SECONDS', 10))
+    WEB_IMPORT_BUDGET_SECONDS = float(os.getenv('WEB_IMPORT_BUDGET_SECONDS', 0.5))
+    WEB_WORKERS = int(os.getenv('WEB_WORKERS', 1))
+    SHARED_STATE_DIR = os.getenv('SHARED_STATE_DIR', 'data/shared')
+    SNAPSHOT_MAX_AGE_SECONDS = float(os.getenv('SNAPSHOT_MAX_AGE_SECONDS', 30))
+    # Canales de estado bot -> dashboard en memoria compartida (tmpfs si está disponible)
+    SHM_DIR = os.getenv('SHM_DIR', '/dev/shm/crypto_bot' if os.path.isdir('/dev/shm') else 'data/shm')
+    # Socket Unix del puente de eventos bot -> web
+    BRIDGE_SOCKET = os.getenv('BRIDGE_SOCKET', os.path.join(SHM_DIR, 'bridge.sock'))
+    # Easypanel: bot y web en un solo proceso (supervisor.py) o en dos procesos
+    SUPERVISOR_MODE = os.getenv('SUPERVISOR_MODE', 'True').lower() == 'true'
+    SUPERVISOR_HEALTH_INTERVAL_SECONDS = float(os.getenv('SUPERVISOR_HEALTH_INTERVAL_SECONDS', 15))
+
     @classmethod
     def validate_config(cls):
         """Validar que la configuración sea correcta"""
@@ -2,6 +2,7 @@
 Bot principal de trading de criptomonedas
 """
 import time
+import threading
 import schedule
 import logging
 from datetime import datetime, timedelta
@@ -13,24 +14,63 @@ from exchange_manager import ExchangeManager
 from technical_analysis import TechnicalAnalysis
 from risk_manager import RiskManager
 from notifications import NotificationManager
+from state_recovery import StateRecovery
+from stop_engine import StopEngine
+from market_data import MarketUpdate, get_pipeline
 from logger_config import setup_logger, log_trade, log_signal, log_error, log_performance
+from metrics import counter, gauge, histogram
+from event_bus import (EventBus, TradeExecuted, PositionExited, FillRecorded, SignalGenerated,
+                       IndicatorsUpdated, StatusChanged, BotStarted, CycleCompleted, BotError, DailySummary,
+                       BLOCK)
+
+CYCLE_SECONDS = histogram('bot_cycle_duration_seconds', 'Duración del ciclo de trading')
+CYCLES = counter('bot_cycles_total', 'Ciclos de trading ejecutados', ['result'])
+SIGNALS = counter('bot_signals_total', 'Señales generadas por símbolo', ['symbol', 'signal'])
+OPEN_POSITIONS = gauge('bot_open_positions', 'Posiciones abiertas')
 
 class CryptoTradingBot:
     def __init__(self):
+        self._init_started = time.perf_counter()
+        
         # Configurar logging
         self.logger = setup_logger('crypto_bot')
         self.trades_logger = setup_logger('trades')
         
         # Inicializar componentes
+        self.recovery = StateRecovery()
         self.exchange = ExchangeManager()
         self.ta = TechnicalAnalysis()
-        self.risk_manager = RiskManager()
+        self.risk_manager = RiskManager(self.recovery)
+        self.risk_manager.rules.limits.set_min_notional(self.exchange.get_min_notionals(Config.SYMBOLS))
         self.notifications = NotificationManager()
         
+        # Notificaciones, logs y persistencia se procesan fuera del ciclo
+        self.events = EventBus()
+        self._subscribe_consumers()
+        self.risk_manager.add_fill_listener(
+            lambda event, symbol: self.events.publish(FillRecorded(event, symbol))
+        )
+        
+        # El motor de stops sondea precios y envía salidas con su propio cliente ccxt
+        self.stop_exchange = self.exchange.thread_client()
+        self.stop_engine = StopEngine(
+            self.risk_manager, self._handle_position_exit, price_source=self.stop_exchange.get_tickers
+        )
+        
+        # Serializa las salidas del ciclo de análisis y del motor de stops
+        self._exit_lock = threading.RLock()
+        
         # Estado del bot
         self.is_running = False
         self.last_check_time = None
         
+        # Velas (pipeline compartido con los demás bots) y últimas señales por
+        # símbolo; se restauran del snapshot
+        self.market_data = get_pipeline(self.exchange, self.ta)
+        self.market_data.subscribe(self._journal_candles)
+        self.last_signals: Dict[str, Dict] = {}
+        self._restore_market_state()
+        
         # Validar configuración
         try:
             Config.validate_config()
@@ -47,6 +87,9 @@ class CryptoTradingBot:
             # Programar tareas primero
             self._schedule_tasks()
             
+            # Primera decisión con el estado recuperado, antes de tocar la red
+            self._warm_start_decision()
+            
             # Probar conexiones (sin fallar si hay problemas)
             try:
                 self._test_connections()
@@ -54,13 +97,9 @@ class CryptoTradingBot:
                 self.logger.warning(f"⚠️ Error en conexiones: {e}")
                 self.logger.info("📋 Continuando sin verificar conexiones...")
             
-            # Notificar inicio
-            try:
-                self.notifications.notify_startup()
-            except Exception as e:
-                self.logger.warning(f"⚠️ Error en notificaciones: {e}")
-            
             self.is_running = True
+            self.events.publish(BotStarted())
+            self.stop_engine.start()
             self.logger.info("✅ Bot iniciado correctamente")
             
             # Loop principal
@@ -68,20 +107,27 @@ class CryptoTradingBot:
             
         except Exception as e:
             log_error(self.logger, e, "Error al iniciar bot")
-            try:
-                self.notifications.notify_error(str(e), "Inicio del bot")
-            except:
-                pass
+            self.events.publish(BotError(str(e), "Inicio del bot"))
             raise
     
     def stop(self):
         """Detener el bot"""
         self.logger.info("🛑 Deteniendo bot...")
         self.is_running = False
+        self.stop_engine.stop()
         
         # Cerrar todas las posiciones abiertas si es necesario
         self._close_all_positions("Bot detenido")
         
+        self._save_snapshot()
+        self.recovery.close()
+        
+        # Entregar los eventos pendientes (notificaciones, trades); el dispatcher
+        # sigue vivo para un Start posterior desde la web
+        self.events.publish(StatusChanged(False))
+        self.events.drain()
+        self.notifications.flush()
+        
         self.logger.info("✅ Bot detenido")
     
     def _test_connections(self):
@@ -116,6 +162,9 @@ class CryptoTradingBot:
         # Reiniciar métricas diarias a medianoche
         schedule.every().day.at("00:00").do(self._reset_daily_metrics)
         
+        # Snapshot periódico del estado (el WAL cubre lo intermedio)
+        schedule.every(Config.SNAPSHOT_INTERVAL_MINUTES).minutes.do(self._save_snapshot)
+        
         self.logger.info("📅 Tareas programadas correctamente")
     
     def _main_loop(self):
@@ -132,34 +181,108 @@ class CryptoTradingBot:
             self.stop()
         except Exception as e:
             log_error(self.logger, e, "Error en loop principal")
-            self.notifications.notify_error(str(e), "Loop principal")
+            self.events.publish(BotError(str(e), "Loop principal"))
             self.stop()
     
     def _run_trading_cycle(self):
         """Ejecutar ciclo de trading"""
+        started = time.perf_counter()
+        result = 'error'
         try:
             self.logger.info("🔄 Ejecutando ciclo de trading...")
             
             # Verificar métricas de riesgo
             account_balance = self.exchange.get_usdt_balance()
             if not self._check_risk_limits(account_balance):
+                result = 'risk_limited'
                 return
             
+            # Velas e indicadores de todos los símbolos en una sola actualización
+            updates = self.market_data.refresh()
+            
             # Analizar cada símbolo
             for symbol in Config.SYMBOLS:
+                update = updates.get(symbol)
+                if update is None:
+                    continue
                 try:
-                    self._analyze_symbol(symbol, account_balance)
+                    self._analyze_symbol(update, account_balance)
                 except Exception as e:
                     log_error(self.logger, e, f"Error analizando {symbol}")
                     continue
             
+            # Consolidar la vela del ciclo en la covarianza de cartera
+            self.risk_manager.analytics.flush()
+            
             # Verificar posiciones abiertas
             self._monitor_open_positions()
             
             self.last_check_time = datetime.now()
+            result = 'ok'
             
         except Exception as e:
             log_error(self.logger, e, "Error en ciclo de trading")
+        finally:
+            duration = time.perf_counter() - started
+            CYCLE_SECONDS.observe(duration)
+            CYCLES.labels(result).inc()
+            OPEN_POSITIONS.set(len(self.risk_manager.open_positions))
+            self.events.publish(IndicatorsUpdated(self._indicators_analysis()))
+            self.events.publish(StatusChanged(self.is_running, self.last_check_time))
+            self.events.publish(CycleCompleted(result, duration))
+    
+    def _indicators_analysis(self) -> Dict:
+        """Últimas señales por símbolo en el formato del almacén de indicadores"""
+        return {
+            symbol: {
+                'indicators': signals.get('indicators', {}),
+                'buy': signals.get('buy', False),
+                'sell': signals.get('sell', False),
+                'confidence': signals.get('confidence', 0.0),
+            }
+            for symbol, signals in self.last_signals.items()
+        }
+    
+    def _subscribe_consumers(self):
+        """Consumidores del bus: cada uno en su hilo, el ciclo sólo encola eventos"""
+        self.events.subscribe('notifications', self._notify_event,
+                              (TradeExecuted, PositionExited, BotStarted, BotError, DailySummary))
+        # El historial de trades y la persistencia no pueden perder eventos: esperan sitio en la cola
+        self.events.subscribe('trades_log', self._log_trade_event, (TradeExecuted, PositionExited),
+                              overflow=BLOCK)
+        self.events.subscribe('persistence', self._persist_event, (IndicatorsUpdated, StatusChanged),
+                              overflow=BLOCK)
+    
+    def _notify_event(self, event):
+        if isinstance(event, TradeExecuted):
+            self.notifications.notify_trade_executed(event.side, event.symbol, event.amount, event.price, event.pnl)
+        elif isinstance(event, PositionExited):
+            if 'stop loss' in event.reason.lower():
+                self.notifications.notify_stop_loss_triggered(event.symbol, event.price, event.pnl)
+            elif 'take profit' in event.reason.lower():
+                self.notifications.notify_take_profit_triggered(event.symbol, event.price, event.pnl)
+        elif isinstance(event, BotStarted):
+            self.notifications.notify_startup()
+        elif isinstance(event, BotError):
+            self.notifications.notify_error(event.message, event.context)
+        elif isinstance(event, DailySummary):
+            self.notifications.notify_daily_summary(event.metrics)
+    
+    def _log_trade_event(self, event):
+        if isinstance(event, TradeExecuted):
+            log_trade(self.trades_logger, event.side.upper(), event.symbol, event.amount, event.price,
+                      event.pnl, event.reason)
+        else:
+            log_trade(self.trades_logger, event.action.upper(), event.symbol, event.amount, event.price,
+                      event.pnl, event.reason)
+    
+    def _persist_event(self, event):
+        from bot_status import save_status
+        from indicators_store import save_indicators
+        if isinstance(event, IndicatorsUpdated):
+            save_indicators(event.indicators)
+        else:
+            save_status(event.running, event.last_activity)
     
     def _check_risk_limits(self, account_balance: float) -> bool:
         """Verificar límites de riesgo"""
@@ -169,10 +292,10 @@ class CryptoTradingBot:
             # Verificar pérdida diaria máxima
             if metrics.get('daily_return', 0) <= -Config.MAX_DAILY_LOSS:
                 self.logger.warning(f"⚠️ Pérdida diaria máxima alcanzada: {metrics['daily_return']:.2f}%")
-                self.notifications.notify_error(
+                self.events.publish(BotError(
                     f"Pérdida diaria máxima alcanzada: {metrics['daily_return']:.2f}%",
                     "Límite de riesgo"
-                )
+                ))
                 return False
             
             return True
@@ -181,56 +304,56 @@ class CryptoTradingBot:
             log_error(self.logger, e, "Error verificando límites de riesgo")
             return False
     
-    def _analyze_symbol(self, symbol: str, account_balance: float):
-        self.logger.info(f"🔥 VERSIÓN NUEVA - Analizando {symbol}")
+    def _analyze_symbol(self, update: MarketUpdate, account_balance: float):
         """Analizar símbolo y ejecutar trades si es necesario"""
+        symbol = update.symbol
+        self.logger.info("🔥 VERSIÓN NUEVA - Analizando %s", symbol)
         try:
-            # Obtener datos OHLCV
-            ohlcv_data = self.exchange.get_ohlcv(symbol, Config.TIMEFRAME, 100)
-            if not ohlcv_data:
-                return
+            # Rendimientos de las velas cerradas para la covarianza de cartera
+            self.risk_manager.analytics.add_candles(symbol, update.candles)
             
-            # Preparar DataFrame
-            df = self.ta.prepare_dataframe(ohlcv_data)
-            if df.empty:
-                return
-            
-            # Generar señales
-            signals = self.ta.get_trading_signals(df)
+            # Señales calculadas por el pipeline (sólo se recalculan si cambiaron las velas)
+            signals = update.signals
+            self.last_signals[symbol] = signals
+            self.events.publish(SignalGenerated(symbol, signals))
             
             # Log de señales
             signal_type = "COMPRA" if signals.get("buy") else "VENTA" if signals.get("sell") else "Sin señales"
+            SIGNALS.labels(symbol, 'buy' if signals.get("buy") else 'sell' if signals.get("sell") else 'none').inc()
             confidence = signals.get("confidence", 0)
-            self.logger.info(f"🎯 {symbol}: {signal_type} - Confianza: {confidence}")
-            self.logger.info(f"✅ Señal loggeada para {symbol}, continuando...")
+            self.logger.info("🎯 %s: %s - Confianza: %s", symbol, signal_type, confidence)
+            self.logger.info("✅ Señal loggeada para %s, continuando...", symbol)
             
             # Obtener precio actual
             ticker = self.exchange.get_ticker(symbol)
             current_price = ticker.get('last', 0)
             
-            self.logger.info(f"🔍 DEBUG {symbol}: Buy={signals.get('buy', False)}, Sell={signals.get('sell', False)}, Confidence={signals.get('confidence', 0)}, Price={current_price}, Balance={account_balance}")
+            self.logger.info("🔍 DEBUG %s: Buy=%s, Sell=%s, Confidence=%s, Price=%s, Balance=%s", symbol,
+                             signals.get('buy', False), signals.get('sell', False), signals.get('confidence', 0),
+                             current_price, account_balance)
             
             if current_price == 0:
-                self.logger.warning(f"⚠️ Precio 0 para {symbol}")
+                self.logger.warning("⚠️ Precio 0 para %s", symbol)
                 return
             
             # Ejecutar trades basados en señales
             if signals['buy'] and signals['confidence'] > 40:  # Confianza en porcentaje (40%)
-                self.logger.info(f"💰 Intentando ejecutar compra para {symbol} - Confianza: {signals['confidence']}%, Balance: {account_balance}")
+                self.logger.info("💰 Intentando ejecutar compra para %s - Confianza: %s%%, Balance: %s",
+                                 symbol, signals['confidence'], account_balance)
                 self._execute_buy_order(symbol, current_price, account_balance, signals)
             elif signals['sell'] and signals['confidence'] > 40:  # Confianza en porcentaje (40%)
-                self.logger.info(f"💰 Intentando ejecutar venta para {symbol} - Confianza: {signals['confidence']}%")
+                self.logger.info("💰 Intentando ejecutar venta para %s - Confianza: %s%%", symbol, signals['confidence'])
                 self._execute_sell_order(symbol, current_price, signals)
             else:
-                self.logger.info(f"ℹ️ No se ejecuta trade para {symbol}: Buy={signals.get('buy', False)}, Sell={signals.get('sell', False)}, Confidence={signals.get('confidence', 0)}")
+                self.logger.info("ℹ️ No se ejecuta trade para %s: Buy=%s, Sell=%s, Confidence=%s", symbol,
+                                 signals.get('buy', False), signals.get('sell', False), signals.get('confidence', 0))
             
-            self.logger.info(f"✅ Análisis completado para {symbol}")
+            self.logger.info("✅ Análisis completado para %s", symbol)
                 
         except Exception as e:
-            self.logger.error(f"🚨 ERROR CRÍTICO analizando {symbol}: {str(e)}")
-            self.logger.error(f"🚨 Tipo de error: {type(e).__name__}")
-            import traceback
-            self.logger.error(f"🚨 Traceback completo: {traceback.format_exc()}")
+            self.logger.error("🚨 ERROR CRÍTICO analizando %s: %s", symbol, str(e))
+            self.logger.error("🚨 Tipo de error: %s", type(e).__name__)
+            self.logger.error("🚨 Traceback completo:", exc_info=True)
     
     def _execute_buy_order(self, symbol: str, price: float, account_balance: float, signals: Dict):
         """Ejecutar orden de compra"""
@@ -240,6 +363,9 @@ class CryptoTradingBot:
             # Calcular stop loss y take profit
             stop_loss = price * (1 - Config.STOP_LOSS_PERCENTAGE / 100)
             take_profit = price * (1 + Config.TARGET_PROFIT_PERCENTAGE / 100)
+            break_even_trigger = None
+            if Config.BREAK_EVEN_TRIGGER_PERCENTAGE > 0:
+                break_even_trigger = price * (1 + Config.BREAK_EVEN_TRIGGER_PERCENTAGE / 100)
             
             # Calcular tamaño de posición
             position_size = self.risk_manager.calculate_position_size(
@@ -253,7 +379,7 @@ class CryptoTradingBot:
                 return
             
             # Validar trade
-            validation = self.risk_manager.validate_trade(symbol, 'buy', position_size, price)
+            validation = self.risk_manager.validate_trade(symbol, 'buy', position_size, price, account_balance)
             if not validation['valid']:
                 self.logger.warning(f"⚠️ Trade no válido para {symbol}: {validation['reason']}")
                 return
@@ -263,12 +389,13 @@ class CryptoTradingBot:
             if order and 'id' in order:
                 # Agregar a gestión de riesgo
                 self.risk_manager.add_position(
-                    symbol, 'buy', position_size, price, stop_loss, take_profit, order['id']
+                    symbol, 'buy', position_size, price, stop_loss, take_profit, order['id'],
+                    trailing_stop_percentage=Config.TRAILING_STOP_PERCENTAGE or None,
+                    break_even_trigger=break_even_trigger
                 )
                 
-                # Notificar
-                self.notifications.notify_trade_executed('buy', symbol, position_size, price)
-                log_trade(self.trades_logger, 'BUY', symbol, position_size, price, reason="Señal de compra")
+                # Notificar y registrar (fuera del ciclo)
+                self.events.publish(TradeExecuted('buy', symbol, position_size, price, reason="Señal de compra"))
                 
                 self.logger.info(f"✅ Orden de compra ejecutada: {symbol} - {position_size:.6f} @ ${price:.4f}")
             else:
@@ -279,6 +406,10 @@ class CryptoTradingBot:
     
     def _execute_sell_order(self, symbol: str, price: float, signals: Dict):
         """Ejecutar orden de venta (solo si hay posición abierta)"""
+        with self._exit_lock:
+            self._sell_open_position(symbol, price)
+    
+    def _sell_open_position(self, symbol: str, price: float):
         try:
             # Solo vender si tenemos posición abierta
             if symbol not in self.risk_manager.open_positions:
@@ -286,26 +417,33 @@ class CryptoTradingBot:
             
             position = self.risk_manager.open_positions[symbol]
             
+            # Salida parcial según SCALE_OUT_PERCENTAGE (100 = cerrar todo)
+            sell_amount = position.amount * min(Config.SCALE_OUT_PERCENTAGE, 100) / 100
+            
             # Validar trade
-            validation = self.risk_manager.validate_trade(symbol, 'sell', position['amount'], price)
+            validation = self.risk_manager.validate_trade(symbol, 'sell', sell_amount, price)
             if not validation['valid']:
                 self.logger.warning(f"⚠️ Venta no válida para {symbol}: {validation['reason']}")
                 return
             
             # Ejecutar orden
-            order = self.exchange.place_market_sell_order(symbol, position['amount'])
+            order = self.exchange.place_partial_exit_order(
+                symbol, 'sell', validation['adjusted_amount'], position.amount
+            )
             if order and 'id' in order:
-                # Cerrar posición
-                result = self.risk_manager.close_position(symbol, price, "Señal de venta")
+                sold = order.get('filled') or order.get('amount') or validation['adjusted_amount']
+                
+                # Cerrar posición (o la parte vendida)
+                result = self.risk_manager.close_position(symbol, price, "Señal de venta", amount=sold)
                 
                 if result['success']:
                     pnl = result['pnl']
+                    sold = result['amount']
                     
-                    # Notificar
-                    self.notifications.notify_trade_executed('sell', symbol, position['amount'], price, pnl)
-                    log_trade(self.trades_logger, 'SELL', symbol, position['amount'], price, pnl, "Señal de venta")
+                    # Notificar y registrar (fuera del ciclo)
+                    self.events.publish(TradeExecuted('sell', symbol, sold, price, pnl, "Señal de venta"))
                     
-                    self.logger.info(f"✅ Orden de venta ejecutada: {symbol} - {position['amount']:.6f} @ ${price:.4f} - PnL: ${pnl:.2f}")
+                    self.logger.info(f"✅ Orden de venta ejecutada: {symbol} - {sold:.6f} @ ${price:.4f} - PnL: ${pnl:.2f}")
                 else:
                     self.logger.error(f"❌ Error cerrando posición: {result['reason']}")
             else:
@@ -317,28 +455,27 @@ class CryptoTradingBot:
     def _monitor_open_positions(self):
         """Monitorear posiciones abiertas"""
         try:
-            for symbol, position in self.risk_manager.open_positions.items():
-                # Obtener precio actual
-                ticker = self.exchange.get_ticker(symbol)
-                current_price = ticker.get('last', 0)
-                
-                if current_price == 0:
-                    continue
-                
-                # Actualizar precio en gestión de riesgo
-                self.risk_manager.update_position_price(symbol, current_price)
-                
-                # Verificar stop loss y take profit
-                action_result = self.risk_manager.check_stop_loss_take_profit(symbol, current_price)
-                
-                if action_result['action'] != 'none':
-                    self._handle_position_exit(symbol, current_price, action_result)
+            symbols = list(self.risk_manager.open_positions.keys())
+            tickers = self.exchange.get_tickers(symbols)
+            
+            # Los precios se evalúan en el motor de stops (stops móviles y break-even)
+            for symbol in symbols:
+                self.stop_engine.push_price(symbol, tickers.get(symbol, {}).get('last') or 0)
+            
+            if not self.stop_engine.is_running:
+                self.stop_engine.process_pending()
                     
         except Exception as e:
             log_error(self.logger, e, "Error monitoreando posiciones")
     
     def _handle_position_exit(self, symbol: str, price: float, action_result: Dict):
-        """Manejar salida de posición"""
+        """Manejar salida de posición (desde el motor de stops, con su cliente del exchange)"""
+        with self._exit_lock:
+            if symbol not in self.risk_manager.open_positions:
+                return
+            self._exit_position(symbol, price, action_result)
+    
+    def _exit_position(self, symbol: str, price: float, action_result: Dict):
         try:
             position = self.risk_manager.open_positions[symbol]
             action = action_result['action']
@@ -346,9 +483,9 @@ class CryptoTradingBot:
             
             # Ejecutar orden de salida
             if action == 'sell':
-                order = self.exchange.place_market_sell_order(symbol, position['amount'])
+                order = self.stop_exchange.place_market_sell_order(symbol, position.amount)
             else:
-                order = self.exchange.place_market_buy_order(symbol, position['amount'])
+                order = self.stop_exchange.place_market_buy_order(symbol, position.amount)
             
             if order and 'id' in order:
                 # Cerrar posición
@@ -357,20 +494,20 @@ class CryptoTradingBot:
                 if result['success']:
                     pnl = result['pnl']
                     
-                    # Notificar según el tipo de salida
-                    if 'stop loss' in reason.lower():
-                        self.notifications.notify_stop_loss_triggered(symbol, price, pnl)
-                    elif 'take profit' in reason.lower():
-                        self.notifications.notify_take_profit_triggered(symbol, price, pnl)
-                    
-                    log_trade(self.trades_logger, action.upper(), symbol, position['amount'], price, pnl, reason)
+                    # Notificar según el tipo de salida y registrar (fuera del ciclo)
+                    self.events.publish(PositionExited(action, symbol, position.amount, price, pnl, reason))
                     
                     self.logger.info(f"✅ Posición cerrada: {symbol} - {reason} - PnL: ${pnl:.2f}")
                 else:
                     self.logger.error(f"❌ Error cerrando posición: {result['reason']}")
+            else:
+                # La orden no se ejecutó: mantener la posición protegida
+                self.logger.error(f"❌ Error ejecutando salida de {symbol}, disparadores rearmados")
+                self.risk_manager.rearm_triggers(symbol)
                     
         except Exception as e:
             log_error(self.logger, e, f"Error manejando salida de posición {symbol}")
+            self.risk_manager.rearm_triggers(symbol)
     
     def _close_all_positions(self, reason: str = "Bot detenido"):
         """Cerrar todas las posiciones abiertas"""
@@ -382,10 +519,10 @@ class CryptoTradingBot:
                 if current_price > 0:
                     position = self.risk_manager.open_positions[symbol]
                     
-                    if position['side'] == 'buy':
-                        order = self.exchange.place_market_sell_order(symbol, position['amount'])
+                    if position.side == 'buy':
+                        order = self.exchange.place_market_sell_order(symbol, position.amount)
                     else:
-                        order = self.exchange.place_market_buy_order(symbol, position['amount'])
+                        order = self.exchange.place_market_buy_order(symbol, position.amount)
                     
                     if order:
                         self.risk_manager.close_position(symbol, current_price, reason)
@@ -394,6 +531,86 @@ class CryptoTradingBot:
         except Exception as e:
             log_error(self.logger, e, "Error cerrando todas las posiciones")
     
+    def _journal_candles(self, updates: Dict[str, MarketUpdate]):
+        """Registrar en el WAL las velas recibidas en cada actualización del pipeline"""
+        for update in updates.values():
+            if update.new_rows:
+                self.recovery.append('candles', {'symbol': update.symbol, 'rows': update.new_rows,
+                                                 'replace': update.replaced})
+    
+    def _restore_market_state(self):
+        """Restaurar velas y señales desde snapshot + WAL"""
+        try:
+            recovered = self.recovery.load()
+            market = recovered.state.get('market', {})
+            self.market_data.load(market.get('candles', {}))
+            self.last_signals = market.get('signals', {})
+            
+            for event_type, payload in recovered.events:
+                if event_type == 'candles':
+                    self.market_data.merge(payload['symbol'], payload['rows'], payload.get('replace', False))
+                    
+        except Exception as e:
+            log_error(self.logger, e, "Error restaurando velas")
+            self.market_data.load({})
+            self.last_signals = {}
+    
+    def _warm_start_decision(self):
+        """Evaluar señales con las velas recuperadas sin esperar a la red"""
+        buffers = self.market_data.buffers
+        if not buffers:
+            self._save_snapshot()
+            return
+        
+        try:
+            actionable = False
+            for symbol, candles in list(buffers.items()):
+                signals = self.market_data.analyze(symbol, candles)
+                if signals is None:
+                    continue
+                
+                self.last_signals[symbol] = signals
+                if (signals.get('buy') or signals.get('sell')) and signals.get('confidence', 0) > 40:
+                    actionable = True
+                
+                # Verificar stop loss / take profit con el último cierre conocido
+                if symbol in self.risk_manager.open_positions:
+                    action_result = self.risk_manager.check_stop_loss_take_profit(symbol, candles[-1][4])
+                    actionable = actionable or action_result['action'] != 'none'
+            
+            elapsed_ms = (time.perf_counter() - self._init_started) * 1000
+            self.logger.info(f"⚡ Primera decisión tras reinicio en {elapsed_ms:.0f} ms ({len(buffers)} símbolos)")
+            
+            # Consolidar el WAL reproducido en un snapshot nuevo
+            self._save_snapshot()
+            
+            # Hay algo que ejecutar: ciclo completo inmediato con precios reales
+            if actionable:
+                self._run_trading_cycle()
+                
+        except Exception as e:
+            log_error(self.logger, e, "Error en decisión de arranque en caliente")
+    
+    def _save_snapshot(self):
+        """Guardar snapshot completo del estado"""
+        try:
+            # Copia del riesgo y secuencia del WAL en la misma sección crítica:
+            # los cierres del StopEngine mutan el libro y escriben el WAL bajo este lock
+            with self.risk_manager.lock:
+                risk_state = self.risk_manager.export_state()
+                seq = self.recovery.seq
+            
+            self.recovery.write_snapshot({
+                'risk': risk_state,
+                'market': {
+                    'candles': self.market_data.buffers,
+                    'signals': self.last_signals
+                },
+                'last_check_time': self.last_check_time
+            }, seq=seq)
+        except Exception as e:
+            log_error(self.logger, e, "Error guardando snapshot")
+    
     def _daily_summary(self):
         """Generar resumen diario"""
         try:
@@ -404,7 +621,7 @@ class CryptoTradingBot:
             log_performance(self.logger, metrics)
             
             # Notificar resumen
-            self.notifications.notify_daily_summary(metrics)
+            self.events.publish(DailySummary(metrics))
             
             self.logger.info("📊 Resumen diario generado")
             
@@ -2,6 +2,7 @@
 """
 Bot que se integra perfectamente con el dashboard
 """
+import asyncio
 import time
 import schedule
 import logging
@@ -16,20 +17,38 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from config import Config
 from exchange_manager import ExchangeManager
 from technical_analysis import TechnicalAnalysis
+from market_data import get_pipeline
 from risk_manager import RiskManager
 from logger_config import setup_logger
 from indicators_store import save_indicators
 from bot_status import save_status
+from event_bus import EventBus, IndicatorsUpdated, StatusChanged, FillRecorded, CycleCompleted, BLOCK
+from uds_bridge import BridgeServer
 
 class DashboardBot:
+    # Intervalo entre ciclos de análisis
+    CYCLE_SECONDS = 120
+    
     def __init__(self):
         self.logger = setup_logger('crypto_bot')  # Usar el mismo logger que el dashboard
         self.exchange = ExchangeManager()
         self.ta = TechnicalAnalysis()
+        self.market_data = get_pipeline(self.exchange, self.ta)
         self.risk_manager = RiskManager()
         self.is_running = False
         self.last_activity = datetime.now()
         self.last_analysis = {}  # Almacenar análisis de indicadores
+        self.last_cycle_finished = None  # time.monotonic() del último ciclo completado
+        
+        # La persistencia para el dashboard se hace fuera del ciclo y se avisa
+        # a la web por el puente de eventos (socket Unix)
+        self.bridge = BridgeServer()
+        self.events = EventBus()
+        self.events.subscribe('persistence', self._persist_event, (IndicatorsUpdated, StatusChanged),
+                              overflow=BLOCK)
+        self.risk_manager.add_fill_listener(
+            lambda event, symbol: self.events.publish(FillRecorded(event, symbol))
+        )
         
     def start(self):
         """Iniciar el bot"""
@@ -37,11 +56,9 @@ class DashboardBot:
             self.logger.info("🤖 Iniciando bot de trading de criptomonedas...")
             
             # Programar tareas
-            schedule.every(2).minutes.do(self._run_trading_cycle)
+            schedule.every(self.CYCLE_SECONDS).seconds.do(self._run_trading_cycle)
             
-            self.is_running = True
-            save_status(True, datetime.now())  # Guardar estado inicial
-            self.logger.info("✅ Bot iniciado correctamente")
+            self._begin()
             
             # Loop principal
             while self.is_running:
@@ -53,28 +70,40 @@ class DashboardBot:
         except Exception as e:
             self.logger.error(f"❌ Error: {e}")
     
+    def _begin(self):
+        self.bridge.start()
+        self.is_running = True
+        self.events.publish(StatusChanged(True))  # Guardar estado inicial
+        self.logger.info("✅ Bot iniciado correctamente")
+    
+    async def run_async(self):
+        """Bucle del bot dentro de un event loop compartido (supervisor); cada ciclo corre en un hilo"""
+        self.logger.info("🤖 Iniciando bot de trading de criptomonedas...")
+        self._begin()
+        while self.is_running:
+            await asyncio.to_thread(self._run_trading_cycle)
+            await asyncio.sleep(self.CYCLE_SECONDS)
+    
     def _run_trading_cycle(self):
         """Ejecutar ciclo de trading"""
+        started = time.perf_counter()
+        result = 'error'
         try:
             self.logger.info("🔄 Ejecutando ciclo de trading...")
             
+            # Una sola actualización de velas e indicadores para todos los símbolos
+            updates = self.market_data.refresh()
+            
             for symbol in Config.SYMBOLS:
                 try:
                     self.logger.info(f"📊 Analizando {symbol}...")
                     
-                    # Obtener datos OHLCV
-                    ohlcv_data = self.exchange.get_ohlcv(symbol, Config.TIMEFRAME, 100)
-                    if not ohlcv_data:
+                    # Señales del pipeline compartido (velas incrementales)
+                    update = updates.get(symbol)
+                    if update is None:
                         self.logger.warning(f"⚠️ No se pudieron obtener datos para {symbol}")
                         continue
-                    
-                    # Preparar DataFrame
-                    df = self.ta.prepare_dataframe(ohlcv_data)
-                    if df.empty:
-                        continue
-                    
-                    # Generar señales
-                    signals = self.ta.get_trading_signals(df)
+                    signals = update.signals
                     
                     # Guardar análisis de indicadores
                     self.last_analysis[symbol] = {
@@ -97,22 +126,34 @@ class DashboardBot:
                     self.logger.error(f"❌ Error analizando {symbol}: {e}")
                     continue
             
-            # Guardar indicadores en archivo compartido
-            save_indicators(self.last_analysis)
-            
-            # Actualizar estado del bot
-            save_status(True, self.last_activity)
+            # Publicar indicadores y estado para el dashboard
+            self.events.publish(IndicatorsUpdated(dict(self.last_analysis)))
+            self.events.publish(StatusChanged(True, self.last_activity))
             
+            self.last_cycle_finished = time.monotonic()
+            result = 'ok'
             self.logger.info("✅ Ciclo de trading completado")
             
         except Exception as e:
             self.logger.error(f"❌ Error en ciclo de trading: {e}")
+        finally:
+            self.events.publish(CycleCompleted(result, time.perf_counter() - started))
     
     def stop(self):
         """Detener el bot"""
         self.logger.info("🛑 Deteniendo bot...")
         self.is_running = False
-        save_status(False, datetime.now())  # Guardar estado de detenido
+        self.events.publish(StatusChanged(False))  # Guardar estado de detenido
+        self.events.drain()
+        self.bridge.stop()
+    
+    def _persist_event(self, event):
+        if isinstance(event, IndicatorsUpdated):
+            save_indicators(event.indicators)
+            self.bridge.publish('indicators', event.to_dict())
+        else:
+            save_status(event.running, event.last_activity)
+            self.bridge.publish('status', event.to_dict())
 
 # Instancia global del bot
 _bot_instance = None
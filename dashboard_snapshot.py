@@ -0,0 +1,77 @@
+"""
+Snapshot único del dashboard
+
+Reúne en un solo documento versionado las secciones del dashboard (estado,
+portafolio, indicadores, rendimiento, logs). El motor lo reconstruye una vez
+al final de cada ciclo y se sirve desde memoria; entre ciclos sólo se
+reconstruye bajo demanda si tiene más de `max_age` segundos. Así cada carga
+del dashboard es una única petición que no abre ni parsea archivos.
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class DashboardSnapshot:
+    def __init__(self, builders: Dict[str, Callable[[], Any]], max_age: float = 30.0):
+        self.logger = logging.getLogger(__name__)
+        self.builders = builders
+        self.max_age = max_age
+        # (versión, built_at, datos) en un solo atributo: los lectores sin lock
+        # nunca ven la versión de una construcción con los datos de otra
+        self._current: Tuple[int, float, Optional[Dict]] = (0, 0.0, None)
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> int:
+        return self._current[0]
+
+    @property
+    def built_at(self) -> float:
+        return self._current[1]
+
+    @property
+    def data(self) -> Optional[Dict]:
+        return self._current[2]
+
+    def rebuild(self) -> Tuple[int, Dict]:
+        """Construir todas las secciones una vez (p. ej. al terminar un ciclo del motor)"""
+        with self._lock:
+            return self._rebuild()
+
+    def _rebuild(self) -> Tuple[int, Dict]:
+        previous_version, _, previous = self._current
+        data = {}
+        for section, build in self.builders.items():
+            try:
+                data[section] = build()
+            except Exception as e:
+                self.logger.error(f"Error construyendo la sección {section} del snapshot: {e}")
+                data[section] = (previous or {}).get(section)
+        version = previous_version + 1
+        built_at = time.time()
+        data['version'] = version
+        data['built_at'] = datetime.fromtimestamp(built_at).isoformat()
+        self._current = (version, built_at, data)  # publicación atómica
+        return version, data
+
+    @staticmethod
+    def _fresh(current: Tuple[int, float, Optional[Dict]], max_age: float) -> bool:
+        return current[2] is not None and time.time() - current[1] <= max_age
+
+    def is_fresh(self) -> bool:
+        return self._fresh(self._current, self.max_age)
+
+    def get(self) -> Tuple[int, Dict]:
+        """Snapshot actual; se reconstruye sólo si no hay o está caducado"""
+        current = self._current
+        if self._fresh(current, self.max_age):
+            return current[0], current[2]
+        with self._lock:
+            # Otro hilo pudo reconstruirlo mientras esperábamos
+            current = self._current
+            if self._fresh(current, self.max_age):
+                return current[0], current[2]
+            return self._rebuild()
@@ -0,0 +1,342 @@
+"""
+Bus de eventos en proceso entre el motor de trading y sus consumidores
+
+El motor sólo publica eventos tipados (fills, señales, errores, cambios de
+estado); publicar es encolar en la cola acotada de cada suscriptor
+interesado, sin esperar al consumidor. Cada suscriptor (Telegram, logs,
+persistencia, WebSocket) consume su cola en su propio hilo, así que un
+consumidor lento o caído no retrasa el ciclo ni a los demás consumidores.
+
+Qué pasa si la cola de un suscriptor se llena lo decide cada suscriptor:
+DROP_OLDEST (por defecto) descarta el evento más antiguo, para consumidores
+en los que sólo importa lo reciente (Telegram, WebSocket); BLOCK espera hasta
+`block_timeout` a que haya sitio, para los que no deben perder eventos
+(historial de trades, persistencia). Todo descarte se cuenta y el primero de
+cada suscriptor se registra como error. La profundidad de cada cola, los
+descartes y la duración de los handlers se exponen en /metrics.
+"""
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Type
+
+from metrics import counter, gauge, histogram
+
+EVENTS_PUBLISHED = counter('event_bus_events_total', 'Eventos publicados por tipo', ['type'])
+QUEUE_DEPTH = gauge('event_bus_queue_depth', 'Eventos pendientes por suscriptor', ['subscriber'])
+EVENTS_DROPPED = counter('event_bus_dropped_total', 'Eventos descartados por cola llena', ['subscriber'])
+HANDLER_ERRORS = counter('event_bus_handler_errors_total', 'Errores en handlers', ['subscriber'])
+HANDLER_SECONDS = histogram('event_bus_handler_seconds', 'Duración de los handlers', ['subscriber'])
+
+DEFAULT_QUEUE_SIZE = 1000
+
+# Política con la cola llena
+DROP_OLDEST = 'drop_oldest'
+BLOCK = 'block'
+DEFAULT_BLOCK_TIMEOUT = 5.0
+
+_STOP = object()
+
+
+class Event:
+    """Base de los eventos del motor; `ts` es el momento de creación (epoch)"""
+
+    __slots__ = ('ts',)
+
+    def __init__(self):
+        self.ts = time.time()
+
+    @property
+    def type(self) -> str:
+        return type(self).__name__
+
+    def to_dict(self) -> Dict:
+        data = {'type': self.type, 'timestamp': datetime.fromtimestamp(self.ts).isoformat()}
+        for cls in type(self).__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                if name != 'ts':
+                    data[name] = getattr(self, name)
+        return data
+
+    def __repr__(self) -> str:
+        return f"{self.type}({self.to_dict()})"
+
+
+class TradeExecuted(Event):
+    """Orden ejecutada por una señal (compra o venta)"""
+
+    __slots__ = ('side', 'symbol', 'amount', 'price', 'pnl', 'reason')
+
+    def __init__(self, side: str, symbol: str, amount: float, price: float,
+                 pnl: Optional[float] = None, reason: str = ''):
+        super().__init__()
+        self.side = side
+        self.symbol = symbol
+        self.amount = amount
+        self.price = price
+        self.pnl = pnl
+        self.reason = reason
+
+
+class PositionExited(Event):
+    """Posición cerrada por stop loss, take profit o stop móvil"""
+
+    __slots__ = ('action', 'symbol', 'amount', 'price', 'pnl', 'reason')
+
+    def __init__(self, action: str, symbol: str, amount: float, price: float, pnl: float, reason: str):
+        super().__init__()
+        self.action = action
+        self.symbol = symbol
+        self.amount = amount
+        self.price = price
+        self.pnl = pnl
+        self.reason = reason
+
+
+class FillRecorded(Event):
+    """El RiskManager registró un fill (cambian posiciones y balance)"""
+
+    __slots__ = ('event', 'symbol')
+
+    def __init__(self, event: str, symbol: str):
+        super().__init__()
+        self.event = event
+        self.symbol = symbol
+
+
+class SignalGenerated(Event):
+    __slots__ = ('symbol', 'signals')
+
+    def __init__(self, symbol: str, signals: Dict):
+        super().__init__()
+        self.symbol = symbol
+        self.signals = signals
+
+
+class IndicatorsUpdated(Event):
+    """Análisis de indicadores de todos los símbolos al final de un ciclo"""
+
+    __slots__ = ('indicators',)
+
+    def __init__(self, indicators: Dict):
+        super().__init__()
+        self.indicators = indicators
+
+
+class StatusChanged(Event):
+    __slots__ = ('running', 'last_activity')
+
+    def __init__(self, running: bool, last_activity: Optional[datetime] = None):
+        super().__init__()
+        self.running = running
+        self.last_activity = last_activity or datetime.now()
+
+
+class BotStarted(StatusChanged):
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__(True)
+
+
+class CycleCompleted(Event):
+    __slots__ = ('result', 'duration')
+
+    def __init__(self, result: str, duration: float):
+        super().__init__()
+        self.result = result
+        self.duration = duration
+
+
+class BotError(Event):
+    __slots__ = ('message', 'context')
+
+    def __init__(self, message: str, context: str = ''):
+        super().__init__()
+        self.message = message
+        self.context = context
+
+
+class DailySummary(Event):
+    __slots__ = ('metrics',)
+
+    def __init__(self, metrics: Dict):
+        super().__init__()
+        self.metrics = metrics
+
+
+class Subscriber:
+    """Cola acotada + hilo consumidor de un suscriptor"""
+
+    def __init__(self, name: str, handler: Callable[[Event], None],
+                 event_types: Tuple[Type[Event], ...], max_queue: int,
+                 overflow: str = DROP_OLDEST, block_timeout: float = DEFAULT_BLOCK_TIMEOUT):
+        if overflow not in (DROP_OLDEST, BLOCK):
+            raise ValueError(f"Política de desbordamiento desconocida: {overflow}")
+        self.logger = logging.getLogger(__name__)
+        self.name = name
+        self.handler = handler
+        self.event_types = event_types
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.queue: 'queue.Queue' = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+
+        self._dropped = EVENTS_DROPPED.labels(name)
+        self._errors = HANDLER_ERRORS.labels(name)
+        self._seconds = HANDLER_SECONDS.labels(name)
+        QUEUE_DEPTH.labels(name).set_function(self.queue.qsize)
+
+        # Estadísticas
+        self.delivered = 0
+        self.dropped = 0
+
+    def accepts(self, event_type: type) -> bool:
+        return issubclass(event_type, self.event_types)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f'events-{self.name}', daemon=True)
+            self._thread.start()
+
+    def offer(self, event: Event):
+        """Encolar; con la cola llena se aplica la política del suscriptor"""
+        if self.overflow == BLOCK:
+            try:
+                self.queue.put(event, timeout=self.block_timeout)
+            except queue.Full:
+                self._count_dropped(event)
+            return
+
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    dropped = self.queue.get_nowait()
+                    self.queue.task_done()
+                    self._count_dropped(dropped)
+                except queue.Empty:
+                    pass
+
+    def _count_dropped(self, event: Event):
+        self.dropped += 1
+        self._dropped.inc()
+        if self.dropped == 1:
+            self.logger.error(f"❌ Cola del suscriptor {self.name} llena: se descartó {type(event).__name__} "
+                              f"(los siguientes descartes sólo se cuentan en event_bus_dropped_total)")
+
+    def _run(self):
+        while True:
+            event = self.queue.get()
+            try:
+                if event is _STOP:
+                    return
+                started = time.perf_counter()
+                try:
+                    self.handler(event)
+                    self.delivered += 1
+                except Exception as e:
+                    self._errors.inc()
+                    self.logger.error(f"Error en suscriptor {self.name} procesando {event.type}: {e}")
+                finally:
+                    self._seconds.observe(time.perf_counter() - started)
+            finally:
+                self.queue.task_done()
+
+    def stop(self, timeout: float):
+        if self._thread is None:
+            return
+        self.queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+
+class EventBus:
+    def __init__(self, max_queue: int = DEFAULT_QUEUE_SIZE):
+        self.logger = logging.getLogger(__name__)
+        self.max_queue = max_queue
+        self._subscribers: List[Subscriber] = []
+        # tipo de evento -> suscriptores interesados (se calcula la primera vez)
+        self._routes: Dict[type, Tuple[Subscriber, ...]] = {}
+        self._published: Dict[type, object] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, name: str, handler: Callable[[Event], None],
+                  event_types: Sequence[Type[Event]] = (Event,),
+                  max_queue: Optional[int] = None, overflow: str = DROP_OLDEST,
+                  block_timeout: float = DEFAULT_BLOCK_TIMEOUT) -> Subscriber:
+        """Registrar un consumidor de los eventos de `event_types` (y sus subclases).
+
+        `overflow` decide qué hacer con la cola llena: DROP_OLDEST o BLOCK (ver el módulo).
+        """
+        subscriber = Subscriber(name, handler, tuple(event_types), max_queue or self.max_queue,
+                                overflow, block_timeout)
+        with self._lock:
+            self._subscribers.append(subscriber)
+            self._routes = {}
+        subscriber.start()
+        return subscriber
+
+    def publish(self, event: Event):
+        """Entregar el evento a las colas de sus suscriptores (sólo espera a los BLOCK con la cola llena)"""
+        event_type = type(event)
+        subscribers = self._routes.get(event_type)
+        if subscribers is None:
+            with self._lock:
+                subscribers = tuple(s for s in self._subscribers if s.accepts(event_type))
+                self._routes[event_type] = subscribers
+                self._published[event_type] = EVENTS_PUBLISHED.labels(event_type.__name__)
+        self._published[event_type].inc()
+        for subscriber in subscribers:
+            subscriber.offer(event)
+
+    def drain(self, timeout: float = 5.0) -> bool:
+        """Esperar a que todos los suscriptores vacíen su cola"""
+        deadline = time.monotonic() + timeout
+        for subscriber in list(self._subscribers):
+            while subscriber.queue.unfinished_tasks:
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(0.01)
+        return True
+
+    def close(self, timeout: float = 5.0):
+        """Procesar lo pendiente y detener los hilos de los suscriptores"""
+        self.drain(timeout)
+        with self._lock:
+            subscribers, self._subscribers, self._routes = self._subscribers, [], {}
+        for subscriber in subscribers:
+            subscriber.stop(timeout)
+
+    def stats(self) -> Dict[str, Dict]:
+        return {
+            s.name: {'queued': s.queue.qsize(), 'delivered': s.delivered, 'dropped': s.dropped}
+            for s in self._subscribers
+        }
+
+
+if __name__ == "__main__":
+    # Benchmark: coste de publicar en el hot path con un consumidor lento (Telegram ~10 ms)
+    bus = EventBus(max_queue=100)
+    bus.subscribe('telegram', lambda event: time.sleep(0.01), (TradeExecuted, BotError))
+    bus.subscribe('trades_log', lambda event: None, (TradeExecuted,), overflow=BLOCK)
+
+    rounds = 50_000
+    started = time.perf_counter()
+    for i in range(rounds):
+        bus.publish(TradeExecuted('buy', 'BTC/USDC', 0.01, 50_000.0 + i))
+    publish_us = (time.perf_counter() - started) / rounds * 1e6
+
+    bus.drain(timeout=10)
+    stats = bus.stats()
+    bus.close()
+    print(f"publish(): {publish_us:.2f} µs por evento")
+    print(f"Suscriptores: {stats}")
+    assert stats['telegram']['delivered'] + stats['telegram']['dropped'] == rounds
+    assert stats['trades_log']['delivered'] == rounds, "trades_log (BLOCK) no debe perder eventos"
+    assert publish_us < 50, "Publicar no debe esperar a los consumidores"
+    print("✅ El hot path sólo encola")
@@ -6,6 +6,12 @@ import logging
 import time
 from typing import Dict, List, Optional, Tuple
 from config import Config
+from metrics import counter, histogram
+
+EXCHANGE_REQUEST_SECONDS = histogram('exchange_request_seconds', 'Latencia de las llamadas al exchange', ['method'])
+EXCHANGE_ERRORS = counter('exchange_errors_total', 'Llamadas al exchange con error', ['method'])
+ORDER_SECONDS = histogram('exchange_order_seconds', 'Tiempo de ida y vuelta de las órdenes', ['type', 'side'])
+ORDERS = counter('exchange_orders_total', 'Órdenes enviadas al exchange', ['type', 'side', 'result'])
 
 class ExchangeManager:
     def __init__(self):
@@ -16,15 +22,7 @@ class ExchangeManager:
     def _initialize_exchange(self):
         """Inicializar la conexión con Binance"""
         try:
-            self.exchange = ccxt.binance({
-                'apiKey': Config.BINANCE_API_KEY,
-                'secret': Config.BINANCE_SECRET_KEY,
-                'sandbox': Config.BINANCE_TESTNET,
-                'enableRateLimit': True,
-                'options': {
-                    'defaultType': 'spot',  # trading spot
-                }
-            })
+            self.exchange = self._create_client()
             
             # Cargar mercados sin fallar si hay error de autenticación
             try:
@@ -40,12 +38,39 @@ class ExchangeManager:
             self.logger.error(f"Error al conectar con Binance: {e}")
             raise
     
+    @staticmethod
+    def _create_client():
+        return ccxt.binance({
+            'apiKey': Config.BINANCE_API_KEY,
+            'secret': Config.BINANCE_SECRET_KEY,
+            'sandbox': Config.BINANCE_TESTNET,
+            'enableRateLimit': True,
+            'options': {
+                'defaultType': 'spot',  # trading spot
+            }
+        })
+    
+    def thread_client(self) -> 'ExchangeManager':
+        """Gestor con su propio cliente ccxt para usarlo desde otro hilo.
+        
+        Los clientes ccxt no son seguros entre hilos (sesión HTTP, limitador de
+        peticiones); se reutilizan los mercados ya cargados para no repetir load_markets.
+        """
+        clone = ExchangeManager.__new__(ExchangeManager)
+        clone.logger = self.logger
+        clone.exchange = self._create_client()
+        if self.exchange is not None and self.exchange.markets:
+            clone.exchange.set_markets(self.exchange.markets, self.exchange.currencies)
+        return clone
+    
+    @EXCHANGE_REQUEST_SECONDS.labels('fetch_balance').time()
     def get_account_balance(self) -> Dict:
         """Obtener balance de la cuenta"""
         try:
             balance = self.exchange.fetch_balance()
             return balance
         except Exception as e:
+            EXCHANGE_ERRORS.labels('fetch_balance').inc()
             self.logger.error(f"Error al obtener balance: {e}")
             return {}
     
@@ -59,73 +84,146 @@ class ExchangeManager:
         balance = self.get_account_balance()
         return balance.get('USDC', {}).get('free', 0.0)
     
+    @EXCHANGE_REQUEST_SECONDS.labels('fetch_ticker').time()
     def get_ticker(self, symbol: str) -> Dict:
         """Obtener precio actual de un símbolo"""
         try:
             ticker = self.exchange.fetch_ticker(symbol)
             return ticker
         except Exception as e:
+            EXCHANGE_ERRORS.labels('fetch_ticker').inc()
             self.logger.error(f"Error al obtener ticker para {symbol}: {e}")
             return {}
     
-    def get_ohlcv(self, symbol: str, timeframe: str = '1h', limit: int = 100) -> List:
-        """Obtener datos OHLCV para análisis técnico"""
+    @EXCHANGE_REQUEST_SECONDS.labels('fetch_tickers').time()
+    def get_tickers(self, symbols: List[str]) -> Dict:
+        """Obtener precios de varios símbolos en una sola llamada"""
+        if not symbols:
+            return {}
+        try:
+            return self.exchange.fetch_tickers(symbols)
+        except Exception as e:
+            EXCHANGE_ERRORS.labels('fetch_tickers').inc()
+            self.logger.error(f"Error al obtener tickers: {e}")
+            return {}
+    
+    @EXCHANGE_REQUEST_SECONDS.labels('fetch_ohlcv').time()
+    def get_ohlcv(self, symbol: str, timeframe: str = '1h', limit: int = 100,
+                  since: Optional[int] = None) -> List:
+        """Obtener datos OHLCV para análisis técnico (desde `since` en ms si se indica)"""
         try:
-            ohlcv = self.exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
+            ohlcv = self.exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=limit)
             return ohlcv
         except Exception as e:
+            EXCHANGE_ERRORS.labels('fetch_ohlcv').inc()
             self.logger.error(f"Error al obtener OHLCV para {symbol}: {e}")
             return []
     
+    def timeframe_ms(self, timeframe: str) -> int:
+        """Duración de una vela en milisegundos"""
+        return int(ccxt.Exchange.parse_timeframe(timeframe) * 1000)
+    
+    def get_min_notionals(self, symbols: List[str]) -> Dict[str, float]:
+        """Valor mínimo de orden por símbolo según los límites del mercado"""
+        minimums = {}
+        for symbol in symbols:
+            try:
+                limits = self.exchange.market(symbol).get('limits', {})
+                minimum = (limits.get('cost') or {}).get('min')
+                if minimum:
+                    minimums[symbol] = float(minimum)
+            except Exception as e:
+                self.logger.debug(f"Sin límites de mercado para {symbol}: {e}")
+        return minimums
+    
+    def amount_to_precision(self, symbol: str, amount: float) -> float:
+        """Redondear una cantidad a la precisión del mercado (salidas parciales)"""
+        try:
+            return float(self.exchange.amount_to_precision(symbol, amount))
+        except Exception as e:
+            self.logger.warning(f"No se pudo ajustar precisión de {symbol}: {e}")
+            return amount
+    
+    def place_partial_exit_order(self, symbol: str, side: str, amount: float, position_amount: float) -> Dict:
+        """Cerrar parte de una posición; si el resto no alcanza el mínimo del mercado se cierra entera"""
+        amount = self.amount_to_precision(symbol, min(amount, position_amount))
+        try:
+            limits = self.exchange.market(symbol).get('limits', {})
+            min_amount = (limits.get('amount') or {}).get('min') or 0.0
+        except Exception:
+            min_amount = 0.0
+        
+        if amount <= 0 or position_amount - amount < min_amount:
+            amount = position_amount
+        
+        if side == 'sell':
+            return self.place_market_sell_order(symbol, amount)
+        return self.place_market_buy_order(symbol, amount)
+    
+    @ORDER_SECONDS.labels('market', 'buy').time()
     def place_market_buy_order(self, symbol: str, amount: float) -> Dict:
         """Colocar orden de compra a mercado"""
         try:
             order = self.exchange.create_market_buy_order(symbol, amount)
             self.logger.info(f"Orden de compra ejecutada: {symbol} - Cantidad: {amount}")
+            ORDERS.labels('market', 'buy', 'ok').inc()
             return order
         except Exception as e:
+            ORDERS.labels('market', 'buy', 'error').inc()
             self.logger.error(f"Error al colocar orden de compra: {e}")
             return {}
     
+    @ORDER_SECONDS.labels('market', 'sell').time()
     def place_market_sell_order(self, symbol: str, amount: float) -> Dict:
         """Colocar orden de venta a mercado"""
         try:
             order = self.exchange.create_market_sell_order(symbol, amount)
             self.logger.info(f"Orden de venta ejecutada: {symbol} - Cantidad: {amount}")
+            ORDERS.labels('market', 'sell', 'ok').inc()
             return order
         except Exception as e:
+            ORDERS.labels('market', 'sell', 'error').inc()
             self.logger.error(f"Error al colocar orden de venta: {e}")
             return {}
     
+    @ORDER_SECONDS.labels('limit', 'buy').time()
     def place_limit_buy_order(self, symbol: str, amount: float, price: float) -> Dict:
         """Colocar orden de compra limitada"""
         try:
             order = self.exchange.create_limit_buy_order(symbol, amount, price)
             self.logger.info(f"Orden de compra limitada: {symbol} - Cantidad: {amount} - Precio: {price}")
+            ORDERS.labels('limit', 'buy', 'ok').inc()
             return order
         except Exception as e:
+            ORDERS.labels('limit', 'buy', 'error').inc()
             self.logger.error(f"Error al colocar orden de compra limitada: {e}")
             return {}
     
+    @ORDER_SECONDS.labels('limit', 'sell').time()
     def place_limit_sell_order(self, symbol: str, amount: float, price: float) -> Dict:
         """Colocar orden de venta limitada"""
         try:
             order = self.exchange.create_limit_sell_order(symbol, amount, price)
             self.logger.info(f"Orden de venta limitada: {symbol} - Cantidad: {amount} - Precio: {price}")
+            ORDERS.labels('limit', 'sell', 'ok').inc()
             return order
         except Exception as e:
+            ORDERS.labels('limit', 'sell', 'error').inc()
             self.logger.error(f"Error al colocar orden de venta limitada: {e}")
             return {}
     
+    @EXCHANGE_REQUEST_SECONDS.labels('fetch_open_orders').time()
     def get_open_orders(self, symbol: Optional[str] = None) -> List:
         """Obtener órdenes abiertas"""
         try:
             orders = self.exchange.fetch_open_orders(symbol)
             return orders
         except Exception as e:
+            EXCHANGE_ERRORS.labels('fetch_open_orders').inc()
             self.logger.error(f"Error al obtener órdenes abiertas: {e}")
             return []
     
+    @EXCHANGE_REQUEST_SECONDS.labels('cancel_order').time()
     def cancel_order(self, order_id: str, symbol: str) -> bool:
         """Cancelar una orden"""
         try:
@@ -133,24 +231,29 @@ class ExchangeManager:
             self.logger.info(f"Orden cancelada: {order_id}")
             return True
         except Exception as e:
+            EXCHANGE_ERRORS.labels('cancel_order').inc()
             self.logger.error(f"Error al cancelar orden {order_id}: {e}")
             return False
     
+    @EXCHANGE_REQUEST_SECONDS.labels('fetch_order').time()
     def get_order_status(self, order_id: str, symbol: str) -> Dict:
         """Obtener estado de una orden"""
         try:
             order = self.exchange.fetch_order(order_id, symbol)
             return order
         except Exception as e:
+            EXCHANGE_ERRORS.labels('fetch_order').inc()
             self.logger.error(f"Error al obtener estado de orden {order_id}: {e}")
             return {}
     
+    @EXCHANGE_REQUEST_SECONDS.labels('fetch_trading_fees').time()
     def get_trading_fees(self, symbol: str) -> Dict:
         """Obtener comisiones de trading"""
         try:
             fees = self.exchange.fetch_trading_fees(symbol)
             return fees
         except Exception as e:
+            EXCHANGE_ERRORS.labels('fetch_trading_fees').inc()
             self.logger.error(f"Error al obtener comisiones: {e}")
             return {}
     
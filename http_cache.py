@@ -0,0 +1,150 @@
+"""
+Capa de caché HTTP para la interfaz web: ETag, GET condicional y compresión
+
+Las respuestas se identifican por una versión de sus datos (mtime del archivo
+de indicadores, contador de rendimiento, hash de la configuración...). Con la
+versión se calcula un ETag fuerte antes de leer o serializar nada: si el
+cliente ya la tiene se responde 304 sin cuerpo. Si no, el JSON se serializa
+una vez por versión y sus variantes gzip/brotli se comprimen una sola vez.
+"""
+import gzip
+import hashlib
+import json
+import os
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional
+    brotli = None
+
+MIN_COMPRESS_SIZE = 1024
+NO_CACHE = 'no-cache'
+
+
+def make_etag(key: str, version: Hashable) -> str:
+    digest = hashlib.sha1(f"{key}:{version}".encode('utf-8')).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def file_version(path: str) -> Hashable:
+    """Versión barata de un archivo (sin leerlo): mtime en ns y tamaño"""
+    try:
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    candidates = [tag.strip() for tag in header.split(',')]
+    # Algunos proxies añaden el prefijo W/ al recomprimir
+    return etag in candidates or f'W/{etag}' in candidates
+
+
+def choose_encoding(request: Request) -> Optional[str]:
+    accepted = request.headers.get('accept-encoding', '').lower()
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+class CachedPayload:
+    """Cuerpo serializado de una versión, con sus variantes comprimidas"""
+
+    __slots__ = ('etag', 'body', 'media_type', 'encoded')
+
+    def __init__(self, etag: str, body: bytes, media_type: str):
+        self.etag = etag
+        self.body = body
+        self.media_type = media_type
+        self.encoded: Dict[str, bytes] = {}
+
+    def variant(self, encoding: Optional[str]) -> bytes:
+        if encoding is None or len(self.body) < MIN_COMPRESS_SIZE:
+            return self.body
+        data = self.encoded.get(encoding)
+        if data is None:
+            if encoding == 'br':
+                data = brotli.compress(self.body, quality=5)
+            else:
+                data = gzip.compress(self.body, compresslevel=6)
+            self.encoded[encoding] = data
+        return data
+
+    def precompress(self):
+        """Comprimir por adelantado (contenido estático)"""
+        self.variant('gzip')
+        if brotli is not None:
+            self.variant('br')
+
+    def response(self, request: Request, cache_control: str = NO_CACHE) -> Response:
+        headers = {'ETag': self.etag, 'Cache-Control': cache_control, 'Vary': 'Accept-Encoding'}
+        if etag_matches(request, self.etag):
+            return Response(status_code=304, headers=headers)
+
+        encoding = choose_encoding(request)
+        body = self.variant(encoding)
+        if body is not self.body:
+            headers['Content-Encoding'] = encoding
+        return Response(content=body, media_type=self.media_type, headers=headers)
+
+
+class HTTPCache:
+    def __init__(self):
+        self._entries: Dict[str, CachedPayload] = {}
+
+        # Estadísticas
+        self.not_modified = 0
+        self.rebuilt = 0
+
+    async def respond(self, request: Request, key: str, version: Hashable, build: Callable[[], Any],
+                      run: Optional[Callable[..., Awaitable]] = None,
+                      cache_control: str = NO_CACHE) -> Response:
+        """Responder con la versión `version` de `key`; `build` sólo se llama si cambió.
+
+        `run` ejecuta el trabajo bloqueante (lectura + serialización) fuera
+        del event loop, p. ej. BlockingPool.run.
+        """
+        etag = make_etag(key, version)
+        headers = {'ETag': etag, 'Cache-Control': cache_control, 'Vary': 'Accept-Encoding'}
+        if version is not None and etag_matches(request, etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+
+        entry = self._entries.get(key)
+        if entry is None or entry.etag != etag or version is None:
+            def serialize() -> CachedPayload:
+                body = json.dumps(build(), default=str).encode('utf-8')
+                return CachedPayload(etag, body, 'application/json')
+
+            entry = await run(serialize) if run else serialize()
+            self.rebuilt += 1
+            if version is not None:
+                self._entries[key] = entry
+
+        return entry.response(request, cache_control)
+
+    def invalidate(self, key: Optional[str] = None):
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+
+def static_payload(content: str, media_type: str = 'text/html; charset=utf-8') -> CachedPayload:
+    """Contenido estático con ETag por hash del contenido y variantes precomprimidas"""
+    body = content.encode('utf-8')
+    payload = CachedPayload(f'"{hashlib.sha1(body).hexdigest()[:20]}"', body, media_type)
+    payload.precompress()
+    return payload
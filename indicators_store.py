@@ -1,60 +1,60 @@
 #!/usr/bin/env python3
 """
 Almacenamiento compartido de indicadores entre el bot y el dashboard
+
+Los indicadores se publican en un canal de memoria compartida (shm_channel)
+en lugar de reescribir un archivo JSON: el bot publica un snapshot por ciclo
+y el dashboard sólo decodifica cuando la versión del canal cambia.
 """
-import json
-import os
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Optional
+
+from shm_channel import SharedMemoryChannel
+
+_channel: Optional[SharedMemoryChannel] = None
+
+
+def _get_channel() -> SharedMemoryChannel:
+    global _channel
+    if _channel is None:
+        _channel = SharedMemoryChannel('indicators')
+    return _channel
 
-INDICATORS_FILE = 'data/indicators.json'
 
 def save_indicators(indicators: Dict):
-    """Guardar indicadores en archivo JSON"""
+    """Publicar indicadores en el canal compartido"""
     try:
-        os.makedirs('data', exist_ok=True)
-        
         data = {
             'indicators': indicators,
             'timestamp': datetime.now().isoformat()
         }
-        
-        with open(INDICATORS_FILE, 'w') as f:
-            json.dump(data, f, indent=2)
-            
+        _get_channel().publish(data)
+
     except Exception as e:
         print(f"Error guardando indicadores: {e}")
 
 def load_indicators() -> Dict:
-    """Cargar indicadores desde archivo JSON"""
-    try:
-        if not os.path.exists(INDICATORS_FILE):
-            return {}
-        
-        with open(INDICATORS_FILE, 'r') as f:
-            data = json.load(f)
-            return data.get('indicators', {})
-            
-    except Exception as e:
-        print(f"Error cargando indicadores: {e}")
-        return {}
+    """Cargar indicadores desde el canal compartido"""
+    return get_indicators_with_timestamp().get('indicators', {})
 
 def get_indicators_with_timestamp() -> Dict:
     """Obtener indicadores con timestamp"""
     try:
-        if not os.path.exists(INDICATORS_FILE):
-            return {
-                'indicators': {},
-                'timestamp': datetime.now().isoformat()
-            }
-        
-        with open(INDICATORS_FILE, 'r') as f:
-            return json.load(f)
-            
+        data = _get_channel().read()
+        if data is not None:
+            return data
+
     except Exception as e:
         print(f"Error cargando indicadores: {e}")
-        return {
-            'indicators': {},
-            'timestamp': datetime.now().isoformat()
-        }
 
+    return {
+        'indicators': {},
+        'timestamp': datetime.now().isoformat()
+    }
+
+def indicators_version() -> Optional[int]:
+    """Versión de la última publicación (None si el bot aún no publicó nada)"""
+    try:
+        return _get_channel().version()
+    except Exception:
+        return None
@@ -35,6 +35,32 @@ class LogStreamer:
             
         return self.new_logs.copy()
     
+    def read_new_lines(self):
+        """Leer sólo las líneas añadidas desde la última lectura (sin acumularlas)"""
+        try:
+            if os.path.getsize(self.log_file_path) < self.last_position:
+                # Archivo truncado o rotado: empezar desde el principio
+                self.last_position = 0
+            
+            with open(self.log_file_path, 'r', encoding='utf-8') as f:
+                f.seek(self.last_position)
+                new_content = f.read()
+                self.last_position = f.tell()
+        except FileNotFoundError:
+            return []
+        except Exception as e:
+            print(f"Error reading logs: {e}")
+            return []
+        
+        return [line.strip() for line in new_content.split('\n') if line.strip()]
+    
+    def seek_end(self):
+        """Posicionar la lectura incremental al final del archivo"""
+        try:
+            self.last_position = os.path.getsize(self.log_file_path)
+        except OSError:
+            self.last_position = 0
+    
     def get_recent_logs(self, num_lines=10):
         """Obtener las últimas N líneas del log"""
         try:
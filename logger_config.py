@@ -1,16 +1,106 @@
 """
 Configuración de logging para el bot de trading
+
+Los loggers no escriben en disco ni en consola desde el hilo que registra:
+setup_logger les pone un QueueHandler que sólo encola el registro y un
+QueueListener por destino lo formatea y lo escribe en un hilo propio. Un
+disco lento nunca retrasa el ciclo de trading; si la cola se llena, el
+registro se descarta y se cuenta en log_records_dropped_total.
+
+En el hot path, usar formato %-style (`logger.info("%s: %s", a, b)`) con
+argumentos escalares: el mensaje sólo se construye si el nivel está activo, y
+en el hilo escritor. Con argumentos mutables (dicts, listas, excepciones) el
+mensaje se formatea al encolar, porque el llamador puede modificarlos antes
+de que se escriba; los tracebacks también se convierten a texto al encolar.
 """
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
+import threading
 from datetime import datetime
+from typing import Callable, Dict, List, Tuple
 from config import Config
+from metrics import counter, gauge
+
+LOG_RECORDS_DROPPED = counter('log_records_dropped_total', 'Registros de log descartados por cola llena', ['log'])
+LOG_QUEUE_DEPTH = gauge('log_queue_depth', 'Registros de log pendientes de escribir', ['log'])
+
+LOG_DIR = 'logs'
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Destino (archivo) -> QueueHandler compartido por todos los loggers que escriben en él
+_queue_handlers: Dict[str, logging.handlers.QueueHandler] = {}
+_listeners: List[logging.handlers.QueueListener] = []
+_lock = threading.Lock()
+
+# Argumentos que el hilo escritor puede formatear más tarde sin riesgo
+_SCALAR_ARGS = (str, int, float, bool, bytes, type(None))
+_exception_formatter = logging.Formatter()
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Encola el registro sin formatear si sus argumentos son escalares (lo formatea el listener)"""
+
+    def __init__(self, log_queue: queue.Queue, name: str):
+        super().__init__(log_queue)
+        self._dropped = LOG_RECORDS_DROPPED.labels(name)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Misma memoria de proceso: no hace falta serializarlo, sólo desligarlo del llamador
+        args = record.args
+        if args and (isinstance(args, dict) or not all(isinstance(arg, _SCALAR_ARGS) for arg in args)):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            # El texto basta al Formatter; así la cola no retiene los frames ni sus variables
+            if not record.exc_text:
+                record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self._dropped.inc()
+
+
+def _queue_handler(name: str, build_handlers: Callable[[], List[logging.Handler]]) -> logging.Handler:
+    """QueueHandler del destino `name`; la primera vez arranca su hilo escritor"""
+    with _lock:
+        handler = _queue_handlers.get(name)
+        if handler is None:
+            log_queue: queue.Queue = queue.Queue(maxsize=Config.LOG_QUEUE_SIZE)
+            listener = logging.handlers.QueueListener(log_queue, *build_handlers(), respect_handler_level=True)
+            listener.start()
+            LOG_QUEUE_DEPTH.labels(name).set_function(log_queue.qsize)
+            handler = _queue_handlers[name] = _NonBlockingQueueHandler(log_queue, name)
+            _listeners.append(listener)
+        return handler
+
+
+def shutdown_logging():
+    """Escribir lo pendiente y detener los hilos escritores (se llama al salir)"""
+    with _lock:
+        listeners, _listeners[:] = list(_listeners), []
+        _queue_handlers.clear()
+    for listener in listeners:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+atexit.register(shutdown_logging)
+
 
 def setup_logger(name: str = 'crypto_bot', level: str = None) -> logging.Logger:
     """Configurar sistema de logging"""
     
     # Crear directorio de logs si no existe
-    log_dir = 'logs'
+    log_dir = LOG_DIR
     if not os.path.exists(log_dir):
         os.makedirs(log_dir)
     
@@ -26,33 +116,22 @@ def setup_logger(name: str = 'crypto_bot', level: str = None) -> logging.Logger:
     if logger.handlers:
         return logger
     
-    # Crear formateador
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    
-    # Handler para archivo principal
     today = datetime.now().strftime('%Y-%m-%d')
     main_log_file = os.path.join(log_dir, f'crypto_bot_{today}.log')
-    file_handler = logging.FileHandler(main_log_file, encoding='utf-8')
-    file_handler.setLevel(numeric_level)
-    file_handler.setFormatter(formatter)
     
-    # Handler para archivo de trades
-    trades_log_file = os.path.join(log_dir, f'trades_{today}.log')
-    trades_handler = logging.FileHandler(trades_log_file, encoding='utf-8')
-    trades_handler.setLevel(logging.INFO)
-    trades_handler.setFormatter(formatter)
+    def build_handlers() -> List[logging.Handler]:
+        # Archivo principal y consola; el nivel lo filtra cada logger antes de encolar
+        formatter = logging.Formatter(LOG_FORMAT, datefmt=DATE_FORMAT)
+        file_handler = logging.FileHandler(main_log_file, encoding='utf-8')
+        file_handler.setFormatter(formatter)
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(formatter)
+        return [file_handler, console_handler]
     
-    # Handler para consola
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(numeric_level)
-    console_handler.setFormatter(formatter)
-    
-    # Agregar handlers al logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    logger.addHandler(_queue_handler(main_log_file, build_handlers))
+    # Ya escribe en consola desde el hilo de logs; sin propagar, el handler raíz
+    # (basicConfig de la web/supervisor) no duplica la línea de forma síncrona
+    logger.propagate = False
     
     return logger
 
@@ -61,20 +140,18 @@ def get_trades_logger() -> logging.Logger:
     logger = logging.getLogger('trades')
     
     if not logger.handlers:
-        log_dir = 'logs'
+        log_dir = LOG_DIR
         today = datetime.now().strftime('%Y-%m-%d')
         trades_log_file = os.path.join(log_dir, f'trades_{today}.log')
         
-        handler = logging.FileHandler(trades_log_file, encoding='utf-8')
-        handler.setLevel(logging.INFO)
-        
-        formatter = logging.Formatter(
-            '%(asctime)s - %(levelname)s - %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
-        handler.setFormatter(formatter)
+        def build_handlers() -> List[logging.Handler]:
+            handler = logging.FileHandler(trades_log_file, encoding='utf-8')
+            handler.setLevel(logging.INFO)
+            handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s',
+                                                   datefmt=DATE_FORMAT))
+            return [handler]
         
-        logger.addHandler(handler)
+        logger.addHandler(_queue_handler(trades_log_file, build_handlers))
         logger.setLevel(logging.INFO)
     
     return logger
@@ -92,24 +169,128 @@ def log_trade(logger: logging.Logger, trade_type: str, symbol: str, amount: floa
         'timestamp': datetime.now().isoformat()
     }
     
-    logger.info(f"TRADE: {trade_data}")
+    logger.info("TRADE: %s", trade_data)
 
 def log_signal(logger: logging.Logger, symbol: str, signal: dict):
     """Log específico para señales de trading"""
     if signal.get('buy', False):
-        logger.info(f"🎯 {symbol}: COMPRA - Confianza: {signal.get('confidence', 0)}")
+        logger.info("🎯 %s: COMPRA - Confianza: %s", symbol, signal.get('confidence', 0))
     elif signal.get('sell', False):
-        logger.info(f"🎯 {symbol}: VENTA - Confianza: {signal.get('confidence', 0)}")
+        logger.info("🎯 %s: VENTA - Confianza: %s", symbol, signal.get('confidence', 0))
     else:
-        logger.info(f"📊 {symbol}: Sin señales - Confianza: {signal.get('confidence', 0)}")
+        logger.info("📊 %s: Sin señales - Confianza: %s", symbol, signal.get('confidence', 0))
 
 def log_error(logger: logging.Logger, error: Exception, context: str = ''):
     """Log específico para errores"""
-    logger.error(f"ERROR {context}: {str(error)}", exc_info=True)
+    logger.error("ERROR %s: %s", context, error, exc_info=True)
 
 def log_performance(logger: logging.Logger, metrics: dict):
     """Log específico para métricas de rendimiento"""
-    logger.info(f"PERFORMANCE: {metrics}")
+    logger.info("PERFORMANCE: %s", metrics)
+
+
+if __name__ == "__main__":
+    # Benchmark: tiempo del hilo de trading por llamada de log, con disco normal y con bloqueos
+    import statistics
+    import sys
+    import tempfile
+    import time
+
+    LOG_DIR = tempfile.mkdtemp()
+    sys.stderr = open(os.devnull, 'w')  # la consola del benchmark no cuenta
+    signals = {'buy': True, 'sell': False, 'confidence': 62.5,
+               'indicators': {'rsi': 'sobreventa', 'ema': 'alcista', 'macd': 'alcista',
+                              'bollinger': 'banda inferior', 'stochastic': 'cruce alcista'}}
+
+    class StallingFileHandler(logging.FileHandler):
+        """Disco que se bloquea 20 ms cada 100 escrituras (fsync, disco de red lleno...)"""
+
+        def emit(self, record):
+            self.writes = getattr(self, 'writes', 0) + 1
+            if self.writes % 100 == 0:
+                time.sleep(0.02)
+            super().emit(record)
+
+    def sync_logger(name: str, file_handler: logging.Handler) -> logging.Logger:
+        """Configuración anterior: handlers síncronos en el logger"""
+        logger = logging.getLogger(name)
+        logger.propagate = False
+        formatter = logging.Formatter(LOG_FORMAT, datefmt=DATE_FORMAT)
+        console = logging.StreamHandler()
+        for handler in (file_handler, console):
+            handler.setFormatter(formatter)
+            logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        return logger
+
+    def queued_logger(name: str, build_file_handler) -> logging.Logger:
+        logger = logging.getLogger(name)
+        logger.propagate = False
+        formatter = logging.Formatter(LOG_FORMAT, datefmt=DATE_FORMAT)
+
+        def build_handlers():
+            handlers = [build_file_handler(), logging.StreamHandler()]
+            for handler in handlers:
+                handler.setFormatter(formatter)
+            return handlers
+        logger.addHandler(_queue_handler(name, build_handlers))
+        logger.setLevel(logging.INFO)
+        return logger
 
+    def cycle_f_strings(logger, symbol):
+        # Como _analyze_symbol antes: f-strings (se formatean siempre en el hilo de trading)
+        logger.info(f"🔥 VERSIÓN NUEVA - Analizando {symbol}")
+        logger.info(f"🎯 {symbol}: COMPRA - Confianza: {signals['confidence']}")
+        logger.info(f"✅ Señal loggeada para {symbol}, continuando...")
+        logger.info(f"🔍 DEBUG {symbol}: Buy={signals.get('buy')}, Sell={signals.get('sell')}, "
+                    f"Confidence={signals.get('confidence')}, Price=50000.0, Balance=1000.0")
+        logger.info(f"ℹ️ Señales completas {symbol}: {signals}")
+        logger.info(f"✅ Análisis completado para {symbol}")
+
+    def cycle_lazy(logger, symbol):
+        logger.info("🔥 VERSIÓN NUEVA - Analizando %s", symbol)
+        logger.info("🎯 %s: COMPRA - Confianza: %s", symbol, signals['confidence'])
+        logger.info("✅ Señal loggeada para %s, continuando...", symbol)
+        logger.info("🔍 DEBUG %s: Buy=%s, Sell=%s, Confidence=%s, Price=%s, Balance=%s", symbol,
+                    signals.get('buy'), signals.get('sell'), signals.get('confidence'), 50000.0, 1000.0)
+        logger.info("ℹ️ Señales completas %s: %s", symbol, signals)
+        logger.info("✅ Análisis completado para %s", symbol)
+
+    def measure(logger, cycle, cycles=500):
+        per_call = []
+        for n in range(cycles):
+            started = time.perf_counter()
+            cycle(logger, f"SYM{n % 10}/USDC")
+            per_call.append((time.perf_counter() - started) / 6 * 1e6)
+        per_call.sort()
+        return statistics.mean(per_call), per_call[int(len(per_call) * 0.99)], per_call[-1]
+
+    path = lambda name: os.path.join(LOG_DIR, f'{name}.log')
+    results = {
+        'síncrono': measure(sync_logger('bench.sync', logging.FileHandler(path('sync'))), cycle_f_strings),
+        'cola': measure(queued_logger('bench.queue', lambda: logging.FileHandler(path('queue'))), cycle_lazy),
+        'síncrono, disco con bloqueos': measure(
+            sync_logger('bench.sync_stall', StallingFileHandler(path('sync_stall'))), cycle_f_strings),
+        'cola, disco con bloqueos': measure(
+            queued_logger('bench.queue_stall', lambda: StallingFileHandler(path('queue_stall'))), cycle_lazy),
+    }
 
+    # Argumentos mutables: se escribe el valor del momento del log, no el posterior
+    snapshot_logger = queued_logger('bench.snapshot', lambda: logging.FileHandler(path('snapshot')))
+    performance = {'daily_pnl': 1.0}
+    log_performance(snapshot_logger, performance)
+    performance['daily_pnl'] = 2.0
+    shutdown_logging()  # escribe lo pendiente
 
+    sys.stderr = sys.__stderr__
+    print("Tiempo del hilo de trading por llamada de log (µs): media / p99 / máx")
+    for name, (mean, p99, worst) in results.items():
+        print(f"  {name:>30}: {mean:8.1f} / {p99:8.1f} / {worst:9.1f}")
+    with open(path('queue_stall'), encoding='utf-8') as f:
+        written = sum(1 for _ in f)
+    assert written == 500 * 6, "El hilo escritor debe escribir todos los registros"
+    assert results['cola, disco con bloqueos'][2] < 5000, "Un bloqueo del disco no debe llegar al hilo de trading"
+    print(f"✅ {written} líneas escritas; los bloqueos del disco no llegan al hilo de trading")
+    with open(path('snapshot'), encoding='utf-8') as f:
+        assert "'daily_pnl': 1.0" in f.read(), "Los argumentos mutables deben formatearse al encolar"
+    print("✅ Argumentos mutables formateados al encolar")
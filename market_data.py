@@ -0,0 +1,340 @@
+"""
+Pipeline único de datos de mercado: velas, normalización e indicadores
+
+Todas las variantes del bot obtenían las mismas velas de los mismos
+Config.SYMBOLS por su cuenta. El pipeline las obtiene una vez por ciclo y
+entrega el resultado a todos sus consumidores (el trader, la vista de
+indicadores del dashboard, los logs):
+
+- Velas incrementales: tras la primera carga sólo se piden las nuevas
+  (`since` = última vela conocida) y se fusionan en un buffer por símbolo.
+- Indicadores: sólo se recalculan para los símbolos cuyas velas cambiaron.
+- Grupo de procesos: el resultado se publica en un canal de memoria
+  compartida. Si otro proceso lo obtuvo hace menos de `max_age` segundos se
+  usa sin pedir nada al exchange; un flock evita que dos procesos lo pidan a
+  la vez (el segundo espera y reutiliza lo del primero).
+"""
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin coordinación entre procesos
+    fcntl = None
+
+from config import Config
+from metrics import counter, histogram
+from shm_channel import SharedMemoryChannel
+
+REFRESH_SECONDS = histogram('market_data_refresh_seconds', 'Duración de una actualización de datos de mercado')
+REFRESHES = counter('market_data_refreshes_total', 'Actualizaciones de datos de mercado', ['source'])
+CANDLES_FETCHED = counter('market_data_candles_fetched_total', 'Velas recibidas del exchange')
+
+DEFAULT_HISTORY = 100
+
+
+class MarketUpdate:
+    """Velas y señales actuales de un símbolo"""
+
+    __slots__ = ('symbol', 'candles', 'signals', 'new_rows', 'replaced', 'changed', 'updated_at')
+
+    def __init__(self, symbol: str, candles: List, signals: Dict, new_rows: Optional[List] = None,
+                 replaced: bool = False, changed: bool = True, updated_at: Optional[float] = None):
+        self.symbol = symbol
+        self.candles = candles
+        self.signals = signals
+        self.new_rows = new_rows or []  # velas recibidas en esta actualización (para el WAL)
+        self.replaced = replaced        # el buffer se recargó entero
+        self.changed = changed          # hubo velas nuevas o cambió la vela abierta
+        self.updated_at = updated_at or time.time()
+
+    @property
+    def price(self) -> float:
+        return self.candles[-1][4] if self.candles else 0.0
+
+
+class MarketDataPipeline:
+    def __init__(self, exchange=None, ta=None, symbols: Optional[Iterable[str]] = None,
+                 timeframe: Optional[str] = None, history: int = DEFAULT_HISTORY,
+                 max_age: Optional[float] = None, shared: bool = True):
+        self.logger = logging.getLogger(__name__)
+        self.exchange = exchange
+        self.ta = ta
+        self.symbols = list(symbols or Config.SYMBOLS)
+        self.timeframe = timeframe or Config.TIMEFRAME
+        self.history = history
+        self.max_age = Config.MARKET_DATA_MAX_AGE_SECONDS if max_age is None else max_age
+
+        self.buffers: Dict[str, List] = {}
+        self.latest: Dict[str, MarketUpdate] = {}
+        self.refreshed_at = 0.0
+        self._consumers: List[Callable[[Dict[str, MarketUpdate]], None]] = []
+        self._lock = threading.Lock()
+
+        # Coordinación entre procesos del mismo grupo (mismo SHM_DIR)
+        self.channel = SharedMemoryChannel(f"market_{self.timeframe}") if shared else None
+        self._group_lock_path = os.path.join(Config.SHM_DIR, f"market_{self.timeframe}.lock")
+        self._shared_version: Optional[int] = None
+
+    def subscribe(self, callback: Callable[[Dict[str, MarketUpdate]], None]):
+        """Registrar un consumidor; recibe {símbolo: MarketUpdate} tras cada actualización"""
+        self._consumers.append(callback)
+
+    def load(self, buffers: Dict[str, List]):
+        """Restaurar buffers de velas (p. ej. desde snapshot + WAL)"""
+        with self._lock:
+            self.buffers = {symbol: list(rows)[-self.history:] for symbol, rows in buffers.items()}
+
+    def merge(self, symbol: str, rows: List, replace: bool = False) -> bool:
+        """Fusionar velas nuevas (la última vela abierta se sobrescribe); True si cambió algo"""
+        buffer = [] if replace else self.buffers.get(symbol, [])
+        previous_last = buffer[-1] if buffer else None
+        first_ts = rows[0][0]
+        while buffer and buffer[-1][0] >= first_ts:
+            buffer.pop()
+        buffer.extend(rows)
+        self.buffers[symbol] = buffer[-self.history:]
+        return replace or list(rows[-1]) != list(previous_last or [])
+
+    def refresh(self, max_age: Optional[float] = None) -> Dict[str, MarketUpdate]:
+        """Actualizar todos los símbolos una vez y notificar a los consumidores.
+
+        Si otro hilo u otro proceso del grupo actualizó hace menos de
+        `max_age` segundos se reutiliza su resultado.
+        """
+        max_age = self.max_age if max_age is None else max_age
+        started = time.perf_counter()
+        with self._lock:
+            if self.latest and time.time() - self.refreshed_at <= max_age:
+                REFRESHES.labels('memory').inc()
+                return self.latest
+
+            with self._group_lock():
+                updates = self._from_group(max_age)
+                source = 'group'
+                if updates is None:
+                    updates = self._fetch_all()
+                    source = 'exchange'
+                    self._publish_group(updates)
+
+            self.latest = updates
+            self.refreshed_at = time.time()
+            REFRESHES.labels(source).inc()
+            REFRESH_SECONDS.observe(time.perf_counter() - started)
+
+        for callback in self._consumers:
+            try:
+                callback(updates)
+            except Exception as e:
+                self.logger.error(f"Error en consumidor de datos de mercado: {e}")
+        return updates
+
+    def analyze(self, symbol: str, candles: List) -> Optional[Dict]:
+        """Señales de un buffer de velas (también para el arranque en caliente); None sin datos"""
+        df = self.ta.prepare_dataframe(candles)
+        if df.empty:
+            return None
+        return self.ta.get_trading_signals(df)
+
+    def _fetch_all(self) -> Dict[str, MarketUpdate]:
+        updates = {}
+        for symbol in self.symbols:
+            try:
+                update = self._fetch_symbol(symbol)
+                if update is not None:
+                    updates[symbol] = update
+            except Exception as e:
+                self.logger.error(f"Error actualizando datos de {symbol}: {e}")
+        return updates
+
+    def _fetch_symbol(self, symbol: str) -> Optional[MarketUpdate]:
+        buffer = self.buffers.get(symbol)
+        since = None
+        if buffer:
+            # Si el hueco supera el buffer, pedir el histórico completo
+            gap = time.time() * 1000 - buffer[-1][0]
+            if gap < self.exchange.timeframe_ms(self.timeframe) * self.history:
+                since = buffer[-1][0]
+
+        rows = self.exchange.get_ohlcv(symbol, self.timeframe, self.history, since=since)
+        if not rows and not buffer:
+            return None
+        changed = False
+        if rows:
+            CANDLES_FETCHED.inc(len(rows))
+            changed = self.merge(symbol, rows, replace=since is None)
+
+        previous = self.latest.get(symbol)
+        if changed or previous is None:
+            signals = self.analyze(symbol, self.buffers[symbol])
+            if signals is None:
+                return None
+        else:
+            signals = previous.signals  # mismas velas: mismos indicadores
+        return MarketUpdate(symbol, self.buffers[symbol], signals, rows, since is None, changed)
+
+    # ------------------------------------------------------ grupo de procesos
+
+    def _group_lock(self):
+        return _FileLock(self._group_lock_path if self.channel is not None else None)
+
+    def _from_group(self, max_age: float) -> Optional[Dict[str, MarketUpdate]]:
+        """Resultado publicado por otro proceso si es reciente"""
+        if self.channel is None:
+            return None
+        version = self.channel.version()
+        if not version or version == self._shared_version:
+            return None  # nada publicado o es nuestra propia publicación
+        shared = self.channel.read()
+        if not shared or time.time() - shared.get('fetched_at', 0) > max_age:
+            return None
+
+        updates = {}
+        for symbol, entry in shared.get('symbols', {}).items():
+            if symbol not in self.symbols:
+                continue
+            candles = entry['candles']
+            changed = self.buffers.get(symbol, [])[-1:] != candles[-1:]
+            self.merge(symbol, candles, replace=True)
+            updates[symbol] = MarketUpdate(symbol, self.buffers[symbol], entry['signals'],
+                                           candles, True, changed, shared['fetched_at'])
+        self._shared_version = version
+        return updates
+
+    def _publish_group(self, updates: Dict[str, MarketUpdate]):
+        if self.channel is None:
+            return
+        try:
+            self.channel.publish({
+                'fetched_at': time.time(),
+                'symbols': {
+                    symbol: {'candles': update.candles, 'signals': update.signals}
+                    for symbol, update in updates.items()
+                },
+            })
+            self._shared_version = self.channel.version()
+        except Exception as e:
+            # Sin publicación cada proceso del grupo vuelve a pedir todo al exchange
+            self.logger.error(f"❌ No se pudieron compartir los datos de mercado con el grupo: {e}",
+                              exc_info=True)
+
+
+class _FileLock:
+    """flock exclusivo sobre un archivo (no-op sin ruta o sin fcntl)"""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path if fcntl is not None else None
+        self._fd: Optional[int] = None
+
+    def __enter__(self):
+        if self.path:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._fd is not None:
+            os.close(self._fd)  # libera el flock
+            self._fd = None
+        return False
+
+
+def read_shared(timeframe: Optional[str] = None) -> Dict:
+    """Últimos datos de mercado publicados por el grupo (sin exchange; p. ej. test_bot)"""
+    channel = SharedMemoryChannel(f"market_{timeframe or Config.TIMEFRAME}")
+    try:
+        return channel.read() or {}
+    finally:
+        channel.close()
+
+
+_pipeline: Optional[MarketDataPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline(exchange=None, ta=None) -> MarketDataPipeline:
+    """Pipeline compartido por todos los bots del proceso"""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            if exchange is None:
+                from exchange_manager import ExchangeManager
+                exchange = ExchangeManager()
+            if ta is None:
+                from technical_analysis import TechnicalAnalysis
+                ta = TechnicalAnalysis()
+            _pipeline = MarketDataPipeline(exchange, ta)
+        return _pipeline
+
+
+if __name__ == "__main__":
+    # Benchmark: tres variantes del bot (procesos) actualizando a la vez contra un exchange simulado
+    import multiprocessing
+    import tempfile
+
+    from technical_analysis import TechnicalAnalysis
+
+    Config.SHM_DIR = tempfile.mkdtemp()
+    HOUR_MS = 3_600_000
+
+    class FakeExchange:
+        """Velas sintéticas de 1h; cuenta las peticiones y las velas servidas"""
+
+        def __init__(self, requests, rows_served):
+            self.requests = requests
+            self.rows_served = rows_served
+
+        def timeframe_ms(self, timeframe):
+            return HOUR_MS
+
+        def get_ohlcv(self, symbol, timeframe, limit, since=None):
+            time.sleep(0.02)  # latencia de red
+            now = int(time.time() * 1000) // HOUR_MS * HOUR_MS
+            start = since if since is not None else now - (limit - 1) * HOUR_MS
+            rows = [[ts, 100.0 + i, 101.0 + i, 99.0 + i, 100.5 + i, 10.0]
+                    for i, ts in enumerate(range(start, now + 1, HOUR_MS))]
+            with self.requests.get_lock():
+                self.requests.value += 1
+                self.rows_served.value += len(rows)
+            return rows
+
+    def variant(requests, rows_served, barrier, cycles):
+        pipeline = MarketDataPipeline(FakeExchange(requests, rows_served), TechnicalAnalysis())
+        for _ in range(cycles):
+            barrier.wait()
+            pipeline.refresh(max_age=0.5)
+            time.sleep(0.6)  # > max_age: cada ciclo es una actualización nueva
+
+    def legacy(requests, rows_served):
+        """Un ciclo como antes: histórico completo por símbolo + indicadores siempre"""
+        exchange, ta = FakeExchange(requests, rows_served), TechnicalAnalysis()
+        for symbol in Config.SYMBOLS:
+            ta.get_trading_signals(ta.prepare_dataframe(exchange.get_ohlcv(symbol, Config.TIMEFRAME, 100)))
+
+    processes, cycles = 3, 3
+    results = {}
+    for name in ('antes', 'pipeline'):
+        requests, rows_served = multiprocessing.Value('i', 0), multiprocessing.Value('i', 0)
+        started = time.perf_counter()
+        if name == 'antes':
+            workers = [multiprocessing.Process(target=lambda: [legacy(requests, rows_served) for _ in range(cycles)])
+                       for _ in range(processes)]
+        else:
+            barrier = multiprocessing.Barrier(processes)
+            workers = [multiprocessing.Process(target=variant, args=(requests, rows_served, barrier, cycles))
+                       for _ in range(processes)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        results[name] = (requests.value, rows_served.value, time.perf_counter() - started)
+        print(f"{name:>8}: {requests.value} peticiones OHLCV, {rows_served.value} velas transferidas "
+              f"({processes} procesos x {cycles} ciclos, {len(Config.SYMBOLS)} símbolos)")
+
+    assert results['pipeline'][0] == cycles * len(Config.SYMBOLS), "Cada ciclo debe pedirse una sola vez por grupo"
+    assert results['pipeline'][1] < results['antes'][1] / 5
+    print("✅ Un solo fetch por símbolo y ciclo para todo el grupo, y sólo las velas nuevas")
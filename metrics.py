@@ -0,0 +1,349 @@
+"""
+Registro de métricas en proceso (contadores, gauges e histogramas)
+
+Las métricas se declaran una vez a nivel de módulo y se exponen en /metrics
+con el formato de texto de Prometheus. Los histogramas usan buckets fijos:
+observar un valor es una búsqueda binaria y tres sumas bajo un lock, sin
+reservar memoria. Las series con etiquetas se crean la primera vez que se
+usan y se reutilizan después (guardar el hijo de labels() en el hot path
+evita incluso la búsqueda en el diccionario).
+"""
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Buckets por defecto en segundos: de 1 ms a 60 s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Timer:
+    """Mide la duración de un bloque (with) o de una función (decorador)"""
+
+    __slots__ = ('_observe', '_started')
+
+    def __init__(self, observe: Callable[[float], None]):
+        self._observe = observe
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._observe(time.perf_counter() - self._started)
+        return False
+
+    def __call__(self, func: Callable) -> Callable:
+        observe = self._observe
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(time.perf_counter() - started)
+        return wrapper
+
+
+class CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class GaugeChild:
+    __slots__ = ('value', '_function')
+
+    def __init__(self):
+        self.value = 0.0
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set_function(self, function: Callable[[], float]):
+        """Calcular el valor en el momento de la exposición (p. ej. clientes conectados)"""
+        self._function = function
+
+    def get(self) -> float:
+        if self._function is not None:
+            try:
+                return float(self._function())
+            except Exception:
+                return float('nan')
+        return self.value
+
+
+class HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # el último es +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self) -> _Timer:
+        return _Timer(self.observe)
+
+
+class Metric:
+    """Familia de series con el mismo nombre y distintas etiquetas"""
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        # Mismo hijo indexado por los valores tal como llegan (p. ej. status 200 sin str())
+        self._lookup: Dict[Tuple, object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self._new_child()
+            self._children[()] = self._default
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values) -> object:
+        child = self._lookup.get(values)
+        if child is None:
+            key = tuple(str(value) for value in values)
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name}: se esperaban etiquetas {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+                self._lookup[values] = child
+        return child
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+    def samples(self) -> List[str]:
+        return [f'{self.name}{_label_text(self.labelnames, key)} {_format_value(child.value)}'
+                for key, child in list(self._children.items())]
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return GaugeChild()
+
+    def set(self, value: float):
+        self._default.set(value)
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default.dec(amount)
+
+    def set_function(self, function: Callable[[], float]):
+        self._default.set_function(function)
+
+    def samples(self) -> List[str]:
+        return [f'{self.name}{_label_text(self.labelnames, key)} {_format_value(child.get())}'
+                for key, child in list(self._children.items())]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def time(self) -> _Timer:
+        return self._default.time()
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, child in list(self._children.items()):
+            with child._lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_label_text(self.labelnames, key, le)} {cumulative}')
+            labels = _label_text(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs) -> Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, documentation, labelnames, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError(f"La métrica {name} ya existe con otro tipo")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        """Todas las métricas en formato de texto de Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+if __name__ == "__main__":
+    # Benchmark: coste por observación en microsegundos, con los patrones de uso reales
+    registry = MetricsRegistry()
+    requests_total = registry.counter('demo_requests_total', 'Peticiones', ['route'])
+    latency = registry.histogram('demo_latency_seconds', 'Latencia', ['method', 'route', 'status'])
+    persist = registry.histogram('demo_persist_seconds', 'Persistencia', ['file'])
+    series_counter = requests_total.labels('/api/status')
+    series_latency = latency.labels('GET', '/api/status', 200)
+
+    # Hijos cacheados por clave, como el middleware HTTP y RiskManager._save_json_safe
+    request_series = {}
+    persist_series = {}
+    routes = [('GET', '/api/status', 200), ('GET', '/api/portfolio', 200), ('POST', '/api/bot/start', 409)]
+    files = ['data/open_positions.json', 'data/trades_history.json', 'data/daily_metrics.json']
+
+    def timed(body: Callable[[int], None], rounds: int = 1_000_000) -> float:
+        started = time.perf_counter()
+        body(rounds)
+        return (time.perf_counter() - started) / rounds * 1e6
+
+    def loop(rounds):
+        for i in range(rounds):
+            pass
+
+    def counter_inc(rounds):
+        for i in range(rounds):
+            series_counter.inc()
+
+    def observe(rounds):
+        for i in range(rounds):
+            series_latency.observe(0.0042)
+
+    def labels_observe(rounds):
+        for i in range(rounds):
+            latency.labels(*routes[i % 3]).observe(0.0042)
+
+    def middleware(rounds):
+        for i in range(rounds):
+            method, path, status = routes[i % 3]
+            key = (method, path, status)
+            series = request_series.get(key)
+            if series is None:
+                series = request_series[key] = latency.labels(method, path, status)
+            series.observe(0.0042)
+
+    def persist_timer(rounds):
+        for i in range(rounds):
+            filepath = files[i % 3]
+            series = persist_series.get(filepath)
+            if series is None:
+                series = persist_series[filepath] = persist.labels(filepath.rsplit('/', 1)[-1])
+            with series.time():
+                pass
+
+    loop_us = timed(loop)
+    results = {
+        'Counter.inc()': timed(counter_inc) - loop_us,
+        'Histogram.observe()': timed(observe) - loop_us,
+        'labels(...).observe()': timed(labels_observe) - loop_us,
+        'middleware HTTP (hijo cacheado)': timed(middleware) - loop_us,
+        'persistencia (with hijo.time())': timed(persist_timer) - loop_us,
+    }
+    for name, cost in results.items():
+        print(f"{name + ':':34} {cost:.3f} µs")
+    print(registry.render().splitlines()[0])
+    for name in ('Histogram.observe()', 'middleware HTTP (hijo cacheado)'):
+        assert results[name] < 1.0, f"{name} supera 1 µs"
+    print("✅ Coste por observación < 1 µs")
@@ -1,38 +1,495 @@
 """
 Sistema de notificaciones para el bot de trading
+
+Los mensajes a Telegram no se envían desde quien los genera: se encolan en
+TelegramDispatcher (cola acotada, microsegundos) y un pool de hilos los
+entrega con una sesión HTTP reutilizada (keep-alive), reintentando con
+backoff exponencial y jitter ante errores de red, 5xx y 429.
+
+Para no chocar con los límites de Telegram (~1 mensaje/s por chat, ~30/s en
+total):
+
+- NotificationAggregator agrupa las notificaciones del mismo tipo que llegan
+  en una ventana corta (p. ej. veinte stop loss en un desplome) en un único
+  mensaje resumen.
+- El dispatcher sólo envía cuando hay token en el bucket del chat y en el
+  global; mientras espera, los mensajes pendientes del mismo chat se juntan
+  en una sola petición.
+- Los errores (PRIORITY_HIGH) salen antes que los trades y éstos antes que
+  la información (arranque, resúmenes, señales). Con la cola llena se
+  fusiona con un pendiente del mismo chat o se descarta el más antiguo de
+  menor prioridad.
 """
+import atexit
+import collections
+import random
+import threading
+import time
 import requests
 import logging
-from typing import Dict, Optional
+from typing import Callable, Deque, Dict, List, Optional
+from requests.adapters import HTTPAdapter
 from config import Config
+from metrics import counter, gauge, histogram
+
+TELEGRAM_MESSAGES = counter('telegram_messages_total', 'Mensajes de Telegram por resultado', ['result'])
+TELEGRAM_QUEUE_DEPTH = gauge('telegram_queue_depth', 'Mensajes de Telegram pendientes')
+TELEGRAM_SEND_SECONDS = histogram('telegram_send_seconds', 'Duración de cada petición a Telegram')
+TELEGRAM_DIGESTS = counter('telegram_digests_total', 'Resúmenes enviados por tipo de notificación', ['kind'])
+
+# Longitud máxima de un mensaje de Telegram
+MAX_MESSAGE_LENGTH = 4096
+MERGE_SEPARATOR = "\n\n➖➖➖\n\n"
+MAX_RETRY_DELAY = 30.0
+
+# Prioridades (menor = antes)
+PRIORITY_HIGH = 0    # errores
+PRIORITY_NORMAL = 1  # trades, stop loss, take profit
+PRIORITY_LOW = 2     # arranque, resumen diario, señales
+PRIORITIES = (PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW)
+
+
+class _Message:
+    __slots__ = ('chat_id', 'text', 'parse_mode', 'priority', 'count', 'attempts', 'enqueued_at')
+
+    def __init__(self, chat_id: str, text: str, parse_mode: str, priority: int):
+        self.chat_id = chat_id
+        self.text = text
+        self.parse_mode = parse_mode
+        self.priority = priority
+        self.count = 1  # notificaciones fusionadas en este mensaje
+        self.attempts = 0
+        self.enqueued_at = time.monotonic()
+
+    def absorb(self, other: '_Message') -> bool:
+        """Añadir el texto de otro mensaje del mismo chat si cabe en uno solo"""
+        if other.chat_id != self.chat_id or other.parse_mode != self.parse_mode:
+            return False
+        if len(self.text) + len(MERGE_SEPARATOR) + len(other.text) > MAX_MESSAGE_LENGTH:
+            return False
+        self.text += MERGE_SEPARATOR + other.text
+        self.count += other.count
+        return True
+
+
+class _TokenBucket:
+    """`rate` tokens por segundo con ráfagas de hasta `capacity` (rate 0 = sin límite)"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, now: float) -> float:
+        """Segundos hasta que haya un token (0 si ya lo hay)"""
+        if self.rate <= 0:
+            return 0.0
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def pause(self, seconds: float):
+        """No dar tokens durante `seconds` (p. ej. el retry_after de un 429)"""
+        if self.rate > 0:
+            self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+class TelegramDispatcher:
+    """Envío de mensajes a Telegram en segundo plano"""
+
+    def __init__(self, token: Optional[str] = None, base_url: Optional[str] = None,
+                 workers: Optional[int] = None, max_queue: Optional[int] = None,
+                 max_retries: Optional[int] = None, timeout: Optional[float] = None,
+                 retry_base: float = 0.5, chat_rate: Optional[float] = None,
+                 global_rate: Optional[float] = None):
+        self.logger = logging.getLogger(__name__)
+        self.token = token or Config.TELEGRAM_BOT_TOKEN
+        self.base_url = (base_url or Config.TELEGRAM_API_URL).rstrip('/')
+        self.workers = workers or Config.TELEGRAM_WORKERS
+        self.max_queue = max_queue or Config.TELEGRAM_QUEUE_SIZE
+        self.max_retries = Config.TELEGRAM_MAX_RETRIES if max_retries is None else max_retries
+        self.timeout = timeout or Config.TELEGRAM_TIMEOUT_SECONDS
+        self.retry_base = retry_base
+
+        # Límites de envío: un bucket por chat y uno global
+        self.chat_rate = Config.TELEGRAM_CHAT_RATE_PER_SECOND if chat_rate is None else chat_rate
+        self.chat_burst = Config.TELEGRAM_CHAT_BURST
+        global_rate = Config.TELEGRAM_GLOBAL_RATE_PER_SECOND if global_rate is None else global_rate
+        self._global_bucket = _TokenBucket(global_rate, global_rate)
+        self._chat_buckets: Dict[str, _TokenBucket] = {}
+
+        # Una conexión persistente por hilo de envío
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._queues: Dict[int, Deque[_Message]] = {priority: collections.deque() for priority in PRIORITIES}
+        self._size = 0
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._wait: Optional[float] = None
+        self._threads: List[threading.Thread] = []
+        self._stopped = threading.Event()
+        TELEGRAM_QUEUE_DEPTH.set_function(lambda: self._size)
+
+        # Estadísticas (en notificaciones; merged = fusionadas con otra)
+        self.requests = 0
+        self.sent = 0
+        self.failed = 0
+        self.merged = 0
+        self.dropped = 0
+        self.retries = 0
+        self.rate_limited = 0
+
+    @property
+    def url(self) -> str:
+        return f"{self.base_url}/bot{self.token}/sendMessage"
+
+    def submit(self, chat_id: str, text: str, parse_mode: str = 'HTML',
+               priority: int = PRIORITY_NORMAL) -> bool:
+        """Encolar un mensaje sin bloquear; False si se descartó"""
+        message = _Message(chat_id, text, parse_mode, priority)
+        with self._cond:
+            if self._stopped.is_set():
+                return False
+            if self._size >= self.max_queue:
+                pending = self._queues[priority]
+                if pending and pending[-1].absorb(message):
+                    self._count_merged(1)
+                    return True
+                if not self._compact() and not self._drop_lowest(priority):
+                    self._count_dropped()  # todo lo pendiente es más importante
+                    return False
+            self._queues[priority].append(message)
+            self._size += 1
+            if len(self._threads) < self.workers:
+                self._start_worker()
+            self._cond.notify()
+        return True
+
+    def _compact(self) -> bool:
+        """Fusionar mensajes consecutivos del mismo chat (sin cambiar el orden); True si liberó sitio"""
+        freed = 0
+        for priority, pending in self._queues.items():
+            compacted: Deque[_Message] = collections.deque()
+            for message in pending:
+                if compacted and compacted[-1].absorb(message):
+                    freed += 1
+                else:
+                    compacted.append(message)
+            self._queues[priority] = compacted
+        if freed:
+            self._size -= freed
+            self._count_merged(freed)
+        return freed > 0
+
+    def _drop_lowest(self, priority: int) -> bool:
+        """Descartar el pendiente más antiguo de la prioridad más baja, si no supera a `priority`"""
+        for level in reversed(PRIORITIES):
+            if level < priority:
+                return False
+            if self._queues[level]:
+                dropped = self._queues[level].popleft()
+                self._size -= 1
+                self._count_dropped(dropped.count)
+                return True
+        return False
+
+    def _count_merged(self, count: int):
+        self.merged += count
+        TELEGRAM_MESSAGES.labels('merged').inc(count)
+
+    def _count_dropped(self, count: int = 1):
+        self.dropped += count
+        TELEGRAM_MESSAGES.labels('dropped').inc(count)
+
+    def _count_failed(self, count: int):
+        self.failed += count
+        TELEGRAM_MESSAGES.labels('failed').inc(count)
+
+    def _chat_bucket(self, chat_id: str) -> _TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = _TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _next_message(self) -> Optional[_Message]:
+        """Siguiente mensaje a enviar si los buckets lo permiten (llamar con el lock tomado).
+
+        Recorre las colas por prioridad saltando los chats sin token (el resto de
+        chats no espera por ellos). Si no hay nada enviable devuelve None y deja
+        en `_wait` cuánto esperar. Al sacar un mensaje se le añaden los siguientes
+        del mismo chat y prioridad: mientras el chat está limitado, lo pendiente
+        se envía en menos peticiones.
+        """
+        now = time.monotonic()
+        self._wait = None
+        if self._size and self._global_bucket.wait_time(now) > 0:
+            self._wait = self._global_bucket.wait_time(now)
+            return None
+        blocked = set()
+        for priority in PRIORITIES:
+            pending = self._queues[priority]
+            for index, head in enumerate(pending):
+                if head.chat_id in blocked:
+                    continue
+                chat_bucket = self._chat_bucket(head.chat_id)
+                wait = chat_bucket.wait_time(now)
+                if wait > 0:
+                    blocked.add(head.chat_id)  # sus mensajes de menor prioridad tampoco pasan
+                    self._wait = wait if self._wait is None else min(self._wait, wait)
+                    continue
+                self._global_bucket.take()
+                chat_bucket.take()
+                del pending[index]
+                self._size -= 1
+                self._absorb_following(head, pending, index)
+                return head
+        return None
+
+    def _absorb_following(self, message: _Message, pending: Deque[_Message], start: int):
+        """Añadir al mensaje los siguientes del mismo chat en la cola mientras quepan"""
+        absorbed = 0
+        index = start
+        while index < len(pending):
+            other = pending[index]
+            if other.chat_id != message.chat_id:
+                index += 1
+                continue
+            if not message.absorb(other):
+                break
+            del pending[index]
+            absorbed += 1
+        if absorbed:
+            self._size -= absorbed
+            self._count_merged(absorbed)
+
+    def _start_worker(self):
+        thread = threading.Thread(target=self._run, name=f'telegram-{len(self._threads)}', daemon=True)
+        self._threads.append(thread)
+        thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopped.is_set():
+                        return
+                    message = self._next_message()
+                    if message is not None:
+                        break
+                    self._cond.wait(self._wait)  # None: cola vacía, esperar a submit()
+                self._in_flight += 1
+            try:
+                ok, retry_after, error = self._post(message.chat_id, message.text, message.parse_mode)
+                if ok is None and message.attempts < self.max_retries:
+                    self._retry(message, retry_after, error)
+                elif ok:
+                    self.sent += message.count
+                    self.requests += 1
+                    TELEGRAM_MESSAGES.labels('sent').inc(message.count)
+                else:
+                    self._give_up(error, message.attempts + 1)
+                    self._count_failed(message.count)
+            finally:
+                with self._cond:
+                    self._in_flight -= 1
+                    self._cond.notify_all()
+
+    def _retry(self, message: _Message, retry_after: Optional[float], error: str):
+        """Volver a poner el mensaje al frente de su cola.
+
+        Tras un 429 el bucket del chat ya está en pausa, así que el reintento pasa
+        por el limitador como cualquier otro mensaje; tras un error de red o 5xx el
+        hilo espera el backoff antes de devolverlo.
+        """
+        delay = retry_after if retry_after is not None else self._backoff(message.attempts)
+        message.attempts += 1
+        self.retries += 1
+        self.logger.warning(f"⚠️ Telegram: {error}; reintento en {delay:.2f}s")
+        # Sin limitador (rate 0) la pausa del 429 la hace el hilo
+        if (retry_after is None or self.chat_rate <= 0) and self._stopped.wait(delay):
+            # close() durante la espera: el mensaje no se volverá a enviar
+            self._give_up(f"{error} (dispatcher cerrado antes del reintento)", message.attempts)
+            self._count_failed(message.count)
+            return
+        with self._cond:
+            self._queues[message.priority].appendleft(message)
+            self._size += 1
+
+    def _backoff(self, attempt: int) -> float:
+        """Backoff exponencial con jitter completo"""
+        return random.uniform(0, min(MAX_RETRY_DELAY, self.retry_base * 2 ** attempt))
+
+    def _give_up(self, error: str, attempts: int):
+        self.logger.error(f"Error al enviar notificación a Telegram tras {attempts} intentos: {error}")
+
+    def _post(self, chat_id: str, text: str, parse_mode: str):
+        """Un intento de envío: (True, None, '') si se entregó, (False, None, error) si no
+        tiene sentido reintentar y (None, retry_after, error) si sí"""
+        started = time.perf_counter()
+        try:
+            response = self.session.post(self.url, data={'chat_id': chat_id, 'text': text, 'parse_mode': parse_mode},
+                                         timeout=self.timeout)
+            if response.status_code == 429:
+                retry_after = self._retry_after(response)
+                self.rate_limited += 1
+                with self._cond:
+                    self._chat_bucket(chat_id).pause(retry_after)
+                return None, retry_after, f"429 demasiadas peticiones (retry_after={retry_after})"
+            if response.status_code >= 500:
+                return None, None, f"HTTP {response.status_code}"
+            response.raise_for_status()  # otros 4xx: no tiene sentido reintentar
+            self.logger.info("Notificación enviada a Telegram")
+            return True, None, ''
+        except requests.HTTPError as e:
+            return False, None, str(e)
+        except requests.RequestException as e:
+            return None, None, str(e)
+        finally:
+            TELEGRAM_SEND_SECONDS.observe(time.perf_counter() - started)
+
+    def deliver(self, chat_id: str, text: str, parse_mode: str = 'HTML') -> bool:
+        """Enviar ya (bloqueante, sin pasar por la cola), con reintentos; True si Telegram lo aceptó"""
+        for attempt in range(self.max_retries + 1):
+            ok, retry_after, error = self._post(chat_id, text, parse_mode)
+            if ok is not None:
+                if not ok:
+                    self._give_up(error, attempt + 1)
+                return ok
+            if attempt == self.max_retries:
+                break
+            delay = retry_after if retry_after is not None else self._backoff(attempt)
+            self.retries += 1
+            self.logger.warning(f"⚠️ Telegram: {error}; reintento en {delay:.2f}s")
+            if self._stopped.wait(delay):
+                return False
+        self._give_up(error, self.max_retries + 1)
+        return False
+
+    @staticmethod
+    def _retry_after(response) -> float:
+        try:
+            return float(response.json()['parameters']['retry_after'])
+        except Exception:
+            return float(response.headers.get('Retry-After', 1))
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Esperar a que se entreguen los mensajes pendientes"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._size or self._in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 10.0):
+        """Entregar lo pendiente (hasta `timeout`) y detener los hilos"""
+        self.flush(timeout)
+        with self._cond:
+            self._stopped.set()
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=1)
+        self.session.close()
+
+    def stats(self) -> Dict[str, int]:
+        return {'queued': self._size, 'requests': self.requests, 'sent': self.sent, 'failed': self.failed, 'merged': self.merged,
+                'dropped': self.dropped, 'retries': self.retries, 'rate_limited': self.rate_limited}
+
+
+class NotificationAggregator:
+    """Agrupa las notificaciones del mismo tipo de una ventana corta en un resumen.
+
+    La primera notificación de un tipo abre la ventana; al cerrarse se envía tal
+    cual si llegó sola, o un resumen con una línea por notificación si no.
+    """
+
+    def __init__(self, send: Callable[[str, int], bool], window: Optional[float] = None):
+        self.logger = logging.getLogger(__name__)
+        self.send = send
+        self.window = Config.TELEGRAM_DIGEST_WINDOW_SECONDS if window is None else window
+        self._groups: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def add(self, kind: str, title: str, message: str, line: str,
+            priority: int = PRIORITY_NORMAL, pnl: Optional[float] = None):
+        """`message` es el mensaje completo; `line`, su resumen de una línea para el digest"""
+        if self.window <= 0:
+            self.send(message, priority)
+            return
+        with self._lock:
+            group = self._groups.get(kind)
+            if group is None:
+                timer = threading.Timer(self.window, self.flush, args=(kind,))
+                timer.daemon = True
+                group = self._groups[kind] = {'title': title, 'priority': priority, 'items': [], 'timer': timer}
+                timer.start()
+            group['items'].append((message, line, pnl))
+
+    def flush(self, kind: Optional[str] = None):
+        """Enviar ya los grupos abiertos (todos si no se indica tipo)"""
+        with self._lock:
+            kinds = [kind] if kind is not None else list(self._groups)
+            groups = [(k, self._groups.pop(k)) for k in kinds if k in self._groups]
+        for kind, group in groups:
+            group['timer'].cancel()
+            try:
+                self.send(self._render(kind, group), group['priority'])
+            except Exception as e:
+                self.logger.error(f"Error al enviar resumen de notificaciones: {e}")
+
+    def _render(self, kind: str, group: Dict) -> str:
+        items = group['items']
+        if len(items) == 1:
+            return items[0][0]
+        TELEGRAM_DIGESTS.labels(kind).inc()
+        lines = [f"<b>{group['title']} ({len(items)})</b>", ""]
+        lines.extend(line for _, line, _ in items)
+        pnls = [pnl for _, _, pnl in items if pnl is not None]
+        if pnls:
+            lines.extend(["", f"💰 <b>PnL total:</b> ${sum(pnls):.2f}"])
+        from datetime import datetime
+        lines.extend(["", f"⏰ {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"])
+        return "\n".join(lines)[:MAX_MESSAGE_LENGTH]
+
 
 class NotificationManager:
-    def __init__(self):
+    def __init__(self, dispatcher: Optional[TelegramDispatcher] = None):
         self.logger = logging.getLogger(__name__)
         self.telegram_enabled = bool(Config.TELEGRAM_BOT_TOKEN and Config.TELEGRAM_CHAT_ID)
+        self.dispatcher = dispatcher or TelegramDispatcher()
+        self.aggregator = NotificationAggregator(
+            lambda message, priority: self.send_telegram_message(message, priority=priority)
+        )
+        # El bot puede detenerse y volver a arrancar (web): el dispatcher sólo se cierra al salir
+        atexit.register(self.close)
         
-    def send_telegram_message(self, message: str, parse_mode: str = 'HTML') -> bool:
-        """Enviar mensaje a Telegram"""
+    def send_telegram_message(self, message: str, parse_mode: str = 'HTML',
+                              priority: int = PRIORITY_NORMAL) -> bool:
+        """Encolar mensaje para Telegram (no bloquea; lo envía el dispatcher)"""
         if not self.telegram_enabled:
             return False
-            
-        try:
-            url = f"https://api.telegram.org/bot{Config.TELEGRAM_BOT_TOKEN}/sendMessage"
-            data = {
-                'chat_id': Config.TELEGRAM_CHAT_ID,
-                'text': message,
-                'parse_mode': parse_mode
-            }
-            
-            response = requests.post(url, data=data, timeout=10)
-            response.raise_for_status()
-            
-            self.logger.info("Notificación enviada a Telegram")
-            return True
-            
-        except Exception as e:
-            self.logger.error(f"Error al enviar notificación a Telegram: {e}")
-            return False
+        return self.dispatcher.submit(Config.TELEGRAM_CHAT_ID, message, parse_mode, priority)
+    
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Entregar las notificaciones pendientes (y los resúmenes abiertos) sin detener el envío"""
+        self.aggregator.flush()
+        return self.dispatcher.flush(timeout)
+    
+    def close(self, timeout: float = 10.0):
+        """Entregar lo pendiente y detener los hilos de envío (al salir del proceso)"""
+        self.aggregator.flush()
+        self.dispatcher.close(timeout)
     
     def notify_trade_executed(self, trade_type: str, symbol: str, amount: float, 
                             price: float, pnl: float = None):
@@ -53,7 +510,10 @@ class NotificationManager:
             """.strip()
             
             if Config.ENABLE_NOTIFICATIONS:
-                self.send_telegram_message(message)
+                pnl_line = f" | PnL ${pnl:.2f}" if pnl is not None else ""
+                self.aggregator.add('trade', "🔄 TRADES EJECUTADOS", message,
+                                    f"{emoji} {trade_type.upper()} {symbol}: {amount:.6f} @ ${price:.4f}{pnl_line}",
+                                    pnl=pnl)
                 
         except Exception as e:
             self.logger.error(f"Error al notificar trade ejecutado: {e}")
@@ -81,7 +541,8 @@ class NotificationManager:
             """.strip()
             
             if Config.ENABLE_NOTIFICATIONS:
-                self.send_telegram_message(message)
+                self.aggregator.add('signal', "🎯 SEÑALES DE TRADING", message,
+                                    f"{emoji} {symbol}: {action} ({confidence:.1f}%)", PRIORITY_LOW)
                 
         except Exception as e:
             self.logger.error(f"Error al notificar señal generada: {e}")
@@ -103,7 +564,8 @@ class NotificationManager:
             """.strip()
             
             if Config.ENABLE_NOTIFICATIONS:
-                self.send_telegram_message(message)
+                self.aggregator.add('stop_loss', "🛑 STOP LOSS ACTIVADOS", message,
+                                    f"{pnl_emoji} {symbol}: ${price:.4f} | PnL ${pnl:.2f}", pnl=pnl)
                 
         except Exception as e:
             self.logger.error(f"Error al notificar stop loss: {e}")
@@ -124,7 +586,8 @@ class NotificationManager:
             """.strip()
             
             if Config.ENABLE_NOTIFICATIONS:
-                self.send_telegram_message(message)
+                self.aggregator.add('take_profit', "🎯 TAKE PROFIT ACTIVADOS", message,
+                                    f"💰 {symbol}: ${price:.4f} | PnL ${pnl:.2f}", pnl=pnl)
                 
         except Exception as e:
             self.logger.error(f"Error al notificar take profit: {e}")
@@ -161,7 +624,7 @@ class NotificationManager:
             """.strip()
             
             if Config.ENABLE_NOTIFICATIONS:
-                self.send_telegram_message(message)
+                self.send_telegram_message(message, priority=PRIORITY_LOW)
                 
         except Exception as e:
             self.logger.error(f"Error al notificar resumen diario: {e}")
@@ -179,7 +642,7 @@ class NotificationManager:
             """.strip()
             
             if Config.ENABLE_NOTIFICATIONS:
-                self.send_telegram_message(message)
+                self.send_telegram_message(message, priority=PRIORITY_HIGH)
                 
         except Exception as e:
             self.logger.error(f"Error al notificar error: {e}")
@@ -199,7 +662,7 @@ class NotificationManager:
             """.strip()
             
             if Config.ENABLE_NOTIFICATIONS:
-                self.send_telegram_message(message)
+                self.send_telegram_message(message, priority=PRIORITY_LOW)
                 
         except Exception as e:
             self.logger.error(f"Error al notificar inicio: {e}")
@@ -220,7 +683,10 @@ class NotificationManager:
 ⏰ {timestamp}
             """.strip().format(timestamp=self._get_timestamp())
             
-            return self.send_telegram_message(message)
+            if not self.telegram_enabled:
+                return False
+            # Envío síncrono: el llamador necesita saber si llegó
+            return self.dispatcher.deliver(Config.TELEGRAM_CHAT_ID, message)
             
         except Exception as e:
             self.logger.error(f"Error al probar notificaciones: {e}")
@@ -228,3 +694,132 @@ class NotificationManager:
 
 
 
+if __name__ == "__main__":
+    # Pruebas contra un Telegram local que aplica los límites reales (1 msg/s por chat
+    # con ráfagas de 3, 30/s en total) y responde 429 al superarlos
+    import json
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs
+
+    class FakeTelegram(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        received: List = []
+        failures: Deque[int] = collections.deque()
+        lock = threading.Lock()
+        chats: Dict[str, _TokenBucket] = {}
+        total = _TokenBucket(30, 30)
+        rejected = 0
+
+        def do_POST(self):
+            form = parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode())
+            chat_id, text = form['chat_id'][0], form['text'][0]
+            cls = type(self)
+            with cls.lock:
+                now = time.monotonic()
+                chat = cls.chats.setdefault(chat_id, _TokenBucket(1, 3))
+                wait = max(chat.wait_time(now), cls.total.wait_time(now))
+                status = cls.failures.popleft() if cls.failures else (429 if wait > 0 else 200)
+                if status == 200:
+                    chat.take()
+                    cls.total.take()
+                    cls.received.append((chat_id, text))
+                elif status == 429:
+                    cls.rejected += 1
+            time.sleep(0.05)  # latencia de la API
+            payload = {'ok': status == 200, 'parameters': {'retry_after': round(max(wait, 0.1), 2)}}
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    def reset_stub():
+        FakeTelegram.received = []
+        FakeTelegram.chats = {}
+        FakeTelegram.total = _TokenBucket(30, 30)
+        FakeTelegram.rejected = 0
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeTelegram)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    # 1) Ráfaga en un chat con errores 5xx: encolar no bloquea y nada se pierde
+    FakeTelegram.failures.extend([500, 503])
+    dispatcher = TelegramDispatcher('TOKEN', base_url, workers=2, max_queue=50, retry_base=0.05)
+    rounds = 1000
+    started = time.perf_counter()
+    for i in range(rounds):
+        dispatcher.submit('1', f"mensaje {i}")
+    submit_us = (time.perf_counter() - started) / rounds * 1e6
+    assert dispatcher.flush(timeout=30)
+    stats = dispatcher.stats()
+    dispatcher.close()
+    lines = sum(text.count('mensaje ') for _, text in FakeTelegram.received)
+    print(f"submit(): {submit_us:.1f} µs por mensaje; {lines}/{rounds} mensajes en "
+          f"{len(FakeTelegram.received)} peticiones; {stats}")
+    assert stats['failed'] == 0 and lines == stats['sent'] and lines + stats['dropped'] == rounds
+    assert submit_us < 100, "Encolar no debe esperar a Telegram"
+
+    # 2) Desplome: en 8 chats a la vez, 6 mensajes informativos largos, 25 stop loss
+    #    y un error por chat
+    chats, stops, infos = [str(n) for n in range(8)], 25, 6
+    info_text = "📊 resumen " + "x" * 2500  # demasiado largo para fusionarse con otro
+
+    def dump(notify, notify_error, notify_info):
+        for chat_id in chats:
+            for _ in range(infos):
+                notify_info(chat_id)
+        for n in range(stops):
+            for chat_id in chats:
+                notify(chat_id, f"🛑 <b>STOP LOSS ACTIVADO</b>\n\n📊 <b>Símbolo:</b> SYM{n}/USDC\n"
+                                f"💵 <b>Precio de salida:</b> $1.0000\n❤️ <b>PnL:</b> $-1.00",
+                       f"❤️ SYM{n}/USDC: $1.0000 | PnL $-1.00")
+        for chat_id in chats:
+            notify_error(chat_id)
+
+    results = {}
+    for name in ('uno a uno', 'agrupado'):
+        reset_stub()
+        limited = name == 'agrupado'
+        dispatcher = TelegramDispatcher('TOKEN', base_url, workers=4, max_queue=1000, max_retries=2,
+                                        chat_rate=None if limited else 0, global_rate=None if limited else 0)
+        if limited:
+            aggregators = {chat_id: NotificationAggregator(
+                lambda text, priority, chat_id=chat_id: dispatcher.submit(chat_id, text, 'HTML', priority),
+                window=0.5) for chat_id in chats}
+            notify = lambda chat_id, message, line: aggregators[chat_id].add(
+                'stop_loss', "🛑 STOP LOSS ACTIVADOS", message, line, pnl=-1.0)
+        else:
+            # Como antes: un mensaje por evento, sin fusionar en la cola
+            notify = lambda chat_id, message, line: dispatcher.submit(chat_id, message + " " * 4096)
+        started = time.monotonic()
+        dump(notify, lambda chat_id: dispatcher.submit(chat_id, "🚨 <b>ERROR CRÍTICO</b>", 'HTML', PRIORITY_HIGH),
+             lambda chat_id: dispatcher.submit(chat_id, info_text, 'HTML', PRIORITY_LOW))
+        if limited:
+            for aggregator in aggregators.values():
+                aggregator.flush()
+        dispatcher.flush(timeout=60)
+        elapsed = time.monotonic() - started
+        stats = dispatcher.stats()
+        dispatcher.close()
+
+        received = FakeTelegram.received
+        delivered = sum(text.count('SYM') for _, text in received)
+        error_rank = max(next(i for i, (c, text) in enumerate(m for m in received if m[0] == chat_id)
+                              if 'ERROR' in text) if any('ERROR' in text for c, text in received if c == chat_id)
+                         else -1 for chat_id in chats)
+        results[name] = (delivered, FakeTelegram.rejected, stats['failed'], error_rank)
+        print(f"{name:>10}: {delivered}/{stops * len(chats)} stop loss entregados en {len(received)} "
+              f"peticiones, {FakeTelegram.rejected} respuestas 429, {stats['failed']} mensajes perdidos, "
+              f"{elapsed:.1f}s; error entregado en la posición {error_rank} de su chat")
+
+    delivered, rejected, failed, error_rank = results['agrupado']
+    assert delivered == stops * len(chats) and failed == 0
+    assert rejected <= len(chats) < results['uno a uno'][1], "Los buckets deben evitar casi todos los 429"
+    assert 0 <= error_rank <= Config.TELEGRAM_CHAT_BURST, "El error debe adelantarse a la información pendiente"
+    server.shutdown()
+    print("✅ Resúmenes dentro de los límites de Telegram, sin pérdidas y con los errores primero")
@@ -14,6 +14,7 @@ class PerformanceTracker:
         self.data_file = data_file
         self.ensure_data_directory()
         self.performance_data = self.load_performance_data()
+        self.version = 0  # se incrementa con cada cambio (ETag de /api/performance)
     
     def ensure_data_directory(self):
         """Asegurar que el directorio de datos existe"""
@@ -38,6 +39,7 @@ class PerformanceTracker:
     
     def save_performance_data(self):
         """Guardar datos de rendimiento"""
+        self.version += 1
         try:
             with open(self.data_file, 'w') as f:
                 json.dump(self.performance_data, f, indent=2)
@@ -4,17 +4,32 @@ Sistema de seguimiento del portafolio y balance
 """
 import json
 import os
+from collections import deque
 from datetime import datetime
 from typing import Dict
 from config import Config
+from trade_records import Position, Fill
 
 PORTFOLIO_FILE = 'data/portfolio.json'
 
+# Máximo de fills conservados en el historial
+MAX_TRADES_HISTORY = 100
+
 class PortfolioTracker:
     def __init__(self):
         self.initial_balance = float(Config.INVESTMENT_AMOUNT)
         self.portfolio = self._load_portfolio()
         
+        # Posiciones y fills como registros compactos
+        self.positions: Dict[str, Position] = {
+            symbol: Position.from_dict(dict(pos, symbol=symbol))
+            for symbol, pos in self.portfolio.pop('positions', {}).items()
+        }
+        self.trades_history = deque(
+            (Fill.from_dict(trade) for trade in self.portfolio.pop('trades_history', [])),
+            maxlen=MAX_TRADES_HISTORY
+        )
+        
     def _load_portfolio(self) -> Dict:
         """Cargar portafolio desde archivo"""
         try:
@@ -46,8 +61,11 @@ class PortfolioTracker:
         """Guardar portafolio en archivo"""
         try:
             os.makedirs('data', exist_ok=True)
+            data = dict(self.portfolio)
+            data['positions'] = {symbol: pos.to_dict() for symbol, pos in self.positions.items()}
+            data['trades_history'] = [fill.to_dict() for fill in self.trades_history]
             with open(PORTFOLIO_FILE, 'w') as f:
-                json.dump(self.portfolio, f, indent=2)
+                json.dump(data, f, indent=2)
         except Exception as e:
             print(f"Error guardando portafolio: {e}")
     
@@ -56,14 +74,10 @@ class PortfolioTracker:
         try:
             total_positions_value = 0
             
-            for symbol, position in self.portfolio.get('positions', {}).items():
+            for symbol, position in self.positions.items():
                 if symbol in prices:
-                    current_price = prices[symbol]
-                    position['current_price'] = current_price
-                    position['current_value'] = position['amount'] * current_price
-                    position['pnl'] = position['current_value'] - position['entry_value']
-                    position['pnl_percentage'] = (position['pnl'] / position['entry_value']) * 100
-                    total_positions_value += position['current_value']
+                    position.mark(prices[symbol])
+                    total_positions_value += position.current_value
             
             self.portfolio['total_value'] = self.portfolio['cash'] + total_positions_value
             self.portfolio['last_update'] = datetime.now().isoformat()
@@ -81,54 +95,30 @@ class PortfolioTracker:
                 # Compra: reducir cash, añadir posición
                 self.portfolio['cash'] -= trade_value
                 
-                if symbol not in self.portfolio['positions']:
-                    self.portfolio['positions'][symbol] = {
-                        'amount': amount,
-                        'entry_price': price,
-                        'entry_value': trade_value,
-                        'current_price': price,
-                        'current_value': trade_value,
-                        'pnl': 0,
-                        'pnl_percentage': 0,
-                        'entry_time': datetime.now().isoformat()
-                    }
+                pos = self.positions.get(symbol)
+                if pos is None:
+                    self.positions[symbol] = Position(symbol, 'buy', amount, price)
                 else:
                     # Promedio ponderado si ya existe posición
-                    pos = self.portfolio['positions'][symbol]
-                    total_amount = pos['amount'] + amount
-                    total_value = pos['entry_value'] + trade_value
-                    pos['amount'] = total_amount
-                    pos['entry_price'] = total_value / total_amount
-                    pos['entry_value'] = total_value
-                    pos['current_value'] = total_value
+                    total_amount = pos.amount + amount
+                    pos.entry_price = (pos.entry_value + trade_value) / total_amount
+                    pos.amount = total_amount
+                    pos.mark(price)
                     
             elif side == 'sell':
                 # Venta: añadir cash, reducir/eliminar posición
                 self.portfolio['cash'] += trade_value
                 
-                if symbol in self.portfolio['positions']:
-                    pos = self.portfolio['positions'][symbol]
-                    if pos['amount'] >= amount:
-                        pos['amount'] -= amount
-                        if pos['amount'] <= 0:
-                            del self.portfolio['positions'][symbol]
-                        else:
-                            pos['entry_value'] = pos['amount'] * pos['entry_price']
-                            pos['current_value'] = pos['amount'] * price
-            
-            # Registrar trade en historial
-            self.portfolio['trades_history'].append({
-                'symbol': symbol,
-                'side': side,
-                'amount': amount,
-                'price': price,
-                'value': trade_value,
-                'timestamp': datetime.now().isoformat()
-            })
+                pos = self.positions.get(symbol)
+                if pos is not None and pos.amount >= amount:
+                    pos.amount -= amount
+                    if pos.amount <= 0:
+                        del self.positions[symbol]
+                    else:
+                        pos.mark(price)
             
-            # Mantener solo los últimos 100 trades
-            if len(self.portfolio['trades_history']) > 100:
-                self.portfolio['trades_history'] = self.portfolio['trades_history'][-100:]
+            # Registrar trade en historial (la deque conserva sólo los últimos)
+            self.trades_history.append(Fill(symbol, side, amount, price))
             
             self._save_portfolio()
             
@@ -138,10 +128,7 @@ class PortfolioTracker:
     def get_portfolio_summary(self) -> Dict:
         """Obtener resumen del portafolio"""
         try:
-            total_positions_value = sum(
-                pos.get('current_value', 0) 
-                for pos in self.portfolio.get('positions', {}).values()
-            )
+            total_positions_value = sum(pos.current_value for pos in self.positions.values())
             
             total_value = self.portfolio.get('cash', 0) + total_positions_value
             initial_balance = self.portfolio.get('initial_balance', self.initial_balance)
@@ -156,8 +143,8 @@ class PortfolioTracker:
                 'initial_balance': round(initial_balance, 2),
                 'total_pnl': round(total_pnl, 2),
                 'total_pnl_percentage': round(total_pnl_percentage, 2),
-                'total_trades': len(self.portfolio.get('trades_history', [])),
-                'open_positions': len(self.portfolio.get('positions', {})),
+                'total_trades': len(self.trades_history),
+                'open_positions': len(self.positions),
                 'last_update': self.portfolio.get('last_update', datetime.now().isoformat())
             }
         except Exception as e:
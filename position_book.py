@@ -0,0 +1,145 @@
+"""
+Libro de posiciones con múltiples lotes por símbolo
+
+Permite escalar entradas (piramidar) y salidas parciales. Cada símbolo guarda
+sus lotes en una cola FIFO y mantiene agregados incrementales (cantidad neta,
+coste, VWAP de entrada, PnL no realizado) que se actualizan en O(1) por fill,
+sin volver a sumar los lotes. La contabilidad puede ser FIFO o coste medio
+(en coste medio una venta reduce todos los lotes a prorrata).
+"""
+from collections import deque
+from typing import Dict, List, Optional
+
+from trade_records import Fill
+
+FIFO = 'fifo'
+AVERAGE = 'average'
+
+
+class SymbolBook:
+    __slots__ = ('symbol', 'side', 'method', 'lots', 'net_qty', 'cost_basis',
+                 'realized_pnl', 'last_price')
+
+    def __init__(self, symbol: str, side: str, method: str = FIFO):
+        self.symbol = symbol
+        self.side = side
+        self.method = method
+        self.lots = deque()
+        self.net_qty = 0.0
+        self.cost_basis = 0.0
+        self.realized_pnl = 0.0
+        self.last_price = 0.0
+
+    @property
+    def sign(self) -> int:
+        return 1 if self.side == 'buy' else -1
+
+    @property
+    def vwap(self) -> float:
+        return self.cost_basis / self.net_qty if self.net_qty > 0 else 0.0
+
+    @property
+    def unrealized_pnl(self) -> float:
+        return self.sign * (self.last_price * self.net_qty - self.cost_basis)
+
+    def add_fill(self, fill: Fill):
+        """Añadir un lote: O(1)"""
+        self.lots.append(fill)
+        self.net_qty += fill.amount
+        self.cost_basis += fill.amount * fill.price
+        if not self.last_price:
+            self.last_price = fill.price
+
+    def reduce(self, amount: float, price: float) -> Dict:
+        """Reducir la posición; devuelve cantidad, coste consumido y PnL realizado.
+
+        FIFO: coste O(lotes consumidos), cada lote se retira como mucho una vez.
+        Coste medio: todos los lotes se reducen a prorrata (O(lotes)), así los
+        lotes persistidos siguen sumando el mismo VWAP que la posición viva.
+        """
+        amount = min(amount, self.net_qty)
+        if self.method == AVERAGE:
+            consumed_cost = amount * self.vwap
+            keep = 1 - amount / self.net_qty if self.net_qty > 0 else 0.0
+            self.lots = deque(
+                Fill(lot.symbol, lot.side, lot.amount * keep, lot.price, lot.order_id, lot.timestamp)
+                for lot in self.lots
+            ) if keep > 1e-12 else deque()
+        else:
+            remaining = amount
+            consumed_cost = 0.0
+            while remaining > 0 and self.lots:
+                lot = self.lots[0]
+                take = min(lot.amount, remaining)
+                consumed_cost += take * lot.price
+                remaining -= take
+                if take >= lot.amount:
+                    self.lots.popleft()
+                else:
+                    # Lote parcialmente consumido: se reemplaza por el resto
+                    self.lots[0] = Fill(lot.symbol, lot.side, lot.amount - take, lot.price,
+                                        lot.order_id, lot.timestamp)
+
+        self.net_qty -= amount
+        self.cost_basis -= consumed_cost
+        if self.net_qty <= 1e-12:
+            self.net_qty = 0.0
+            self.cost_basis = 0.0
+
+        pnl = self.sign * (price * amount - consumed_cost)
+        self.realized_pnl += pnl
+        return {
+            'amount': amount,
+            'entry_price': consumed_cost / amount if amount > 0 else 0.0,
+            'pnl': pnl
+        }
+
+    def mark(self, price: float):
+        self.last_price = price
+
+    @property
+    def is_flat(self) -> bool:
+        return self.net_qty <= 0
+
+
+class PositionBook:
+    def __init__(self, method: str = FIFO):
+        self.method = method
+        self.books: Dict[str, SymbolBook] = {}
+
+    def add_fill(self, fill: Fill) -> SymbolBook:
+        book = self.books.get(fill.symbol)
+        if book is None:
+            book = self.books[fill.symbol] = SymbolBook(fill.symbol, fill.side, self.method)
+        book.add_fill(fill)
+        return book
+
+    def reduce(self, symbol: str, amount: float, price: float) -> Optional[Dict]:
+        book = self.books.get(symbol)
+        if book is None:
+            return None
+        result = book.reduce(amount, price)
+        if book.is_flat:
+            del self.books[symbol]
+        return result
+
+    def mark(self, symbol: str, price: float):
+        book = self.books.get(symbol)
+        if book is not None:
+            book.mark(price)
+
+    def get(self, symbol: str) -> Optional[SymbolBook]:
+        return self.books.get(symbol)
+
+    def lots(self, symbol: str) -> List[Fill]:
+        book = self.books.get(symbol)
+        return list(book.lots) if book else []
+
+    def remove(self, symbol: str):
+        self.books.pop(symbol, None)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.books
+
+    def __len__(self):
+        return len(self.books)
@@ -0,0 +1,64 @@
+"""
+Caché en memoria con TTL para respuestas de la API
+
+Cada entrada caduca tras `ttl` segundos o cuando se invalida explícitamente
+(p. ej. al ejecutarse un fill). get_or_compute serializa el cálculo por clave,
+de modo que varias peticiones simultáneas con la caché vacía provocan una
+sola llamada al exchange.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+
+        # Estadísticas
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable = None) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._entries[key] = (expires, value)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # Otro hilo pudo calcularlo mientras esperábamos
+            value = self.get(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            self.misses += 1
+            value = compute()
+            if value is not None:
+                self.set(key, value)
+            return value
+
+    def invalidate(self, key: Hashable = None):
+        """Invalidar una clave (o toda la caché si no se indica)"""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
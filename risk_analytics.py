@@ -0,0 +1,202 @@
+"""
+Analítica de riesgo de cartera: covarianza incremental, VaR y exposición por activo
+
+La covarianza de rendimientos entre Config.SYMBOLS se mantiene con pesos
+exponenciales (EWMA con factor λ = Config.RISK_EWMA_DECAY) alrededor de la
+media también exponencial, en su forma incremental exacta
+cov ← λ·(cov + (1-λ)·δδᵀ), con δ medido contra la media anterior (no es la
+variante RiskMetrics de media cero). Cada vela cerrada es una operación de
+rango uno: el coste es O(n²) en el número de símbolos e independiente de la
+longitud del histórico. Los últimos vectores de rendimientos se guardan en un
+buffer circular de tamaño fijo para el VaR histórico.
+"""
+import logging
+import math
+from statistics import NormalDist
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config import Config
+
+
+def base_asset(symbol: str) -> str:
+    return symbol.split('/')[0]
+
+
+class RiskAnalytics:
+    def __init__(self, symbols: Optional[List[str]] = None, decay: Optional[float] = None,
+                 history_size: Optional[int] = None, confidence: Optional[float] = None):
+        self.logger = logging.getLogger(__name__)
+        self.symbols = list(symbols or Config.SYMBOLS)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.decay = decay or Config.RISK_EWMA_DECAY
+        self.confidence = confidence or Config.VAR_CONFIDENCE
+        self.z_score = NormalDist().inv_cdf(self.confidence)
+
+        n = len(self.symbols)
+        self.mean = np.zeros(n)
+        self.cov = np.zeros((n, n))
+        self.observations = 0
+
+        # Buffer circular de rendimientos para VaR histórico
+        self.history = np.zeros((history_size or Config.VAR_HISTORY_SIZE, n))
+        self._cursor = 0
+
+        # Último cierre y vela procesada por símbolo
+        self._last_close: Dict[str, float] = {}
+        self._last_ts: Dict[str, int] = {}
+        # Rendimientos pendientes agrupados por timestamp de vela
+        self._pending: Dict[int, Dict[str, float]] = {}
+        # Última vela consolidada en la covarianza: las anteriores ya no se pueden añadir
+        self._flushed_ts = 0
+
+    def __setstate__(self, state: Dict):
+        state.setdefault('_flushed_ts', 0)  # snapshots anteriores
+        self.__dict__.update(state)
+
+    def add_candles(self, symbol: str, candles: List):
+        """Registrar velas OHLCV cerradas (la última del buffer sigue abierta)"""
+        if symbol not in self.index or len(candles) < 2:
+            return
+
+        last_ts = self._last_ts.get(symbol, 0)
+        for row in candles[:-1]:
+            ts, close = int(row[0]), float(row[4])
+            if ts <= last_ts:
+                continue
+            previous = self._last_close.get(symbol)
+            # Vela tardía ya consolidada (contó como 0): sólo avanza el cierre de referencia
+            if previous and close > 0 and ts > self._flushed_ts:
+                self._pending.setdefault(ts, {})[symbol] = math.log(close / previous)
+            self._last_close[symbol] = close
+            last_ts = ts
+        self._last_ts[symbol] = last_ts
+
+        # Consolidar las velas para las que ya llegaron todos los símbolos
+        n = len(self.symbols)
+        while self._pending:
+            oldest = min(self._pending)
+            if len(self._pending[oldest]) < n:
+                break
+            self._update(self._pending.pop(oldest))
+            self._flushed_ts = oldest
+
+    def flush(self):
+        """Consolidar las velas pendientes (símbolos sin dato cuentan como rendimiento 0).
+
+        Las velas que lleguen después con un timestamp ya consolidado se descartan.
+        """
+        for ts in sorted(self._pending):
+            self._update(self._pending[ts])
+            self._flushed_ts = ts
+        self._pending.clear()
+
+    def _update(self, returns: Dict[str, float]):
+        """Actualización incremental de rango uno de media y covarianza EWMA"""
+        r = np.zeros(len(self.symbols))
+        for symbol, value in returns.items():
+            r[self.index[symbol]] = value
+
+        if self.observations == 0:
+            self.mean = r.copy()
+        else:
+            lam = self.decay
+            delta = r - self.mean
+            self.mean += (1 - lam) * delta
+            # δ contra la media anterior: el factor λ exterior corrige el sesgo (no λ·cov + (1-λ)·δδᵀ)
+            self.cov = lam * (self.cov + (1 - lam) * np.outer(delta, delta))
+
+        self.history[self._cursor % len(self.history)] = r
+        self._cursor += 1
+        self.observations += 1
+
+    def _weights(self, exposures: Dict[str, float]) -> np.ndarray:
+        w = np.zeros(len(self.symbols))
+        for symbol, value in exposures.items():
+            i = self.index.get(symbol)
+            if i is not None:
+                w[i] += value
+        return w
+
+    def volatility(self) -> Dict[str, float]:
+        return {symbol: float(math.sqrt(max(self.cov[i, i], 0.0))) for symbol, i in self.index.items()}
+
+    def correlation_matrix(self) -> np.ndarray:
+        std = np.sqrt(np.clip(np.diag(self.cov), 0.0, None))
+        denom = np.outer(std, std)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = np.where(denom > 0, self.cov / denom, 0.0)
+        np.fill_diagonal(corr, 1.0)
+        return corr
+
+    def correlation(self, a: str, b: str) -> float:
+        if a == b:
+            return 1.0
+        i, j = self.index.get(a), self.index.get(b)
+        if i is None or j is None:
+            return 0.0
+        denom = math.sqrt(max(self.cov[i, i], 0.0) * max(self.cov[j, j], 0.0))
+        return float(self.cov[i, j] / denom) if denom > 0 else 0.0
+
+    def parametric_var(self, exposures: Dict[str, float]) -> float:
+        """VaR paramétrico (normal) a un periodo en unidades de la moneda cotizada"""
+        w = self._weights(exposures)
+        variance = float(w @ self.cov @ w)
+        return self.z_score * math.sqrt(max(variance, 0.0))
+
+    def historical_var(self, exposures: Dict[str, float]) -> Optional[float]:
+        """VaR histórico sobre el buffer circular (None si no hay muestras suficientes)"""
+        samples = min(self._cursor, len(self.history))
+        if samples < 20:
+            return None
+        w = self._weights(exposures)
+        pnl = self.history[:samples] @ w
+        return float(max(-np.quantile(pnl, 1 - self.confidence), 0.0))
+
+    @staticmethod
+    def exposure_by_asset(exposures: Dict[str, float]) -> Dict[str, float]:
+        by_asset: Dict[str, float] = {}
+        for symbol, value in exposures.items():
+            asset = base_asset(symbol)
+            by_asset[asset] = by_asset.get(asset, 0.0) + value
+        return by_asset
+
+    def correlated_exposure(self, symbol: str, exposures: Dict[str, float]) -> float:
+        """Exposición (con signo) en activos correlacionados con `symbol` por encima del umbral"""
+        threshold = Config.CORRELATION_THRESHOLD
+        return sum(value for other, value in exposures.items()
+                   if self.correlation(symbol, other) >= threshold)
+
+    def check_concentration(self, symbol: str, order_value: float,
+                            exposures: Dict[str, float], capital: float) -> Optional[str]:
+        """Comprobar límites de concentración; devuelve el motivo de rechazo o None"""
+        if capital <= 0 or self.observations < 2:
+            return None
+
+        after = dict(exposures)
+        after[symbol] = after.get(symbol, 0.0) + order_value
+
+        max_correlated = Config.MAX_CORRELATED_EXPOSURE_PERCENTAGE
+        if max_correlated > 0:
+            correlated = abs(self.correlated_exposure(symbol, after))
+            if correlated > capital * max_correlated / 100:
+                return (f'Exposición correlacionada con {symbol} excesiva: '
+                        f'${correlated:.2f} > {max_correlated}% del capital')
+
+        max_var = Config.MAX_PORTFOLIO_VAR_PERCENTAGE
+        if max_var > 0:
+            var = max(self.parametric_var(after), self.historical_var(after) or 0.0)
+            if var > capital * max_var / 100:
+                return f'VaR de cartera excesivo: ${var:.2f} > {max_var}% del capital'
+
+        return None
+
+    def report(self, exposures: Dict[str, float]) -> Dict:
+        return {
+            'var_confidence': self.confidence,
+            'var_parametric': self.parametric_var(exposures),
+            'var_historical': self.historical_var(exposures),
+            'exposure_by_asset': self.exposure_by_asset(exposures),
+            'observations': self.observations
+        }
@@ -1,23 +1,53 @@
 """
 Gestor de riesgo para el bot de trading
 """
+import copy
 import logging
 import json
 import os
+import threading
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 from config import Config
+from state_recovery import StateRecovery
+from trigger_book import TriggerBook, STOP_LOSS, BREAK_EVEN
+from trade_records import Position, Fill, ClosedTrade, ClosedTradeStore
+from position_book import PositionBook
+from risk_analytics import RiskAnalytics
+from risk_rules import RiskRuleEngine, RiskLimits, RiskContext, OrderRequest, Rejection
+from metrics import counter, histogram
 import traceback
 
+PERSIST_SECONDS = histogram('risk_persist_seconds', 'Duración del guardado de archivos JSON de riesgo', ['file'])
+PERSIST_ERRORS = counter('risk_persist_errors_total', 'Errores guardando archivos JSON de riesgo', ['file'])
+
 class RiskManager:
-    def __init__(self):
+    def __init__(self, recovery: Optional[StateRecovery] = None):
         self.logger = logging.getLogger(__name__)
         self.daily_pnl = 0.0
         self.total_pnl = 0.0
-        self.open_positions = {}
+        self.open_positions: Dict[str, Position] = {}
         self.daily_trades = 0
         self.max_daily_trades = 10
-        self.closed_trades = []
+        self.closed_trades = ClosedTradeStore()
+        
+        # Lotes por símbolo; open_positions es la vista agregada de cada libro
+        self.position_book = PositionBook(Config.POSITION_ACCOUNTING_METHOD)
+        
+        # Covarianza incremental y VaR de la cartera
+        self.analytics = RiskAnalytics(Config.SYMBOLS)
+        
+        # Reglas pre-trade con límites precompilados
+        self.rules = RiskRuleEngine(RiskLimits(self.max_daily_trades))
+        
+        # El motor de stops evalúa precios desde su propio hilo
+        self.lock = threading.RLock()
+        
+        # Índice de precios de stop loss / take profit
+        self.trigger_book = TriggerBook(on_ratchet=self._on_stop_ratchet)
+        
+        # Stops movidos pendientes de escribir en el WAL: sólo el último nivel por símbolo
+        self._pending_stops: Dict[str, float] = {}
         
         # Archivos de persistencia
         self.data_dir = "data"
@@ -28,10 +58,23 @@ class RiskManager:
         # Crear directorio si no existe
         os.makedirs(self.data_dir, exist_ok=True)
         
+        # Series de métricas por archivo (se evita labels() en cada guardado)
+        self._persist_series: Dict[str, object] = {}
+        
+        # Recuperación rápida (snapshot + WAL) si está disponible
+        self.recovery = recovery
+        
+        # Suscriptores a fills: callback(evento, símbolo)
+        self._fill_listeners: List = []
+        
         # Cargar datos al inicializar
-        self._load_positions()
-        self._load_metrics()
-        self._load_trades_history()
+        if not self._restore_from_recovery():
+            self._load_positions()
+            self._load_metrics()
+            self._load_trades_history()
+        
+        self._sync_position_book()
+        self._rebuild_trigger_book()
         
     def calculate_position_size(self, account_balance: float, risk_percentage: float, 
                               entry_price: float, stop_loss_price: float) -> float:
@@ -59,7 +102,8 @@ class RiskManager:
             self.logger.error(f"Error al calcular tamaño de posición: {e}")
             return 0
     
-    def validate_trade(self, symbol: str, side: str, amount: float, price: float) -> Dict:
+    def validate_trade(self, symbol: str, side: str, amount: float, price: float,
+                       account_balance: Optional[float] = None) -> Dict:
         """Validar si un trade cumple con las reglas de riesgo"""
         validation = {
             'valid': True,
@@ -68,41 +112,24 @@ class RiskManager:
         }
         
         try:
-            # Verificar límite de posiciones abiertas
-            if len(self.open_positions) >= Config.MAX_OPEN_POSITIONS:
-                validation['valid'] = False
-                validation['reason'] = f'Máximo de posiciones abiertas alcanzado ({Config.MAX_OPEN_POSITIONS})'
-                return validation
+            order = OrderRequest(symbol, side, amount, price)
+            context = self.risk_context(account_balance)
             
-            # Verificar si ya existe una posición para este símbolo
-            if symbol in self.open_positions:
-                validation['valid'] = False
-                validation['reason'] = f'Ya existe una posición abierta para {symbol}'
-                return validation
-            
-            # Verificar límite de trades diarios
-            if self.daily_trades >= self.max_daily_trades:
-                validation['valid'] = False
-                validation['reason'] = f'Límite de trades diarios alcanzado ({self.max_daily_trades})'
-                return validation
+            # Orden de salida (reduce una posición existente): no abre riesgo nuevo
+            if context.is_exit(order):
+                validation['adjusted_amount'] = min(amount, self.open_positions[symbol].amount)
             
-            # Verificar pérdida diaria máxima
-            if self.daily_pnl <= -Config.MAX_DAILY_LOSS:
+            rejection = self.rules.check(order, context)
+            if rejection is not None:
                 validation['valid'] = False
-                validation['reason'] = f'Pérdida diaria máxima alcanzada ({Config.MAX_DAILY_LOSS}%)'
+                validation['reason'] = rejection.reason
+                validation['rule'] = rejection.rule
                 return validation
             
-            # Verificar tamaño mínimo de orden (ajustado para Binance)
-            min_order_value = 5.0  # $5 USDT mínimo (algunos pares permiten desde $5)
-            order_value = amount * price
-            
-            if order_value < min_order_value:
-                validation['valid'] = False
-                validation['reason'] = f'Valor de orden muy pequeño (mínimo ${min_order_value})'
-                return validation
+            order_value = order.notional
             
             # Advertencia si el valor es muy bajo pero válido
-            if order_value < 10.0:
+            if order_value < 10.0 and not context.is_exit(order):
                 self.logger.warning(f"⚠️ Orden pequeña: ${order_value:.2f} para {symbol}")
             
             return validation
@@ -113,49 +140,106 @@ class RiskManager:
             validation['reason'] = f'Error en validación: {str(e)}'
             return validation
     
+    def validate_orders(self, orders: List[OrderRequest],
+                        account_balance: Optional[float] = None) -> List[Optional[Rejection]]:
+        """Validar un lote de órdenes candidatas con un único contexto de riesgo"""
+        return self.rules.evaluate_batch(orders, self.risk_context(account_balance))
+    
+    def risk_context(self, account_balance: Optional[float] = None) -> RiskContext:
+        """Capturar el estado del libro que necesitan las reglas de riesgo"""
+        sides = {}
+        lots = {}
+        for symbol, position in self.open_positions.items():
+            sides[symbol] = position.side
+            book = self.position_book.get(symbol)
+            lots[symbol] = len(book.lots) if book else 1
+        
+        return RiskContext(
+            open_count=len(self.open_positions),
+            daily_trades=self.daily_trades,
+            daily_pnl=self.daily_pnl,
+            sides=sides,
+            lots=lots,
+            exposures=self.exposures(),
+            capital=account_balance if account_balance else Config.INVESTMENT_AMOUNT,
+            analytics=self.analytics
+        )
+    
     def add_position(self, symbol: str, side: str, amount: float, entry_price: float, 
-                    stop_loss: float, take_profit: float, order_id: str):
-        """Agregar nueva posición al seguimiento"""
-        try:
-            position = {
-                'symbol': symbol,
-                'side': side,
-                'amount': amount,
-                'entry_price': entry_price,
-                'current_price': entry_price,
-                'stop_loss': stop_loss,
-                'take_profit': take_profit,
-                'order_id': order_id,
-                'entry_time': datetime.now(),
-                'unrealized_pnl': 0.0,
-                'status': 'open'
-            }
-            
-            self.open_positions[symbol] = position
-            self.daily_trades += 1
-            
-            self.logger.info(f"✅ Posición agregada: {symbol} - {side} - Cantidad: {amount} - Precio: {entry_price}")
-            
-            # Guardar inmediatamente
-            self._save_positions()
-            self._save_metrics()
-            
-        except Exception as e:
-            self.logger.error(f"Error al agregar posición: {e}")
-            self.logger.error(traceback.format_exc())
+                    stop_loss: float, take_profit: float, order_id: str,
+                    trailing_stop_percentage: Optional[float] = None,
+                    break_even_trigger: Optional[float] = None):
+        """Agregar nueva posición al seguimiento (o un lote más si ya existe)"""
+        with self.lock:
+            try:
+                fill = Fill(symbol, side, amount, entry_price, order_id)
+                position = self.open_positions.get(symbol)
+                
+                if position is not None and position.side != side:
+                    self.logger.warning(f"⚠️ Lote {side} ignorado: {symbol} ya tiene posición {position.side}")
+                    return
+                
+                book = self.position_book.add_fill(fill)
+                
+                if position is None:
+                    position = Position(
+                        symbol, side, amount, entry_price, stop_loss, take_profit, order_id,
+                        trailing_stop_percentage=trailing_stop_percentage or 0.0,
+                        break_even_trigger=break_even_trigger or 0.0
+                    )
+                    self.open_positions[symbol] = position
+                else:
+                    # Escalar entrada: agregados del libro y el stop más protector
+                    self._apply_book(position, book)
+                    current_stop = self.trigger_book.stop_level(symbol) or position.stop_loss
+                    if side == 'buy':
+                        position.stop_loss = max(current_stop, stop_loss)
+                    else:
+                        position.stop_loss = min(current_stop, stop_loss)
+                    position.take_profit = take_profit
+                    if break_even_trigger:
+                        position.break_even_trigger = break_even_trigger
+                
+                self.daily_trades += 1
+                self._arm_triggers(position)
+                
+                if self.recovery:
+                    self._pending_stops.pop(symbol, None)  # el evento lleva el stop actual
+                    self.recovery.append('position_opened', {
+                        'position': position.to_bytes(), 'fill': fill.to_bytes()
+                    })
+                
+                self.logger.info(f"✅ Posición agregada: {symbol} - {side} - Cantidad: {amount} - Precio: {entry_price} "
+                                 f"(lotes: {len(book.lots)}, neto: {book.net_qty}, VWAP: {book.vwap:.6f})")
+                
+                # Guardar inmediatamente
+                self._save_positions()
+                self._save_metrics()
+                self._notify_fill('position_opened', symbol)
+            
+            except Exception as e:
+                self.logger.error(f"Error al agregar posición: {e}")
+                self.logger.error(traceback.format_exc())
+    
+    def add_fill_listener(self, callback):
+        """Registrar un callback(evento, símbolo) que se llama tras cada fill"""
+        self._fill_listeners.append(callback)
+    
+    def _notify_fill(self, event: str, symbol: str):
+        for callback in self._fill_listeners:
+            try:
+                callback(event, symbol)
+            except Exception as e:
+                self.logger.error(f"Error notificando fill de {symbol}: {e}")
     
     def update_position_price(self, symbol: str, current_price: float):
         """Actualizar precio actual de una posición"""
         try:
-            if symbol in self.open_positions:
-                position = self.open_positions[symbol]
-                position['current_price'] = current_price
-                
-                # Calcular PnL no realizado
-                if position['side'] == 'buy':
-                    position['unrealized_pnl'] = (current_price - position['entry_price']) * position['amount']
-                else:
-                    position['unrealized_pnl'] = (position['entry_price'] - current_price) * position['amount']
+            position = self.open_positions.get(symbol)
+            if position is not None:
+                # Actualiza precio y PnL no realizado
+                position.mark(current_price)
+                self.position_book.mark(symbol, current_price)
                 
         except Exception as e:
             self.logger.error(f"Error al actualizar precio de posición: {e}")
@@ -169,31 +253,31 @@ class RiskManager:
             position = self.open_positions[symbol]
             
             # Verificar stop loss
-            if position['side'] == 'buy' and current_price <= position['stop_loss']:
+            if position.side == 'buy' and current_price <= position.stop_loss:
                 return {
                     'action': 'sell',
-                    'reason': f'Stop loss activado: {current_price} <= {position["stop_loss"]}',
-                    'price': position['stop_loss']
+                    'reason': f'Stop loss activado: {current_price} <= {position.stop_loss}',
+                    'price': position.stop_loss
                 }
-            elif position['side'] == 'sell' and current_price >= position['stop_loss']:
+            elif position.side == 'sell' and current_price >= position.stop_loss:
                 return {
                     'action': 'buy',
-                    'reason': f'Stop loss activado: {current_price} >= {position["stop_loss"]}',
-                    'price': position['stop_loss']
+                    'reason': f'Stop loss activado: {current_price} >= {position.stop_loss}',
+                    'price': position.stop_loss
                 }
             
             # Verificar take profit
-            if position['side'] == 'buy' and current_price >= position['take_profit']:
+            if position.side == 'buy' and current_price >= position.take_profit:
                 return {
                     'action': 'sell',
-                    'reason': f'Take profit activado: {current_price} >= {position["take_profit"]}',
-                    'price': position['take_profit']
+                    'reason': f'Take profit activado: {current_price} >= {position.take_profit}',
+                    'price': position.take_profit
                 }
-            elif position['side'] == 'sell' and current_price <= position['take_profit']:
+            elif position.side == 'sell' and current_price <= position.take_profit:
                 return {
                     'action': 'buy',
-                    'reason': f'Take profit activado: {current_price} <= {position["take_profit"]}',
-                    'price': position['take_profit']
+                    'reason': f'Take profit activado: {current_price} <= {position.take_profit}',
+                    'price': position.take_profit
                 }
             
             return {'action': 'none', 'reason': ''}
@@ -202,79 +286,228 @@ class RiskManager:
             self.logger.error(f"Error al verificar stop loss/take profit: {e}")
             return {'action': 'none', 'reason': ''}
     
-    def close_position(self, symbol: str, exit_price: float, exit_reason: str = 'manual'):
-        """Cerrar posición y calcular PnL"""
+    def evaluate_price(self, symbol: str, current_price: float) -> List[Dict]:
+        """Evaluar un precio contra el libro de disparadores.
+        
+        Sólo devuelve las acciones de los niveles cruzados; los disparadores
+        devueltos se retiran del libro (ver `rearm_triggers` si la salida falla).
+        """
+        actions = []
         try:
-            if symbol not in self.open_positions:
-                self.logger.warning(f"⚠️ Intento de cerrar posición inexistente: {symbol}")
-                return {'success': False, 'reason': 'Posición no encontrada'}
-            
-            position = self.open_positions[symbol]
-            
-            # Calcular PnL final
-            if position['side'] == 'buy':
-                pnl = (exit_price - position['entry_price']) * position['amount']
-            else:
-                pnl = (position['entry_price'] - exit_price) * position['amount']
-            
-            pnl_percentage = (pnl / (position['entry_price'] * position['amount'])) * 100
-            
-            # Actualizar estadísticas
-            self.total_pnl += pnl
-            self.daily_pnl += pnl
-            
-            # Calcular duración
-            entry_time = position.get('entry_time', datetime.now())
-            exit_time = datetime.now()
-            duration_minutes = (exit_time - entry_time).total_seconds() / 60
-            
-            # Crear registro para historial
-            trade_record = {
-                'symbol': symbol,
-                'side': position['side'],
-                'entry_price': position['entry_price'],
-                'exit_price': exit_price,
-                'amount': position['amount'],
-                'pnl': round(pnl, 2),
-                'pnl_percentage': round(pnl_percentage, 2),
-                'reason': exit_reason,
-                'duration_minutes': int(duration_minutes),
-                'timestamp': exit_time.isoformat()
-            }
-            
-            # Agregar a lista de trades cerrados
-            self.closed_trades.append(trade_record)
-            
-            # Remover de posiciones abiertas
-            del self.open_positions[symbol]
-            
-            self.logger.info(f"✅ Posición cerrada: {symbol} - PnL: ${pnl:.2f} ({pnl_percentage:.2f}%) - Razón: {exit_reason}")
-            
-            # Guardar inmediatamente
-            self._save_positions()
-            self._save_trades_history()
-            self._save_metrics()
-            
-            return {
-                'success': True,
-                'pnl': pnl,
-                'pnl_percentage': pnl_percentage,
-                'total_pnl': self.total_pnl,
-                'daily_pnl': self.daily_pnl
-            }
+            with self.lock:
+                triggers = self.trigger_book.on_price(symbol, current_price)
             
+            for trigger in triggers:
+                position = self.open_positions.get(trigger['id'])
+                if position is None:
+                    continue
+                
+                if trigger['kind'] == BREAK_EVEN:
+                    self._move_stop_to_break_even(position)
+                    continue
+                
+                exit_action = 'sell' if position.side == 'buy' else 'buy'
+                label = 'Stop loss' if trigger['kind'] == STOP_LOSS else 'Take profit'
+                comparison = '<=' if (trigger['kind'] == STOP_LOSS) == (position.side == 'buy') else '>='
+                actions.append({
+                    'action': exit_action,
+                    'reason': f'{label} activado: {current_price} {comparison} {trigger["level"]}',
+                    'price': trigger['level']
+                })
+                
         except Exception as e:
-            self.logger.error(f"Error al cerrar posición: {e}")
-            self.logger.error(traceback.format_exc())
-            return {'success': False, 'reason': str(e)}
+            self.logger.error(f"Error evaluando disparadores de {symbol}: {e}")
+        
+        return actions
+    
+    def rearm_triggers(self, symbol: str):
+        """Volver a armar stop/take profit de una posición cuya salida falló"""
+        position = self.open_positions.get(symbol)
+        if position:
+            self._arm_triggers(position)
+    
+    def _arm_triggers(self, position: Position):
+        symbol = position.symbol
+        with self.lock:
+            self.trigger_book.add_stop(symbol, symbol, position.side, position.stop_loss,
+                                       position.trailing_stop_percentage or None)
+            self.trigger_book.add_target(symbol, symbol, position.side, position.take_profit)
+            
+            # El break-even sólo tiene sentido mientras el stop no cubra la entrada
+            break_even = position.break_even_trigger
+            if break_even and not self._stop_covers_entry(position):
+                self.trigger_book.add_break_even(symbol, symbol, position.side, break_even)
+    
+    def _move_stop_to_break_even(self, position: Position):
+        """Mover el stop al precio de entrada cuando se alcanza el nivel de break-even"""
+        with self.lock:
+            if self._stop_covers_entry(position):
+                return
+            symbol = position.symbol
+            position.stop_loss = position.entry_price
+            self.trigger_book.move_stop(symbol, symbol, position.side, position.entry_price)
+            if self.recovery:
+                self._pending_stops[symbol] = position.stop_loss
+            self.logger.info(f"🔒 Stop de {symbol} movido a break-even: {position.entry_price}")
+    
+    @staticmethod
+    def _stop_covers_entry(position: Position) -> bool:
+        if position.side == 'buy':
+            return position.stop_loss >= position.entry_price
+        return position.stop_loss <= position.entry_price
+    
+    @staticmethod
+    def _apply_book(position: Position, book):
+        """Copiar a la posición los agregados del libro de lotes (O(1))"""
+        position.amount = book.net_qty
+        position.entry_price = book.vwap
+        position.mark(position.current_price)
+    
+    def _sync_position_book(self, lots: Optional[Dict[str, List[Fill]]] = None):
+        """Crear lotes para las posiciones que no los tengan (archivos antiguos)"""
+        for symbol, position in self.open_positions.items():
+            if symbol in self.position_book:
+                continue
+            symbol_lots = (lots or {}).get(symbol) or [
+                Fill(symbol, position.side, position.amount, position.entry_price,
+                     position.order_id, position.entry_time)
+            ]
+            for fill in symbol_lots:
+                self.position_book.add_fill(fill)
+            self.position_book.mark(symbol, position.current_price)
+        
+        for symbol in [s for s in self.position_book.books if s not in self.open_positions]:
+            self.position_book.remove(symbol)
+    
+    def _rebuild_trigger_book(self):
+        for position in self.open_positions.values():
+            try:
+                self._arm_triggers(position)
+            except Exception as e:
+                self.logger.error(f"Error armando disparadores de {position.symbol}: {e}")
+    
+    def _on_stop_ratchet(self, symbol: str, new_level: float):
+        """Reflejar en la posición la subida de un stop móvil (el WAL se escribe por lotes)"""
+        position = self.open_positions.get(symbol)
+        if position:
+            position.stop_loss = new_level
+            if self.recovery:
+                self._pending_stops[symbol] = new_level
+    
+    def flush_stop_moves(self):
+        """Escribir en el WAL, en un solo evento, los stops movidos desde el último lote.
+        
+        Lo llama el motor de stops tras cada lote de precios y el snapshot; un
+        reinicio entre lotes sólo pierde el último trailing, que se vuelve a
+        subir con el siguiente precio.
+        """
+        with self.lock:
+            if not self._pending_stops:
+                return
+            stops, self._pending_stops = self._pending_stops, {}
+            self.recovery.append('stops_moved', {'stops': stops})
+    
+    def close_position(self, symbol: str, exit_price: float, exit_reason: str = 'manual',
+                       amount: Optional[float] = None):
+        """Cerrar posición (o parte de ella si se indica amount) y calcular PnL"""
+        with self.lock:
+            try:
+                if symbol not in self.open_positions:
+                    self.logger.warning(f"⚠️ Intento de cerrar posición inexistente: {symbol}")
+                    return {'success': False, 'reason': 'Posición no encontrada'}
+                
+                position = self.open_positions[symbol]
+                if amount is None or amount >= position.amount:
+                    amount = position.amount
+                
+                if symbol not in self.position_book:
+                    self._sync_position_book()
+                
+                # PnL de los lotes consumidos (FIFO o coste medio)
+                reduced = self.position_book.reduce(symbol, amount, exit_price)
+                amount = reduced['amount']
+                pnl = reduced['pnl']
+                entry_price = reduced['entry_price']
+                book = self.position_book.get(symbol)
+                
+                entry_value = entry_price * amount
+                pnl_percentage = (pnl / entry_value) * 100 if entry_value > 0 else 0.0
+                
+                # Actualizar estadísticas
+                self.total_pnl += pnl
+                self.daily_pnl += pnl
+                
+                # Calcular duración
+                exit_time = datetime.now()
+                duration_minutes = (exit_time.timestamp() - position.entry_time) / 60
+                
+                # Crear registro para historial
+                trade_record = ClosedTrade(
+                    symbol, position.side, entry_price, exit_price, amount,
+                    pnl, pnl_percentage, exit_reason, int(duration_minutes), exit_time.timestamp()
+                )
+                
+                # Agregar al historial de trades cerrados
+                self.closed_trades.append(trade_record)
+                
+                if book is None:
+                    # Remover de posiciones abiertas
+                    del self.open_positions[symbol]
+                    self.trigger_book.remove(symbol)
+                    self._pending_stops.pop(symbol, None)
+                    remaining = 0.0
+                else:
+                    # Salida parcial: la posición queda con los lotes restantes
+                    self._apply_book(position, book)
+                    remaining = book.net_qty
+                
+                if self.recovery:
+                    self.recovery.append('position_closed', {
+                        'symbol': symbol, 'pnl': pnl, 'timestamp': exit_time, 'trade': trade_record.to_bytes(),
+                        'amount': amount
+                    })
+                
+                if remaining:
+                    self.logger.info(f"✅ Salida parcial: {symbol} - {amount} (quedan {remaining}) - PnL: ${pnl:.2f} ({pnl_percentage:.2f}%) - Razón: {exit_reason}")
+                else:
+                    self.logger.info(f"✅ Posición cerrada: {symbol} - PnL: ${pnl:.2f} ({pnl_percentage:.2f}%) - Razón: {exit_reason}")
+                
+                # Guardar inmediatamente
+                self._save_positions()
+                self._save_trades_history()
+                self._save_metrics()
+                self._notify_fill('position_closed', symbol)
+                
+                return {
+                    'success': True,
+                    'amount': amount,
+                    'remaining': remaining,
+                    'pnl': pnl,
+                    'pnl_percentage': pnl_percentage,
+                    'total_pnl': self.total_pnl,
+                    'daily_pnl': self.daily_pnl
+                }
+            
+            except Exception as e:
+                self.logger.error(f"Error al cerrar posición: {e}")
+                self.logger.error(traceback.format_exc())
+                return {'success': False, 'reason': str(e)}
+    
+    def exposures(self) -> Dict[str, float]:
+        """Exposición con signo (valor de mercado) por símbolo"""
+        return {
+            symbol: pos.current_value if pos.side == 'buy' else -pos.current_value
+            for symbol, pos in self.open_positions.items()
+        }
     
     def calculate_portfolio_metrics(self, account_balance: float) -> Dict:
         """Calcular métricas del portafolio"""
         try:
-            total_unrealized_pnl = sum(pos['unrealized_pnl'] for pos in self.open_positions.values())
+            total_unrealized_pnl = sum(pos.unrealized_pnl for pos in self.open_positions.values())
             total_value = account_balance + total_unrealized_pnl
             
             return {
+                **self.analytics.report(self.exposures()),
                 'account_balance': account_balance,
                 'total_unrealized_pnl': total_unrealized_pnl,
                 'total_value': total_value,
@@ -292,11 +525,140 @@ class RiskManager:
     
     def reset_daily_metrics(self):
         """Reiniciar métricas diarias"""
-        self.daily_pnl = 0.0
-        self.daily_trades = 0
+        with self.lock:
+            self.daily_pnl = 0.0
+            self.daily_trades = 0
+            if self.recovery:
+                self.recovery.append('metrics_reset', {'timestamp': datetime.now()})
         self.logger.info("🔄 Métricas diarias reiniciadas")
         self._save_metrics()
     
+    def export_state(self) -> Dict:
+        """Exportar una copia del estado para el snapshot de recuperación.
+        
+        Se copia bajo `self.lock`: quien necesite la secuencia del WAL que
+        corresponde a esta copia debe leerla dentro del mismo bloqueo.
+        """
+        with self.lock:
+            self.flush_stop_moves()
+            return copy.deepcopy({
+                'open_positions': {symbol: pos.to_bytes() for symbol, pos in self.open_positions.items()},
+                'closed_trades': self.closed_trades,
+                'position_book': self.position_book,
+                'analytics': self.analytics,
+                'daily_pnl': self.daily_pnl,
+                'total_pnl': self.total_pnl,
+                'daily_trades': self.daily_trades,
+                'saved_at': datetime.now()
+            })
+    
+    def import_state(self, state: Dict):
+        """Restaurar estado desde un snapshot de recuperación"""
+        self.open_positions = {
+            symbol: self._position_from_state(pos) for symbol, pos in state.get('open_positions', {}).items()
+        }
+        self.position_book = state.get('position_book') or PositionBook(Config.POSITION_ACCOUNTING_METHOD)
+        self._sync_position_book()
+        if state.get('analytics') is not None:
+            self.analytics = state['analytics']
+        self.closed_trades = state.get('closed_trades')
+        if self.closed_trades is None:
+            # Snapshot sin historial: cargarlo una vez desde el JSON
+            self.closed_trades = ClosedTradeStore()
+            self._load_trades_history()
+        self.total_pnl = state.get('total_pnl', 0.0)
+        
+        saved_at = state.get('saved_at')
+        if saved_at and saved_at.date() == datetime.now().date():
+            self.daily_pnl = state.get('daily_pnl', 0.0)
+            self.daily_trades = state.get('daily_trades', 0)
+        else:
+            self.daily_pnl = 0.0
+            self.daily_trades = 0
+    
+    def apply_event(self, event_type: str, payload: Dict):
+        """Reproducir un evento del WAL sobre el estado actual"""
+        today = datetime.now().date()
+        
+        if event_type == 'position_opened':
+            position = self._position_from_state(payload['position'])
+            self.open_positions[position.symbol] = position
+            if 'fill' in payload:
+                self.position_book.add_fill(Fill.from_bytes(payload['fill']))
+            if datetime.fromtimestamp(position.entry_time).date() == today:
+                self.daily_trades += 1
+        
+        elif event_type == 'position_closed':
+            symbol = payload['symbol']
+            trade = ClosedTrade.from_bytes(payload['trade']) if 'trade' in payload else None
+            if trade is not None and 'amount' in payload and symbol in self.position_book:
+                self.position_book.reduce(symbol, payload['amount'], trade.exit_price)
+            else:
+                self.position_book.remove(symbol)
+            
+            book = self.position_book.get(symbol)
+            if book is None:
+                self.open_positions.pop(symbol, None)
+            elif symbol in self.open_positions:
+                self._apply_book(self.open_positions[symbol], book)
+            
+            if trade is not None:
+                self.closed_trades.append(trade)
+            self.total_pnl += payload['pnl']
+            if payload['timestamp'].date() == today:
+                self.daily_pnl += payload['pnl']
+        
+        elif event_type == 'stop_moved':
+            position = self.open_positions.get(payload['symbol'])
+            if position:
+                position.stop_loss = payload['stop_loss']
+        
+        elif event_type == 'stops_moved':
+            for symbol, stop_loss in payload['stops'].items():
+                position = self.open_positions.get(symbol)
+                if position:
+                    position.stop_loss = stop_loss
+        
+        elif event_type == 'metrics_reset':
+            if payload['timestamp'].date() == today:
+                self.daily_pnl = 0.0
+                self.daily_trades = 0
+    
+    @staticmethod
+    def _position_from_state(data) -> Position:
+        # Snapshots anteriores guardaban las posiciones como dict
+        return Position.from_bytes(data) if isinstance(data, bytes) else Position.from_dict(data)
+    
+    def _restore_from_recovery(self) -> bool:
+        """Restaurar desde snapshot + WAL en lugar de reparsear los JSON"""
+        if self.recovery is None:
+            return False
+        
+        try:
+            recovered = self.recovery.load()
+            risk_state = recovered.state.get('risk')
+            if not risk_state:
+                # Sin snapshot base el WAL no es reproducible: usar los JSON
+                return False
+            
+            self.import_state(risk_state)
+            for event_type, payload in recovered.events:
+                self.apply_event(event_type, payload)
+            
+            self.logger.info(f"♻️ RiskManager restaurado: {len(self.open_positions)} posiciones, PnL total={self.total_pnl:.2f}")
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Error restaurando estado, se cargarán los JSON: {e}")
+            self.logger.error(traceback.format_exc())
+            self.open_positions = {}
+            self.position_book = PositionBook(Config.POSITION_ACCOUNTING_METHOD)
+            self.closed_trades = ClosedTradeStore()
+            self.daily_pnl = 0.0
+            self.total_pnl = 0.0
+            self.daily_trades = 0
+            return False
+    
     def get_risk_report(self) -> Dict:
         """Generar reporte de riesgo"""
         try:
@@ -309,7 +671,7 @@ class RiskManager:
                 'max_daily_loss_limit': Config.MAX_DAILY_LOSS,
                 'max_positions_limit': Config.MAX_OPEN_POSITIONS,
                 'risk_per_trade': Config.RISK_PERCENTAGE,
-                'positions_detail': list(self.open_positions.values())
+                'positions_detail': [pos.to_dict() for pos in self.open_positions.values()]
             }
         except Exception as e:
             self.logger.error(f"Error al generar reporte de riesgo: {e}")
@@ -317,6 +679,14 @@ class RiskManager:
     
     def _save_json_safe(self, filepath: str, data: dict, backup: bool = True):
         """Guardar JSON de forma segura con backup"""
+        series = self._persist_series.get(filepath)
+        if series is None:
+            series = self._persist_series[filepath] = PERSIST_SECONDS.labels(os.path.basename(filepath))
+        with series.time():
+            return self._write_json_safe(filepath, data, backup)
+    
+    def _write_json_safe(self, filepath: str, data: dict, backup: bool):
+        temp_file = f"{filepath}.tmp"
         try:
             # Crear backup del archivo actual si existe
             if backup and os.path.exists(filepath):
@@ -328,7 +698,6 @@ class RiskManager:
                     self.logger.warning(f"No se pudo crear backup: {e}")
             
             # Guardar en archivo temporal primero
-            temp_file = f"{filepath}.tmp"
             with open(temp_file, 'w') as f:
                 json.dump(data, f, indent=2, default=str)
             
@@ -344,6 +713,7 @@ class RiskManager:
             return True
             
         except Exception as e:
+            PERSIST_ERRORS.labels(os.path.basename(filepath)).inc()
             self.logger.error(f"Error guardando JSON {filepath}: {e}")
             self.logger.error(traceback.format_exc())
             # Limpiar archivo temporal si existe
@@ -400,12 +770,10 @@ class RiskManager:
             # Solo guardar posiciones realmente abiertas
             positions_to_save = {}
             for symbol, pos in self.open_positions.items():
-                if pos.get('status') == 'open':
-                    # Convertir datetime a string
-                    pos_copy = pos.copy()
-                    if 'entry_time' in pos_copy and isinstance(pos_copy['entry_time'], datetime):
-                        pos_copy['entry_time'] = pos_copy['entry_time'].isoformat()
-                    positions_to_save[symbol] = pos_copy
+                if pos.status == 'open':
+                    data = pos.to_dict()
+                    data['lots'] = [fill.to_dict() for fill in self.position_book.lots(symbol)]
+                    positions_to_save[symbol] = data
             
             self._save_json_safe(self.positions_file, positions_to_save)
             self.logger.debug(f"💾 Posiciones guardadas: {len(positions_to_save)}")
@@ -421,21 +789,18 @@ class RiskManager:
             
             # Filtrar solo posiciones realmente abiertas
             open_count = 0
+            lots = {}
             for symbol, pos in data.items():
                 if pos.get('status') == 'open' or 'status' not in pos:
-                    # Convertir string a datetime
-                    if 'entry_time' in pos and isinstance(pos['entry_time'], str):
-                        try:
-                            pos['entry_time'] = datetime.fromisoformat(pos['entry_time'])
-                        except:
-                            pos['entry_time'] = datetime.now()
-                    
-                    self.open_positions[symbol] = pos
+                    pos.setdefault('symbol', symbol)
+                    self.open_positions[symbol] = Position.from_dict(pos)
+                    lots[symbol] = [Fill.from_dict(fill) for fill in pos.get('lots', [])]
                     open_count += 1
                 else:
                     self.logger.info(f"⚠️ Posición cerrada encontrada en archivo: {symbol}, se ignorará")
             
             if open_count > 0:
+                self._sync_position_book(lots)
                 self.logger.info(f"✅ {open_count} posiciones abiertas cargadas")
             
         except Exception as e:
@@ -446,43 +811,23 @@ class RiskManager:
     def _save_trades_history(self):
         """Guardar historial de trades"""
         try:
-            # Cargar historial existente
-            existing = self._load_json_safe(self.trades_file)
-            if not isinstance(existing, list):
-                existing = []
-            
-            # Agregar nuevos trades cerrados
-            all_trades = existing + self.closed_trades
-            
-            # Limpiar duplicados (por timestamp)
-            seen = set()
-            unique_trades = []
-            for trade in all_trades:
-                timestamp = trade.get('timestamp', '')
-                if timestamp and timestamp not in seen:
-                    seen.add(timestamp)
-                    unique_trades.append(trade)
-            
-            # Ordenar por timestamp descendente (más reciente primero)
-            unique_trades.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
-            
-            # Guardar
-            self._save_json_safe(self.trades_file, unique_trades)
-            self.logger.debug(f"💾 Historial guardado: {len(unique_trades)} trades")
-            
-            # Limpiar lista temporal
-            self.closed_trades = []
+            # El historial completo vive en memoria: no hace falta releer el archivo
+            trades = self.closed_trades.to_dicts(newest_first=True)
+            self._save_json_safe(self.trades_file, trades)
+            self.logger.debug(f"💾 Historial guardado: {len(trades)} trades")
             
         except Exception as e:
             self.logger.error(f"Error guardando historial: {e}")
             self.logger.error(traceback.format_exc())
     
     def _load_trades_history(self):
-        """Cargar historial de trades (solo para estadísticas)"""
+        """Cargar historial de trades en el almacén columnar"""
         try:
             trades = self._load_json_safe(self.trades_file)
             if isinstance(trades, list):
-                self.logger.info(f"📊 {len(trades)} trades en historial")
+                # Sin duplicados y en orden cronológico (el archivo guarda los más recientes primero)
+                self.closed_trades = ClosedTradeStore.from_dicts(trades)
+                self.logger.info(f"📊 {len(self.closed_trades)} trades en historial")
         except Exception as e:
             self.logger.error(f"Error cargando historial: {e}")
     
@@ -0,0 +1,249 @@
+"""
+Motor de reglas de riesgo pre-trade
+
+Los límites se precompilan en RiskLimits (sin leer Config en cada llamada) y
+cada regla es una función pequeña que devuelve None o un Rejection. El motor
+evalúa lotes de órdenes candidatas sobre un RiskContext construido una sola
+vez por lote; las órdenes aceptadas se aplican al contexto para que las
+siguientes del mismo lote vean su efecto (p. ej. el límite de posiciones).
+"""
+from typing import Callable, Dict, List, Optional
+
+from config import Config
+
+DEFAULT_MIN_NOTIONAL = 5.0  # $5 mínimo (algunos pares de Binance permiten desde $5)
+
+
+class OrderRequest:
+    __slots__ = ('symbol', 'side', 'amount', 'price')
+
+    def __init__(self, symbol: str, side: str, amount: float, price: float):
+        self.symbol = symbol
+        self.side = side
+        self.amount = amount
+        self.price = price
+
+    @property
+    def notional(self) -> float:
+        return self.amount * self.price
+
+
+class Rejection:
+    __slots__ = ('rule', 'reason', 'limit', 'value')
+
+    def __init__(self, rule: str, reason: str, limit=None, value=None):
+        self.rule = rule
+        self.reason = reason
+        self.limit = limit
+        self.value = value
+
+    def to_dict(self) -> Dict:
+        return {'rule': self.rule, 'reason': self.reason, 'limit': self.limit, 'value': self.value}
+
+    def __repr__(self):
+        return f"Rejection({self.rule}: {self.reason})"
+
+
+class RiskLimits:
+    """Límites leídos una vez de Config (llamar a refresh() si cambia la configuración)"""
+
+    __slots__ = ('max_open_positions', 'max_lots_per_symbol', 'max_daily_trades',
+                 'max_daily_loss', 'max_asset_exposure_pct', 'min_notional')
+
+    def __init__(self, max_daily_trades: int = 10):
+        self.max_daily_trades = max_daily_trades
+        self.min_notional: Dict[str, float] = {}
+        self.refresh()
+
+    def refresh(self):
+        self.max_open_positions = Config.MAX_OPEN_POSITIONS
+        self.max_lots_per_symbol = Config.MAX_LOTS_PER_SYMBOL
+        self.max_daily_loss = Config.MAX_DAILY_LOSS
+        self.max_asset_exposure_pct = Config.MAX_ASSET_EXPOSURE_PERCENTAGE
+
+    def set_min_notional(self, limits: Dict[str, float]):
+        """Mínimos por símbolo obtenidos de los límites de mercado del exchange"""
+        self.min_notional.update({symbol: value for symbol, value in limits.items() if value})
+
+    def min_notional_for(self, symbol: str) -> float:
+        return self.min_notional.get(symbol, DEFAULT_MIN_NOTIONAL)
+
+
+class RiskContext:
+    """Estado del libro que necesitan las reglas, capturado una vez por lote"""
+
+    __slots__ = ('open_count', 'daily_trades', 'daily_pnl', 'sides', 'lots',
+                 'exposures', 'capital', 'analytics')
+
+    def __init__(self, open_count: int = 0, daily_trades: int = 0, daily_pnl: float = 0.0,
+                 sides: Optional[Dict[str, str]] = None, lots: Optional[Dict[str, int]] = None,
+                 exposures: Optional[Dict[str, float]] = None, capital: float = 0.0,
+                 analytics=None):
+        self.open_count = open_count
+        self.daily_trades = daily_trades
+        self.daily_pnl = daily_pnl
+        self.sides = sides or {}
+        self.lots = lots or {}
+        self.exposures = exposures or {}
+        self.capital = capital
+        self.analytics = analytics
+
+    def is_exit(self, order: OrderRequest) -> bool:
+        side = self.sides.get(order.symbol)
+        return side is not None and side != order.side
+
+    def apply(self, order: OrderRequest):
+        """Reflejar una orden de entrada aceptada"""
+        symbol = order.symbol
+        if symbol not in self.sides:
+            self.sides[symbol] = order.side
+            self.open_count += 1
+        self.lots[symbol] = self.lots.get(symbol, 0) + 1
+        self.daily_trades += 1
+        signed = order.notional if order.side == 'buy' else -order.notional
+        self.exposures[symbol] = self.exposures.get(symbol, 0.0) + signed
+
+
+Rule = Callable[[OrderRequest, RiskContext, RiskLimits], Optional[Rejection]]
+
+
+def check_position_slots(order: OrderRequest, ctx: RiskContext, limits: RiskLimits) -> Optional[Rejection]:
+    lots = ctx.lots.get(order.symbol)
+    if lots is not None:
+        if lots >= limits.max_lots_per_symbol:
+            if limits.max_lots_per_symbol <= 1:
+                return Rejection('position_slots', f'Ya existe una posición abierta para {order.symbol}',
+                                 limits.max_lots_per_symbol, lots)
+            return Rejection('position_slots',
+                             f'Máximo de lotes alcanzado para {order.symbol} ({limits.max_lots_per_symbol})',
+                             limits.max_lots_per_symbol, lots)
+    elif ctx.open_count >= limits.max_open_positions:
+        return Rejection('max_positions',
+                         f'Máximo de posiciones abiertas alcanzado ({limits.max_open_positions})',
+                         limits.max_open_positions, ctx.open_count)
+    return None
+
+
+def check_daily_trades(order: OrderRequest, ctx: RiskContext, limits: RiskLimits) -> Optional[Rejection]:
+    if ctx.daily_trades >= limits.max_daily_trades:
+        return Rejection('daily_trades', f'Límite de trades diarios alcanzado ({limits.max_daily_trades})',
+                         limits.max_daily_trades, ctx.daily_trades)
+    return None
+
+
+def check_daily_loss(order: OrderRequest, ctx: RiskContext, limits: RiskLimits) -> Optional[Rejection]:
+    if ctx.daily_pnl <= -limits.max_daily_loss:
+        return Rejection('daily_loss', f'Pérdida diaria máxima alcanzada ({limits.max_daily_loss}%)',
+                         -limits.max_daily_loss, ctx.daily_pnl)
+    return None
+
+
+def check_min_notional(order: OrderRequest, ctx: RiskContext, limits: RiskLimits) -> Optional[Rejection]:
+    minimum = limits.min_notional_for(order.symbol)
+    notional = order.notional
+    if notional < minimum:
+        return Rejection('min_notional', f'Valor de orden muy pequeño (mínimo ${minimum})', minimum, notional)
+    return None
+
+
+def check_asset_exposure(order: OrderRequest, ctx: RiskContext, limits: RiskLimits) -> Optional[Rejection]:
+    if limits.max_asset_exposure_pct <= 0 or ctx.capital <= 0:
+        return None
+    cap = ctx.capital * limits.max_asset_exposure_pct / 100
+    exposure = abs(ctx.exposures.get(order.symbol, 0.0)) + order.notional
+    if exposure > cap:
+        return Rejection('asset_exposure',
+                         f'Exposición en {order.symbol} excesiva: ${exposure:.2f} > {limits.max_asset_exposure_pct}% del capital',
+                         cap, exposure)
+    return None
+
+
+def check_concentration(order: OrderRequest, ctx: RiskContext, limits: RiskLimits) -> Optional[Rejection]:
+    if ctx.analytics is None:
+        return None
+    signed = order.notional if order.side == 'buy' else -order.notional
+    reason = ctx.analytics.check_concentration(order.symbol, signed, ctx.exposures, ctx.capital)
+    return Rejection('concentration', reason) if reason else None
+
+
+DEFAULT_RULES: List[Rule] = [
+    check_position_slots,
+    check_daily_trades,
+    check_daily_loss,
+    check_min_notional,
+    check_asset_exposure,
+    check_concentration,
+]
+
+# Reglas que también se aplican a órdenes que reducen una posición (ninguna por defecto)
+EXIT_RULES: List[Rule] = []
+
+
+class RiskRuleEngine:
+    def __init__(self, limits: RiskLimits, rules: Optional[List[Rule]] = None,
+                 exit_rules: Optional[List[Rule]] = None):
+        self.limits = limits
+        self.rules = list(DEFAULT_RULES if rules is None else rules)
+        self.exit_rules = list(EXIT_RULES if exit_rules is None else exit_rules)
+
+    def add_rule(self, rule: Rule, applies_to_exits: bool = False):
+        self.rules.append(rule)
+        if applies_to_exits:
+            self.exit_rules.append(rule)
+
+    def check(self, order: OrderRequest, ctx: RiskContext) -> Optional[Rejection]:
+        """Primera regla incumplida por la orden (None si pasa todas)"""
+        limits = self.limits
+        rules = self.exit_rules if ctx.is_exit(order) else self.rules
+        for rule in rules:
+            rejection = rule(order, ctx, limits)
+            if rejection is not None:
+                return rejection
+        return None
+
+    def evaluate_batch(self, orders: List[OrderRequest], ctx: RiskContext) -> List[Optional[Rejection]]:
+        """Evaluar un lote de órdenes; las aceptadas consumen límites para las siguientes"""
+        results = []
+        for order in orders:
+            rejection = self.check(order, ctx)
+            if rejection is None and not ctx.is_exit(order):
+                ctx.apply(order)
+            results.append(rejection)
+        return results
+
+
+if __name__ == "__main__":
+    # Benchmark: latencia por comprobación en microsegundos
+    import time
+
+    limits = RiskLimits(max_daily_trades=10_000)
+    limits.set_min_notional({symbol: 5.0 for symbol in Config.SYMBOLS})
+    # Límites holgados para que la mayoría de órdenes recorra todas las reglas
+    limits.max_open_positions = limits.max_lots_per_symbol = 10_000
+    engine = RiskRuleEngine(limits)
+
+    def fresh_context() -> RiskContext:
+        return RiskContext(open_count=1, daily_trades=3, daily_pnl=-1.0,
+                           sides={'BTC/USDC': 'buy'}, lots={'BTC/USDC': 1},
+                           exposures={'BTC/USDC': 200.0}, capital=1000.0)
+
+    orders = [OrderRequest(Config.SYMBOLS[i % len(Config.SYMBOLS)], 'buy', 0.5 + i % 7, 20.0)
+              for i in range(1000)]
+
+    ctx = fresh_context()
+    rounds = 100_000
+    started = time.perf_counter()
+    for i in range(rounds):
+        engine.check(orders[i % len(orders)], ctx)
+    single_us = (time.perf_counter() - started) / rounds * 1e6
+
+    batches = 200
+    started = time.perf_counter()
+    for _ in range(batches):
+        engine.evaluate_batch(orders, fresh_context())
+    batch_us = (time.perf_counter() - started) / (batches * len(orders)) * 1e6
+
+    rejected = sum(1 for r in engine.evaluate_batch(orders, fresh_context()) if r)
+    print(f"check():          {single_us:.2f} µs por orden ({len(engine.rules)} reglas)")
+    print(f"evaluate_batch(): {batch_us:.2f} µs por orden en lotes de {len(orders)} "
+          f"({rejected} rechazadas en el último lote)")
@@ -16,21 +16,26 @@ def main():
     try:
         # Verificar dependencias
         import uvicorn
+        from config import Config
         from web_interface import app
         
+        workers = max(1, Config.WEB_WORKERS)
         print("✅ Interfaz web cargada correctamente")
         print("🌐 Servidor iniciando en http://localhost:8000")
+        if workers > 1:
+            print(f"⚙️ {workers} workers: uno aloja el motor, el resto sirve lecturas del estado compartido")
         print("📊 Abre tu navegador y ve a la URL para acceder al dashboard")
         print("Presiona Ctrl+C para detener el servidor")
         print("=" * 50)
         
-        # Ejecutar servidor
+        # Ejecutar servidor (con varios workers uvicorn necesita la ruta de importación de la app)
         uvicorn.run(
-            app, 
+            "web_interface:app" if workers > 1 else app,
             host="0.0.0.0", 
             port=8000, 
             log_level="info",
-            reload=False
+            reload=False,
+            workers=workers
         )
         
     except KeyboardInterrupt:
@@ -39,8 +44,40 @@ def main():
         print(f"❌ Error: {e}")
         sys.exit(1)
 
+def benchmark_startup(port: int = 8765, timeout: float = 30.0):
+    """Medir el tiempo desde el lanzamiento del proceso hasta que "/" responde"""
+    import subprocess
+    import time
+    import urllib.request
+
+    print("⏱️ Midiendo arranque de la interfaz web...")
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'web_interface:app', '--host', '127.0.0.1',
+         '--port', str(port), '--log-level', 'warning'],
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=1) as response:
+                    if response.status == 200:
+                        elapsed = time.perf_counter() - started
+                        print(f"✅ \"/\" servido {elapsed * 1000:.0f} ms después del lanzamiento")
+                        return elapsed
+            except OSError:
+                time.sleep(0.01)
+        print(f"❌ \"/\" no respondió en {timeout:.0f}s")
+        return None
+    finally:
+        server.terminate()
+        server.wait()
+
 if __name__ == "__main__":
-    main()
+    if '--benchmark' in sys.argv:
+        benchmark_startup()
+    else:
+        main()
 
 
 
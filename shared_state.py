@@ -0,0 +1,233 @@
+"""
+Estado compartido entre los workers de la interfaz web
+
+Con varios workers de uvicorn cada proceso tiene su propia memoria, así que
+el estado que ven los dashboards no puede vivir en variables globales:
+
+- SharedStateStore: claves JSON en data/shared escritas de forma atómica
+  (archivo temporal + os.replace, sin lecturas a medias). Cada proceso guarda
+  el valor ya parseado junto a la versión del archivo y sólo vuelve a
+  parsearlo cuando cambia.
+- EventBroker: registro de eventos de sólo-añadir. Cualquier worker publica
+  y todos leen los eventos nuevos desde su último offset.
+- EngineLock: elección con flock del único worker que aloja el motor de
+  trading. Los demás sólo leen el estado compartido y reenvían las órdenes
+  de control al motor a través del broker.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin flock, un solo worker
+    fcntl = None
+
+from config import Config
+
+# Tamaño a partir del cual se rota el registro de eventos
+MAX_EVENT_LOG_BYTES = 1024 * 1024
+
+
+def _file_version(path: str) -> Optional[Hashable]:
+    try:
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+
+def atomic_write_json(path: str, data: Any):
+    """Escribir JSON sin que un lector pueda ver el archivo a medio escribir"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_file, 'w') as f:
+            json.dump(data, f, default=str)
+        os.replace(temp_file, path)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+
+class SharedStateStore:
+    def __init__(self, directory: Optional[str] = None):
+        self.logger = logging.getLogger(__name__)
+        self.directory = directory or Config.SHARED_STATE_DIR
+        os.makedirs(self.directory, exist_ok=True)
+        # clave -> (versión del archivo, valor parseado)
+        self._cache: Dict[str, Tuple[Hashable, Any]] = {}
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def put(self, key: str, value: Any):
+        try:
+            atomic_write_json(self.path(key), value)
+        except Exception as e:
+            self.logger.error(f"Error guardando estado compartido {key}: {e}")
+
+    def version(self, key: str) -> Optional[Hashable]:
+        return _file_version(self.path(key))
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Valor actual de la clave (sin parsear de nuevo si el archivo no cambió)"""
+        path = self.path(key)
+        version = _file_version(path)
+        if version is None:
+            return default
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        try:
+            with open(path, 'r') as f:
+                value = json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"No se pudo leer estado compartido {key}: {e}")
+            return cached[1] if cached is not None else default
+        self._cache[key] = (version, value)
+        return value
+
+
+class EventBroker:
+    """Eventos entre workers sobre un registro de sólo-añadir (una línea JSON por evento)"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.logger = logging.getLogger(__name__)
+        self.path = path or os.path.join(Config.SHARED_STATE_DIR, 'events.log')
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.rotated_path = f"{self.path}.1"
+        self.pid = os.getpid()
+        self._inode: Optional[int] = None
+        self._offset = 0
+        self._partial = b''
+        self._lock = threading.Lock()
+
+    def publish(self, topic: str, data: Any = None):
+        line = json.dumps({'topic': topic, 'data': data, 'origin': self.pid, 'ts': time.time()},
+                          default=str).encode('utf-8') + b'\n'
+        try:
+            while True:
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    if fcntl is not None:
+                        fcntl.flock(fd, fcntl.LOCK_EX)
+                    stat = os.fstat(fd)
+                    if stat.st_ino != os.stat(self.path).st_ino:
+                        continue  # otro proceso rotó el archivo mientras esperábamos el lock
+                    if stat.st_size > MAX_EVENT_LOG_BYTES:
+                        # Rotar: los lectores terminan de leer el archivo anterior por su inodo
+                        os.replace(self.path, self.rotated_path)
+                        continue
+                    os.write(fd, line)
+                    return
+                finally:
+                    os.close(fd)  # libera también el flock
+        except OSError as e:
+            self.logger.error(f"Error publicando evento {topic}: {e}")
+
+    def seek_end(self):
+        """Ignorar los eventos anteriores (al arrancar un worker)"""
+        with self._lock:
+            try:
+                # Crear el registro si no existe para conocer su inodo desde el principio
+                os.close(os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644))
+                stat = os.stat(self.path)
+                self._inode, self._offset = stat.st_ino, stat.st_size
+            except OSError:
+                self._inode, self._offset = None, 0
+            self._partial = b''
+
+    def poll(self) -> List[Dict]:
+        """Eventos publicados desde la última llamada"""
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+            except OSError:
+                return []
+
+            chunks = []
+            if stat.st_ino != self._inode:
+                # Rotado: terminar el archivo anterior si sigue siendo el nuestro
+                finished = False
+                if self._inode is not None:
+                    try:
+                        if os.stat(self.rotated_path).st_ino == self._inode:
+                            chunks.append(self._read_from(self.rotated_path, self._offset))
+                            finished = True
+                    except OSError:
+                        pass
+                if not finished:
+                    self._partial = b''
+                self._inode, self._offset = stat.st_ino, 0
+
+            if stat.st_size > self._offset:
+                chunk = self._read_from(self.path, self._offset)
+                self._offset += len(chunk)
+                chunks.append(chunk)
+            if not chunks:
+                return []
+
+            data = self._partial + b''.join(chunks)
+            lines = data.split(b'\n')
+            self._partial = lines.pop()  # línea incompleta (escritura en curso)
+
+        events = []
+        for line in lines:
+            if not line:
+                continue
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                continue
+        return events
+
+    @staticmethod
+    def _read_from(path: str, offset: int) -> bytes:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            return f.read()
+
+
+class EngineLock:
+    """Elección del worker que aloja el motor: el primero que obtiene el flock"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(Config.SHARED_STATE_DIR, 'engine.lock')
+        self._fd: Optional[int] = None
+
+    @property
+    def owned(self) -> bool:
+        return self._fd is not None
+
+    def acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        if fcntl is None:
+            self._fd = -1
+            return True
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is not None and self._fd >= 0:
+            os.close(self._fd)
+        self._fd = None
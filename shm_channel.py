@@ -0,0 +1,275 @@
+"""
+Canal de estado en memoria compartida (mmap) con seqlock
+
+Un proceso escritor publica snapshots y cualquier número de procesos lectores
+los leen sin locks ni archivos a medio escribir:
+
+    [magic 4s][formato H][reservado H][seq Q][longitud I][reservado I][payload...]
+
+El escritor incrementa `seq` a impar antes de copiar el payload y a par al
+terminar. El lector copia el payload entre dos lecturas de `seq` y sólo lo
+acepta si ambas coinciden y son pares; si no, reintenta. Cada lector guarda el
+último valor decodificado con su `seq`, así que mientras no haya una
+publicación nueva una lectura es sólo leer 8 bytes del mapa.
+
+El archivo vive en /dev/shm (tmpfs) cuando existe, de modo que no hay E/S de
+disco. Si el payload no cabe, el escritor amplía el archivo y los lectores
+vuelven a mapearlo al detectar el nuevo tamaño.
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Any, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin flock entre escritores
+    fcntl = None
+
+from config import Config
+
+MAGIC = b'CTSM'
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct('<4sHHQII')
+_SEQ = struct.Struct('<Q')
+_LENGTH = struct.Struct('<I')
+SEQ_OFFSET = 8
+LENGTH_OFFSET = 16
+HEADER_SIZE = _HEADER.size  # 24 bytes
+
+DEFAULT_CAPACITY = 64 * 1024
+READ_RETRIES = 1000
+
+
+class _FileLock:
+    """flock exclusivo sobre un descriptor ya abierto (no-op sin fcntl)"""
+
+    def __init__(self, fd: int):
+        self.fd = fd
+
+    def __enter__(self):
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        return False
+
+
+class SharedMemoryChannel:
+    def __init__(self, name: str, directory: Optional[str] = None, capacity: int = DEFAULT_CAPACITY):
+        self.logger = logging.getLogger(__name__)
+        self.directory = directory or Config.SHM_DIR
+        self.path = os.path.join(self.directory, f"{name}.shm")
+        self.capacity = capacity
+
+        self._mm: Optional[mmap.mmap] = None
+        self._fd: Optional[int] = None
+        self._writable = False
+        self._lock = threading.Lock()
+
+        # Último valor leído por este proceso
+        self._cached_seq: Optional[int] = None
+        self._cached_value: Any = None
+
+    # ------------------------------------------------------------------ mapa
+
+    def _map(self, create: bool) -> Optional[mmap.mmap]:
+        """Mapa del canal; con create=True siempre de lectura-escritura (un mapa de
+        sólo lectura abierto antes por version()/read() se sustituye)"""
+        if self._mm is not None and (self._writable or not create):
+            return self._mm
+        self._unmap()
+        if create:
+            os.makedirs(self.directory, exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            with _FileLock(fd):
+                size = os.fstat(fd).st_size
+                if size < HEADER_SIZE:
+                    # Canal nuevo: inicializarlo una sola vez aunque arranquen varios escritores
+                    size = HEADER_SIZE + self.capacity
+                    os.ftruncate(fd, size)
+                    os.pwrite(fd, _HEADER.pack(MAGIC, FORMAT_VERSION, 0, 0, 0, 0), 0)
+        else:
+            try:
+                fd = os.open(self.path, os.O_RDONLY)
+            except OSError:
+                return None
+            size = os.fstat(fd).st_size
+            if size < HEADER_SIZE:
+                os.close(fd)
+                return None
+        access = mmap.ACCESS_WRITE if create else mmap.ACCESS_READ
+        mm = mmap.mmap(fd, size, access=access)
+        if mm[:4] != MAGIC:
+            mm.close()
+            os.close(fd)
+            raise ValueError(f"{self.path} no es un canal de memoria compartida")
+        self._fd, self._mm, self._writable = fd, mm, create
+        return mm
+
+    def _unmap(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self._writable = False
+
+    # -------------------------------------------------------------- escritor
+
+    def publish(self, value: Any):
+        """Publicar un snapshot (los escritores se serializan con flock)"""
+        data = json.dumps(value, default=str).encode('utf-8')
+        with self._lock:
+            self._map(create=True)
+            with _FileLock(self._fd):
+                # Otro escritor pudo ampliar el archivo: el tamaño real es el del archivo, no el de nuestro mapa
+                size = os.fstat(self._fd).st_size
+                if HEADER_SIZE + len(data) > size:
+                    size = self._grow(len(data), size)
+                mm = self._remap(size)
+
+                seq = _SEQ.unpack_from(mm, SEQ_OFFSET)[0]
+                if seq & 1:
+                    seq += 1  # un escritor anterior murió a mitad de publicación
+                _SEQ.pack_into(mm, SEQ_OFFSET, seq + 1)  # impar: escritura en curso
+                mm[HEADER_SIZE:HEADER_SIZE + len(data)] = data
+                _LENGTH.pack_into(mm, LENGTH_OFFSET, len(data))
+                _SEQ.pack_into(mm, SEQ_OFFSET, seq + 2)  # par: snapshot consistente
+                self._cached_seq, self._cached_value = seq + 2, value
+
+    def _grow(self, needed: int, size: int) -> int:
+        """Ampliar el archivo (nunca encogerlo: otros procesos pueden tenerlo mapeado más grande)"""
+        new_size = HEADER_SIZE + max(needed, 2 * (size - HEADER_SIZE))
+        if new_size > os.fstat(self._fd).st_size:
+            os.ftruncate(self._fd, new_size)
+        return new_size
+
+    def _remap(self, size: int) -> mmap.mmap:
+        """Volver a mapear el archivo de escritura si cambió de tamaño"""
+        if len(self._mm) != size:
+            self._mm.close()
+            self._mm = mmap.mmap(self._fd, size, access=mmap.ACCESS_WRITE)
+        return self._mm
+
+    # --------------------------------------------------------------- lector
+
+    def version(self) -> Optional[int]:
+        """Secuencia de la última publicación completa (None si el canal no existe)"""
+        mm = self._mm or self._map(create=False)
+        if mm is None:
+            return None
+        return _SEQ.unpack_from(mm, SEQ_OFFSET)[0] & ~1
+
+    def read(self, default: Any = None) -> Any:
+        """Último snapshot consistente publicado (default si aún no hay ninguno)"""
+        with self._lock:
+            mm = self._mm or self._map(create=False)
+            if mm is None:
+                return default
+
+            for attempt in range(READ_RETRIES):
+                seq = _SEQ.unpack_from(mm, SEQ_OFFSET)[0]
+                if seq == self._cached_seq:
+                    return self._cached_value
+                if seq == 0:
+                    return default
+                if seq & 1:
+                    if attempt > 10:
+                        time.sleep(0)  # ceder la CPU al escritor
+                    continue
+
+                length = _LENGTH.unpack_from(mm, LENGTH_OFFSET)[0]
+                if HEADER_SIZE + length > len(mm):
+                    # El escritor amplió el archivo: volver a mapearlo
+                    self._unmap()
+                    mm = self._map(create=False)
+                    if mm is None:
+                        return default
+                    continue
+                data = mm[HEADER_SIZE:HEADER_SIZE + length]
+
+                if _SEQ.unpack_from(mm, SEQ_OFFSET)[0] != seq:
+                    continue  # lo sobrescribieron mientras copiábamos
+
+                try:
+                    value = json.loads(data)
+                except ValueError:
+                    continue
+                self._cached_seq, self._cached_value = seq, value
+                return value
+
+        self.logger.warning(f"⚠️ No se obtuvo un snapshot consistente de {self.path}")
+        return self._cached_value if self._cached_seq is not None else default
+
+    def close(self):
+        with self._lock:
+            self._unmap()
+
+
+if __name__ == "__main__":
+    # Benchmark y prueba de lecturas rotas: un escritor publicando sin parar y un lector verificando
+    import multiprocessing
+    import tempfile
+
+    directory = tempfile.mkdtemp()
+
+    def writer(stop_at: float):
+        channel = SharedMemoryChannel('bench', directory, capacity=1024)
+        n = 0
+        while time.time() < stop_at:
+            n += 1
+            # Tamaño variable para forzar también ampliaciones del archivo
+            channel.publish({'n': n, 'payload': [n] * (50 + n % 400)})
+            time.sleep(0.0001)  # ~10k publicaciones/s, muy por encima del ritmo real del motor
+
+    channel = SharedMemoryChannel('bench', directory, capacity=1024)
+    channel.publish({'n': 0, 'payload': [0] * 50})
+
+    process = multiprocessing.Process(target=writer, args=(time.time() + 2.0,))
+    process.start()
+    reads = torn = changed = 0
+    last = None
+    started = time.perf_counter()
+    while process.is_alive():
+        value = channel.read()
+        reads += 1
+        if any(item != value['n'] for item in value['payload']):
+            torn += 1
+        if value['n'] != last:
+            changed += 1
+            last = value['n']
+    elapsed = time.perf_counter() - started
+    process.join()
+
+    # Latencia de lectura sin publicaciones nuevas (valor en caché del lector)
+    rounds = 200_000
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        channel.read()
+    cached_us = (time.perf_counter() - t0) / rounds * 1e6
+
+    # Comparación: leer y parsear un archivo JSON equivalente en cada petición
+    json_path = os.path.join(directory, 'bench.json')
+    with open(json_path, 'w') as f:
+        json.dump(channel.read(), f)
+    t0 = time.perf_counter()
+    for _ in range(20_000):
+        with open(json_path) as f:
+            json.load(f)
+    file_us = (time.perf_counter() - t0) / 20_000 * 1e6
+
+    print(f"Lecturas con escritor concurrente: {reads} en {elapsed:.1f}s "
+          f"({changed} versiones distintas, {torn} rotas)")
+    print(f"Lectura sin cambios: {cached_us:.2f} µs  |  archivo JSON + parseo: {file_us:.1f} µs")
+    assert torn == 0, "Se observaron lecturas inconsistentes"
+    print("✅ Ninguna lectura rota")
@@ -32,6 +32,15 @@ def start_trading_bot():
     except Exception as e:
         print(f"[{datetime.now()}] ❌ Error en bot de trading: {e}")
 
+def start_supervised():
+    """Bot y web en un solo proceso (ver supervisor.py)"""
+    print(f"[{datetime.now()}] 🧩 Modo supervisor: bot y web en un solo proceso")
+    import asyncio
+    import logging
+    import supervisor
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(supervisor.main())
+
 def main():
     """Función principal"""
     print(f"""
@@ -56,6 +65,12 @@ def main():
     os.makedirs('data', exist_ok=True)
     os.makedirs('logs', exist_ok=True)
 
+    from config import Config
+    if Config.SUPERVISOR_MODE:
+        start_supervised()
+        print(f"[{datetime.now()}] ✅ Servicios detenidos correctamente")
+        return
+
     # Iniciar bot de trading en hilo separado
     bot_thread = threading.Thread(target=start_trading_bot, daemon=True)
     bot_thread.start()
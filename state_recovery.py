@@ -0,0 +1,226 @@
+"""
+Recuperación rápida del estado del bot: snapshot binario + write-ahead log (WAL)
+
+El snapshot guarda el estado completo (posiciones, métricas, velas, señales)
+comprimido en un único archivo. Entre snapshots, cada evento relevante se
+añade al WAL como un registro binario con CRC, de modo que un reinicio sólo
+necesita cargar el snapshot y reproducir la cola del WAL.
+"""
+import logging
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+from metrics import histogram
+
+SNAPSHOT_MAGIC = b'CTBS'
+SNAPSHOT_VERSION = 1
+
+# Cabecera del snapshot: magic, versión, secuencia del último evento incluido
+_SNAPSHOT_HEADER = struct.Struct('<4sHQ')
+# Cabecera de cada registro del WAL: longitud del payload, crc32, secuencia
+_WAL_HEADER = struct.Struct('<IIQ')
+
+WAL_APPEND_SECONDS = histogram('wal_append_seconds', 'Duración de la escritura de un evento en el WAL')
+SNAPSHOT_SECONDS = histogram('snapshot_write_seconds', 'Duración de la escritura del snapshot')
+
+
+class RecoveredState:
+    """Resultado de una recuperación: estado del snapshot y eventos posteriores"""
+
+    def __init__(self, state: Optional[Dict] = None, events: Optional[List[Tuple]] = None,
+                 load_seconds: float = 0.0):
+        self.state = state or {}
+        self.events = events or []
+        self.load_seconds = load_seconds
+
+    @property
+    def available(self) -> bool:
+        return bool(self.state) or bool(self.events)
+
+
+class StateRecovery:
+    def __init__(self, data_dir: str = 'data'):
+        self.logger = logging.getLogger(__name__)
+        self.data_dir = data_dir
+        self.snapshot_file = os.path.join(data_dir, 'state.snapshot')
+        self.wal_file = os.path.join(data_dir, 'state.wal')
+        self.fsync = Config.WAL_FSYNC
+
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._wal = None
+        self.recovered = None
+
+        os.makedirs(self.data_dir, exist_ok=True)
+
+    def load(self) -> RecoveredState:
+        """Cargar snapshot y reproducir la cola del WAL (se ejecuta una sola vez)"""
+        if self.recovered is not None:
+            return self.recovered
+
+        started = time.perf_counter()
+        state, snapshot_seq = self._read_snapshot()
+        events = []
+
+        for seq, event_type, payload in self._read_wal():
+            if seq <= snapshot_seq:
+                continue
+            events.append((event_type, payload))
+            self._seq = seq
+
+        self._seq = max(self._seq, snapshot_seq)
+        self.recovered = RecoveredState(state, events, time.perf_counter() - started)
+
+        if self.recovered.available:
+            self.logger.info(
+                f"♻️ Estado recuperado: snapshot seq={snapshot_seq}, "
+                f"{len(events)} eventos WAL en {self.recovered.load_seconds * 1000:.1f} ms"
+            )
+        return self.recovered
+
+    @WAL_APPEND_SECONDS.time()
+    def append(self, event_type: str, payload: Dict):
+        """Añadir un evento al WAL"""
+        try:
+            data = pickle.dumps((event_type, payload), protocol=pickle.HIGHEST_PROTOCOL)
+            with self._lock:
+                self._seq += 1
+                wal = self._open_wal()
+                wal.write(_WAL_HEADER.pack(len(data), zlib.crc32(data), self._seq))
+                wal.write(data)
+                wal.flush()
+                if self.fsync:
+                    os.fsync(wal.fileno())
+        except Exception as e:
+            self.logger.error(f"Error escribiendo WAL ({event_type}): {e}")
+
+    @property
+    def seq(self) -> int:
+        """Último número de secuencia escrito en el WAL"""
+        with self._lock:
+            return self._seq
+
+    @SNAPSHOT_SECONDS.time()
+    def write_snapshot(self, state: Dict, seq: Optional[int] = None) -> bool:
+        """Escribir snapshot completo y compactar el WAL.
+
+        `seq` es la secuencia del WAL que refleja `state`: debe leerse en la
+        misma sección crítica en la que se copió el estado. Los eventos
+        posteriores se conservan en el WAL para reproducirlos tras el snapshot.
+        Sin `seq` se usa la secuencia actual (estado sin escritores concurrentes).
+        """
+        temp_file = f"{self.snapshot_file}.tmp"
+        try:
+            with self._lock:
+                if seq is None:
+                    seq = self._seq
+                body = zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL))
+                with open(temp_file, 'wb') as f:
+                    f.write(_SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, seq))
+                    f.write(body)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_file, self.snapshot_file)
+                self._compact_wal(seq)
+
+            self.logger.debug(f"💾 Snapshot guardado: seq={seq}, {len(body)} bytes")
+            return True
+
+        except Exception as e:
+            self.logger.error(f"Error guardando snapshot: {e}")
+            if os.path.exists(temp_file):
+                try:
+                    os.remove(temp_file)
+                except OSError:
+                    pass
+            return False
+
+    def close(self):
+        """Cerrar el WAL"""
+        with self._lock:
+            if self._wal is not None:
+                self._wal.close()
+                self._wal = None
+
+    def _compact_wal(self, seq: int):
+        """Descartar del WAL los eventos ya incluidos en el snapshot (seq <= `seq`)"""
+        if self._wal is not None:
+            self._wal.close()
+            self._wal = None
+
+        if self._seq <= seq:
+            open(self.wal_file, 'wb').close()
+            return
+
+        # Eventos escritos después de copiar el estado: se reescriben tal cual
+        temp_file = f"{self.wal_file}.tmp"
+        with open(temp_file, 'wb') as f:
+            for event_seq, event_type, payload in self._read_wal():
+                if event_seq <= seq:
+                    continue
+                data = pickle.dumps((event_type, payload), protocol=pickle.HIGHEST_PROTOCOL)
+                f.write(_WAL_HEADER.pack(len(data), zlib.crc32(data), event_seq))
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.wal_file)
+
+    def _open_wal(self):
+        if self._wal is None:
+            self._wal = open(self.wal_file, 'ab')
+        return self._wal
+
+    def _read_snapshot(self) -> Tuple[Dict, int]:
+        """Leer snapshot; devuelve ({}, 0) si no existe o es inválido"""
+        if not os.path.exists(self.snapshot_file):
+            return {}, 0
+
+        try:
+            with open(self.snapshot_file, 'rb') as f:
+                raw = f.read()
+
+            magic, version, seq = _SNAPSHOT_HEADER.unpack_from(raw)
+            if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                self.logger.warning(f"⚠️ Snapshot con formato desconocido, se ignora: {self.snapshot_file}")
+                return {}, 0
+
+            state = pickle.loads(zlib.decompress(raw[_SNAPSHOT_HEADER.size:]))
+            return state, seq
+
+        except Exception as e:
+            self.logger.error(f"Error cargando snapshot {self.snapshot_file}: {e}")
+            return {}, 0
+
+    def _read_wal(self):
+        """Iterar registros válidos del WAL, truncando una cola corrupta"""
+        if not os.path.exists(self.wal_file):
+            return
+
+        with open(self.wal_file, 'rb') as f:
+            raw = f.read()
+
+        offset = 0
+        while offset + _WAL_HEADER.size <= len(raw):
+            length, crc, seq = _WAL_HEADER.unpack_from(raw, offset)
+            start = offset + _WAL_HEADER.size
+            data = raw[start:start + length]
+            if len(data) < length or zlib.crc32(data) != crc:
+                break
+            try:
+                event_type, payload = pickle.loads(data)
+            except Exception:
+                break
+            yield seq, event_type, payload
+            offset = start + length
+
+        if offset < len(raw):
+            # Escritura interrumpida: descartar la cola incompleta
+            self.logger.warning(f"⚠️ WAL truncado en byte {offset} ({len(raw) - offset} bytes descartados)")
+            with open(self.wal_file, 'r+b') as f:
+                f.truncate(offset)
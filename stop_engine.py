@@ -0,0 +1,153 @@
+"""
+Motor de stops móviles y break-even evaluado con cada precio
+
+Funciona en su propio hilo, desacoplado del ciclo de análisis: recibe precios
+(push desde un feed o sondeo periódico del exchange), los fusiona por símbolo
+quedándose sólo con el último, y los evalúa contra el libro de disparadores
+del RiskManager. Los buffers de precios se reutilizan entre iteraciones para
+que la tasa de asignaciones no crezca con el número de actualizaciones.
+"""
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from config import Config
+
+
+class StopEngine:
+    def __init__(self, risk_manager, on_exit: Callable[[str, float, Dict], None],
+                 price_source: Optional[Callable[[List[str]], Dict]] = None,
+                 poll_interval: Optional[float] = None):
+        self.logger = logging.getLogger(__name__)
+        self.risk_manager = risk_manager
+        self.on_exit = on_exit
+        self.price_source = price_source
+        self.poll_interval = poll_interval or Config.PRICE_MONITOR_INTERVAL_SECONDS
+
+        # Doble buffer: los productores escriben en _pending, el motor procesa el otro
+        self._pending: Dict[str, float] = {}
+        self._spare: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+        self._thread = None
+        self._running = False
+        self._last_poll = 0.0
+
+        # Estadísticas
+        self.ticks_received = 0
+        self.ticks_processed = 0
+
+    @property
+    def is_running(self) -> bool:
+        return self._running
+
+    def start(self):
+        """Arrancar el hilo del motor"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='stop-engine', daemon=True)
+        self._thread.start()
+        self.logger.info(f"⚡ Motor de stops iniciado (sondeo cada {self.poll_interval}s)")
+
+    def stop(self):
+        """Detener el hilo del motor"""
+        self._running = False
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def push_price(self, symbol: str, price: float):
+        """Publicar un precio (seguro entre hilos; se conserva sólo el último por símbolo)"""
+        if not price:
+            return
+        with self._lock:
+            self._pending[symbol] = price
+            self.ticks_received += 1
+        self._wakeup.set()
+
+    def process_pending(self) -> int:
+        """Evaluar los precios pendientes; devuelve cuántos símbolos se procesaron"""
+        with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, self._spare
+
+        for symbol, price in batch.items():
+            self._on_tick(symbol, price)
+        # Un único evento de WAL por lote con el último nivel de cada stop movido
+        self.risk_manager.flush_stop_moves()
+
+        processed = len(batch)
+        batch.clear()
+        self._spare = batch
+        self.ticks_processed += processed
+        return processed
+
+    def _on_tick(self, symbol: str, price: float):
+        try:
+            self.risk_manager.update_position_price(symbol, price)
+            for action_result in self.risk_manager.evaluate_price(symbol, price):
+                self.on_exit(symbol, price, action_result)
+        except Exception as e:
+            self.logger.error(f"Error evaluando stops de {symbol}: {e}")
+
+    def _poll_prices(self):
+        """Sondear precios de las posiciones abiertas si no hay feed externo"""
+        now = time.monotonic()
+        if self.price_source is None or now - self._last_poll < self.poll_interval:
+            return
+        self._last_poll = now
+
+        symbols = list(self.risk_manager.open_positions.keys())
+        if not symbols:
+            return
+
+        for symbol, ticker in self.price_source(symbols).items():
+            self.push_price(symbol, ticker.get('last') or 0)
+
+    def _run(self):
+        while self._running:
+            try:
+                self._poll_prices()
+                self.process_pending()
+            except Exception as e:
+                self.logger.error(f"Error en motor de stops: {e}")
+
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+
+if __name__ == "__main__":
+    # Medición de throughput con el RiskManager real (libro de disparadores, lock y WAL)
+    import os
+    import tempfile
+    from risk_manager import RiskManager
+    from state_recovery import StateRecovery
+
+    logging.disable(logging.INFO)
+    os.chdir(tempfile.mkdtemp(prefix='stop_engine_bench_'))
+    recovery = StateRecovery(os.path.join('data', 'recovery'))
+    rm = RiskManager(recovery)
+    rm._save_positions = lambda: None  # la persistencia JSON no forma parte del camino del tick
+    for i in range(1000):
+        rm.add_position(f"SYM{i}/USDC", 'buy', 1.0, 100.0, 90.0, 1e9, str(i), trailing_stop_percentage=3)
+
+    engine = StopEngine(rm, on_exit=lambda *args: None, poll_interval=1)
+    symbols = list(rm.open_positions)
+    updates = 200_000
+    seq_before = recovery.seq
+
+    started = time.perf_counter()
+    for i in range(updates):
+        engine.push_price(symbols[i % len(symbols)], 100.0 + (i // len(symbols)) * 0.1)
+        if i % len(symbols) == 0:
+            engine.process_pending()
+    engine.process_pending()
+    elapsed = time.perf_counter() - started
+
+    print(f"{updates} actualizaciones en {elapsed:.3f}s -> {updates / elapsed:,.0f}/s "
+          f"({recovery.seq - seq_before} eventos WAL, stop de {symbols[0]}: {rm.open_positions[symbols[0]].stop_loss:.2f})")
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Supervisor: bot y dashboard en un solo proceso y un solo event loop
+
+En lugar de dos intérpretes (dashboard_bot.py y run_web.py, cada uno con su
+ExchangeManager, sus mercados cargados y su RiskManager), el supervisor
+construye el bot una vez y se lo entrega a la interfaz web, que lo usa como
+motor en vez de crear su propio CryptoTradingBot. Uvicorn y el bucle del bot
+son tareas del mismo event loop; los ciclos de análisis (bloqueantes) corren
+en un hilo.
+
+Cada servicio tiene un chequeo de salud periódico. Si la tarea termina con
+error, o el chequeo falla varias veces seguidas, se reinicia con backoff
+exponencial.
+"""
+import asyncio
+import contextlib
+import logging
+import os
+import signal
+import sys
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+# Agregar el directorio actual al path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+WEB_HOST = '0.0.0.0'
+WEB_PORT = 8000
+# Chequeos fallidos seguidos antes de reiniciar un servicio
+MAX_HEALTH_FAILURES = 3
+MAX_RESTART_BACKOFF = 60.0
+# Espera a que un servicio pare por las buenas antes de cancelarlo
+STOP_TIMEOUT = 10.0
+
+
+class Service:
+    """Tarea supervisada: se (re)crea con `factory`, se vigila con `health` y se
+    para con `stop` (petición de salida ordenada) o, si no termina, cancelándola"""
+
+    def __init__(self, name: str, factory: Callable[[], Awaitable],
+                 health: Optional[Callable[[], Awaitable[bool]]] = None,
+                 stop: Optional[Callable[[], None]] = None, exit_on_finish: bool = False):
+        self.name = name
+        self.factory = factory
+        self.health = health
+        self.stop = stop
+        # Si termina sin error (p. ej. uvicorn tras SIGTERM) se detiene todo el proceso
+        self.exit_on_finish = exit_on_finish
+        self.task: Optional[asyncio.Task] = None
+        self.wanted = False
+        self.restarting = False
+        self.restarts = 0
+        self.consecutive_failures = 0  # para el backoff; se pone a 0 tras un rato sano
+        self.health_failures = 0
+        self.started_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+
+class Supervisor:
+    def __init__(self, health_interval: Optional[float] = None):
+        self.health_interval = health_interval or Config.SUPERVISOR_HEALTH_INTERVAL_SECONDS
+        self.services: Dict[str, Service] = {}
+        self._stopping = asyncio.Event()
+
+    def add(self, service: Service):
+        self.services[service.name] = service
+
+    def start(self, name: str):
+        service = self.services[name]
+        service.wanted = True
+        if not service.running:
+            self._launch(service)
+
+    async def stop(self, name: str):
+        service = self.services[name]
+        service.wanted = False
+        await self._halt(service)
+
+    async def _halt(self, service: Service):
+        if not service.running:
+            return
+        if service.stop is not None:
+            service.stop()
+            try:
+                await asyncio.wait_for(asyncio.shield(service.task), STOP_TIMEOUT)
+                return
+            except asyncio.TimeoutError:
+                logger.warning(f"⚠️ {service.name} no se detuvo en {STOP_TIMEOUT:.0f}s, cancelando")
+            except Exception:
+                return
+        service.task.cancel()
+        await asyncio.gather(service.task, return_exceptions=True)
+
+    def _launch(self, service: Service):
+        service.task = asyncio.create_task(service.factory(), name=service.name)
+        service.task.add_done_callback(lambda task, service=service: self._on_done(service, task))
+        service.started_at = time.monotonic()
+        service.health_failures = 0
+
+    def _on_done(self, service: Service, task: asyncio.Task):
+        if task.cancelled() or not service.wanted or service.restarting or self._stopping.is_set():
+            return
+        error = task.exception()
+        if error is None and service.exit_on_finish:
+            logger.info(f"🛑 Servicio {service.name} terminado: deteniendo el supervisor")
+            self._stopping.set()
+            return
+        service.last_error = repr(error) if error else 'terminó inesperadamente'
+        logger.error(f"❌ Servicio {service.name} caído: {service.last_error}")
+        asyncio.get_running_loop().create_task(self._restart(service))
+
+    async def _restart(self, service: Service):
+        service.restarting = True
+        try:
+            await self._halt(service)
+            delay = min(2 ** service.consecutive_failures, MAX_RESTART_BACKOFF)
+            service.consecutive_failures += 1
+            service.restarts += 1
+            logger.warning(f"🔁 Reiniciando {service.name} en {delay:.0f}s (reinicio #{service.restarts})")
+            await asyncio.sleep(delay)
+        finally:
+            service.restarting = False
+        if service.wanted and not self._stopping.is_set():
+            self._launch(service)
+
+    async def _check_health(self):
+        for service in list(self.services.values()):
+            if not service.running or service.health is None:
+                continue
+            try:
+                healthy = await asyncio.wait_for(service.health(), timeout=10)
+            except Exception:
+                healthy = False
+            if healthy:
+                service.health_failures = 0
+                if time.monotonic() - service.started_at > MAX_RESTART_BACKOFF:
+                    service.consecutive_failures = 0
+                continue
+            service.health_failures += 1
+            logger.warning(f"⚠️ Chequeo de salud fallido para {service.name} "
+                           f"({service.health_failures}/{MAX_HEALTH_FAILURES})")
+            if service.health_failures >= MAX_HEALTH_FAILURES:
+                service.last_error = 'chequeo de salud fallido'
+                await self._restart(service)
+
+    @property
+    def stopping(self) -> bool:
+        return self._stopping.is_set()
+
+    def request_stop(self):
+        """Pedir la parada de todo el proceso (SIGINT/SIGTERM)"""
+        self._stopping.set()
+
+    async def run(self):
+        """Vigilar los servicios hasta que se pida parar"""
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.health_interval)
+            except asyncio.TimeoutError:
+                await self._check_health()
+
+    async def shutdown(self):
+        self._stopping.set()
+        for name in reversed(list(self.services)):
+            await self.stop(name)
+
+    def stats(self) -> Dict[str, Dict]:
+        now = time.monotonic()
+        return {
+            service.name: {
+                'running': service.running,
+                'restarts': service.restarts,
+                'uptime_seconds': round(now - service.started_at, 1) if service.running and service.started_at else None,
+                'last_error': service.last_error,
+            }
+            for service in self.services.values()
+        }
+
+
+class EngineController:
+    """Motor que el supervisor entrega a la web (sustituye al CryptoTradingBot propio de la web)"""
+
+    def __init__(self, supervisor: Supervisor):
+        self.supervisor = supervisor
+        self.bot = None
+        self.ready = asyncio.Event()
+        self.service = Service('engine', self._run, health=self._healthy)
+        supervisor.add(self.service)
+
+    async def build(self):
+        """Construir el bot una sola vez (exchange, mercados, RiskManager) fuera del event loop"""
+        from dashboard_bot import DashboardBot
+        self.bot = await asyncio.to_thread(DashboardBot)
+        self.ready.set()
+
+    async def _run(self):
+        if self.bot is None:
+            await self.build()  # si falla, el supervisor reintenta con backoff
+        await self.bot.run_async()
+
+    async def _healthy(self) -> bool:
+        # Un ciclo colgado (p. ej. el exchange no responde) deja de marcar last_cycle_finished
+        bot = self.bot
+        if bot is None:
+            return True
+        last_progress = max(bot.last_cycle_finished or 0, self.service.started_at)
+        return time.monotonic() - last_progress < bot.CYCLE_SECONDS * 3
+
+    async def start(self):
+        self.supervisor.start('engine')
+
+    async def stop(self):
+        await self.supervisor.stop('engine')
+        if self.bot is not None:
+            await asyncio.to_thread(self.bot.stop)
+
+    def stats(self) -> Dict[str, Dict]:
+        return self.supervisor.stats()
+
+
+async def main():
+    import uvicorn
+    import web_interface
+
+    class EmbeddedServer(uvicorn.Server):
+        """Uvicorn sin manejadores de señales propios: las gestiona el supervisor"""
+
+        @contextlib.contextmanager
+        def capture_signals(self):
+            yield
+
+        def install_signal_handlers(self):  # uvicorn < 0.29
+            pass
+
+    supervisor = Supervisor()
+    engine = EngineController(supervisor)
+    web_interface.attach_engine(engine)
+    server: Optional[uvicorn.Server] = None
+
+    async def serve_web():
+        nonlocal server
+        server = EmbeddedServer(uvicorn.Config(web_interface.app, host=WEB_HOST, port=WEB_PORT,
+                                               log_level='info'))
+        await server.serve()
+
+    def stop_web():
+        if server is not None:
+            server.should_exit = True
+
+    async def web_healthy() -> bool:
+        if server is None or not server.started:
+            return True  # aún arrancando
+        reader, writer = await asyncio.open_connection('127.0.0.1', WEB_PORT)
+        writer.close()
+        await writer.wait_closed()
+        return True
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with contextlib.suppress(NotImplementedError):  # Windows
+            loop.add_signal_handler(sig, supervisor.request_stop)
+
+    supervisor.add(Service('web', serve_web, health=web_healthy, stop=stop_web, exit_on_finish=True))
+    supervisor.start('web')
+
+    try:
+        # Arrancar el motor por la misma ruta que el botón del dashboard, con la web ya lista
+        while server is None or not server.started:
+            if supervisor.stopping:
+                return
+            await asyncio.sleep(0.1)
+        result = await web_interface.start_bot()
+        if not result.get('success'):
+            logger.error(f"❌ No se pudo arrancar el motor: {result.get('error')}")
+
+        await supervisor.run()
+    finally:
+        if engine.bot is not None and engine.bot.is_running:
+            await engine.stop()
+        await supervisor.shutdown()
+        logger.info("✅ Supervisor detenido")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -13,6 +13,7 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from config import Config
+from market_data import read_shared
 
 # Configurar logging simple
 logging.basicConfig(
@@ -56,8 +57,14 @@ class TestBot:
         try:
             self.logger.info("🔄 Ejecutando ciclo de prueba...")
             
+            # Últimos datos publicados por los bots del grupo (sin consultar el exchange)
+            shared = read_shared().get('symbols', {})
             for symbol in Config.SYMBOLS:
-                self.logger.info(f"📊 Analizando {symbol}...")
+                signals = shared.get(symbol, {}).get('signals')
+                if signals:
+                    self.logger.info(f"📊 {symbol}: Confianza {signals.get('confidence', 0):.2f}")
+                else:
+                    self.logger.info(f"📊 Analizando {symbol}...")
                 time.sleep(0.1)  # Pequeña pausa
             
             self.logger.info("✅ Ciclo de prueba completado")
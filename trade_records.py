@@ -0,0 +1,487 @@
+"""
+Registros compactos de posiciones y trades
+
+Position, Fill y ClosedTrade usan __slots__ (sin __dict__ por instancia) y
+guardan las fechas como epoch en float, de modo que sólo se convierten a
+ISO-8601 al serializar a JSON. Cada registro se puede serializar a dict/JSON
+(formato compatible con los archivos de data/) y a un formato binario con
+struct. ClosedTradeStore guarda el historial de trades cerrados en columnas
+(array) para agregaciones baratas sobre todo el historial, con índices por
+símbolo y agregados por símbolo y día mantenidos en cada append.
+"""
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+SIDES = ('buy', 'sell')
+
+
+def to_epoch(value) -> float:
+    """Convertir datetime / ISO-8601 / epoch a epoch en float"""
+    if value is None or value == '':
+        return datetime.now().timestamp()
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.timestamp()
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return datetime.now().timestamp()
+
+
+def to_iso(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch).isoformat()
+
+
+def _pack_str(value: Optional[str]) -> bytes:
+    data = (value or '').encode('utf-8')
+    return struct.pack('<H', len(data)) + data
+
+
+def _unpack_str(raw: bytes, offset: int):
+    (length,) = struct.unpack_from('<H', raw, offset)
+    offset += 2
+    return raw[offset:offset + length].decode('utf-8'), offset + length
+
+
+class Position:
+    __slots__ = ('symbol', 'side', 'amount', 'entry_price', 'current_price', 'stop_loss',
+                 'take_profit', 'order_id', 'entry_time', 'unrealized_pnl', 'status',
+                 'trailing_stop_percentage', 'break_even_trigger')
+
+    # side, amount, entry, current, stop, target, entry_time, pnl, trailing, break-even
+    _BINARY = struct.Struct('<B9d')
+
+    def __init__(self, symbol: str, side: str, amount: float, entry_price: float,
+                 stop_loss: float = 0.0, take_profit: float = 0.0, order_id: str = '',
+                 entry_time: Optional[float] = None, current_price: Optional[float] = None,
+                 unrealized_pnl: float = 0.0, status: str = 'open',
+                 trailing_stop_percentage: float = 0.0, break_even_trigger: float = 0.0):
+        self.symbol = symbol
+        self.side = side
+        self.amount = amount
+        self.entry_price = entry_price
+        self.current_price = entry_price if current_price is None else current_price
+        self.stop_loss = stop_loss
+        self.take_profit = take_profit
+        self.order_id = order_id
+        self.entry_time = to_epoch(entry_time)
+        self.unrealized_pnl = unrealized_pnl
+        self.status = status
+        self.trailing_stop_percentage = trailing_stop_percentage or 0.0
+        self.break_even_trigger = break_even_trigger or 0.0
+
+    @property
+    def entry_value(self) -> float:
+        return self.entry_price * self.amount
+
+    @property
+    def current_value(self) -> float:
+        return self.current_price * self.amount
+
+    @property
+    def pnl_percentage(self) -> float:
+        entry_value = self.entry_value
+        return (self.unrealized_pnl / entry_value * 100) if entry_value > 0 else 0.0
+
+    def mark(self, price: float):
+        """Actualizar precio actual y PnL no realizado"""
+        self.current_price = price
+        if self.side == 'buy':
+            self.unrealized_pnl = (price - self.entry_price) * self.amount
+        else:
+            self.unrealized_pnl = (self.entry_price - price) * self.amount
+
+    def copy(self) -> 'Position':
+        clone = Position.__new__(Position)
+        for name in Position.__slots__:
+            setattr(clone, name, getattr(self, name))
+        return clone
+
+    def to_dict(self) -> Dict:
+        data = {
+            'symbol': self.symbol,
+            'side': self.side,
+            'amount': self.amount,
+            'entry_price': self.entry_price,
+            'current_price': self.current_price,
+            'stop_loss': self.stop_loss,
+            'take_profit': self.take_profit,
+            'order_id': self.order_id,
+            'entry_time': to_iso(self.entry_time),
+            'unrealized_pnl': self.unrealized_pnl,
+            'status': self.status
+        }
+        if self.trailing_stop_percentage:
+            data['trailing_stop_percentage'] = self.trailing_stop_percentage
+        if self.break_even_trigger:
+            data['break_even_trigger'] = self.break_even_trigger
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Position':
+        return cls(
+            symbol=data['symbol'],
+            side=data.get('side', 'buy'),
+            amount=float(data['amount']),
+            entry_price=float(data['entry_price']),
+            stop_loss=float(data.get('stop_loss', 0.0)),
+            take_profit=float(data.get('take_profit', 0.0)),
+            order_id=str(data.get('order_id', '')),
+            entry_time=data.get('entry_time'),
+            current_price=float(data.get('current_price', data['entry_price'])),
+            unrealized_pnl=float(data.get('unrealized_pnl', data.get('pnl', 0.0))),
+            status=data.get('status', 'open'),
+            trailing_stop_percentage=float(data.get('trailing_stop_percentage', 0.0)),
+            break_even_trigger=float(data.get('break_even_trigger', 0.0))
+        )
+
+    def to_bytes(self) -> bytes:
+        return (self._BINARY.pack(SIDES.index(self.side), self.amount, self.entry_price,
+                                  self.current_price, self.stop_loss, self.take_profit,
+                                  self.entry_time, self.unrealized_pnl,
+                                  self.trailing_stop_percentage, self.break_even_trigger)
+                + _pack_str(self.symbol) + _pack_str(self.order_id) + _pack_str(self.status))
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> 'Position':
+        (side, amount, entry_price, current_price, stop_loss, take_profit, entry_time,
+         unrealized_pnl, trailing, break_even) = cls._BINARY.unpack_from(raw)
+        symbol, offset = _unpack_str(raw, cls._BINARY.size)
+        order_id, offset = _unpack_str(raw, offset)
+        status, _ = _unpack_str(raw, offset)
+        return cls(symbol, SIDES[side], amount, entry_price, stop_loss, take_profit, order_id,
+                   entry_time, current_price, unrealized_pnl, status, trailing, break_even)
+
+    def __repr__(self):
+        return f"Position({self.symbol} {self.side} {self.amount} @ {self.entry_price})"
+
+
+class Fill:
+    __slots__ = ('symbol', 'side', 'amount', 'price', 'order_id', 'timestamp')
+
+    _BINARY = struct.Struct('<B3d')
+
+    def __init__(self, symbol: str, side: str, amount: float, price: float,
+                 order_id: str = '', timestamp: Optional[float] = None):
+        self.symbol = symbol
+        self.side = side
+        self.amount = amount
+        self.price = price
+        self.order_id = order_id
+        self.timestamp = to_epoch(timestamp)
+
+    @property
+    def value(self) -> float:
+        return self.amount * self.price
+
+    def to_dict(self) -> Dict:
+        return {
+            'symbol': self.symbol,
+            'side': self.side,
+            'amount': self.amount,
+            'price': self.price,
+            'value': self.value,
+            'order_id': self.order_id,
+            'timestamp': to_iso(self.timestamp)
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Fill':
+        return cls(data['symbol'], data.get('side', 'buy'), float(data['amount']),
+                   float(data['price']), str(data.get('order_id', '')), data.get('timestamp'))
+
+    def to_bytes(self) -> bytes:
+        return (self._BINARY.pack(SIDES.index(self.side), self.amount, self.price, self.timestamp)
+                + _pack_str(self.symbol) + _pack_str(self.order_id))
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> 'Fill':
+        side, amount, price, timestamp = cls._BINARY.unpack_from(raw)
+        symbol, offset = _unpack_str(raw, cls._BINARY.size)
+        order_id, _ = _unpack_str(raw, offset)
+        return cls(symbol, SIDES[side], amount, price, order_id, timestamp)
+
+
+class ClosedTrade:
+    __slots__ = ('symbol', 'side', 'entry_price', 'exit_price', 'amount', 'pnl',
+                 'pnl_percentage', 'reason', 'duration_minutes', 'timestamp')
+
+    _BINARY = struct.Struct('<B5dId')
+
+    def __init__(self, symbol: str, side: str, entry_price: float, exit_price: float,
+                 amount: float, pnl: float, pnl_percentage: float, reason: str = '',
+                 duration_minutes: int = 0, timestamp: Optional[float] = None):
+        self.symbol = symbol
+        self.side = side
+        self.entry_price = entry_price
+        self.exit_price = exit_price
+        self.amount = amount
+        self.pnl = pnl
+        self.pnl_percentage = pnl_percentage
+        self.reason = reason
+        self.duration_minutes = duration_minutes
+        self.timestamp = to_epoch(timestamp)
+
+    def to_dict(self) -> Dict:
+        return {
+            'symbol': self.symbol,
+            'side': self.side,
+            'entry_price': self.entry_price,
+            'exit_price': self.exit_price,
+            'amount': self.amount,
+            'pnl': round(self.pnl, 2),
+            'pnl_percentage': round(self.pnl_percentage, 2),
+            'reason': self.reason,
+            'duration_minutes': int(self.duration_minutes),
+            'timestamp': to_iso(self.timestamp)
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ClosedTrade':
+        return cls(data['symbol'], data.get('side', 'buy'), float(data.get('entry_price', 0.0)),
+                   float(data.get('exit_price', 0.0)), float(data.get('amount', 0.0)),
+                   float(data.get('pnl', 0.0)), float(data.get('pnl_percentage', 0.0)),
+                   data.get('reason', ''), int(data.get('duration_minutes', 0)),
+                   data.get('timestamp'))
+
+    def to_bytes(self) -> bytes:
+        return (self._BINARY.pack(SIDES.index(self.side), self.entry_price, self.exit_price,
+                                  self.amount, self.pnl, self.pnl_percentage,
+                                  int(self.duration_minutes), self.timestamp)
+                + _pack_str(self.symbol) + _pack_str(self.reason))
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> 'ClosedTrade':
+        (side, entry_price, exit_price, amount, pnl, pnl_percentage, duration,
+         timestamp) = cls._BINARY.unpack_from(raw)
+        symbol, offset = _unpack_str(raw, cls._BINARY.size)
+        reason, _ = _unpack_str(raw, offset)
+        return cls(symbol, SIDES[side], entry_price, exit_price, amount, pnl,
+                   pnl_percentage, reason, duration, timestamp)
+
+
+class ClosedTradeStore:
+    """Historial de trades cerrados en columnas (array) con símbolos/razones internados.
+
+    El número de fila es estable (sólo se añade), por lo que sirve como cursor
+    de paginación. Se mantienen al añadir: filas por símbolo, PnL/número de
+    trades por símbolo y por día, y si los timestamps siguen ordenados (lo que
+    permite filtrar rangos de fechas con bisect).
+    """
+
+    def __init__(self):
+        self.symbol_ids = array('H')
+        self.sides = array('b')
+        self.entry_prices = array('d')
+        self.exit_prices = array('d')
+        self.amounts = array('d')
+        self.pnls = array('d')
+        self.pnl_percentages = array('d')
+        self.reason_ids = array('H')
+        self.durations = array('I')
+        self.timestamps = array('d')
+
+        self._symbols: List[str] = []
+        self._symbol_index: Dict[str, int] = {}
+        self._reasons: List[str] = []
+        self._reason_index: Dict[str, int] = {}
+        self._reset_indexes()
+
+    def _reset_indexes(self):
+        self._rows_by_symbol: Dict[int, array] = {}
+        self._symbol_totals: Dict[int, List[float]] = {}  # id -> [pnl, trades, ganadores]
+        self._daily_totals: Dict[str, List[float]] = {}   # YYYY-MM-DD -> [pnl, trades, ganadores]
+        self._sorted = True
+
+    def __setstate__(self, state):
+        # Snapshots anteriores no incluían los índices: reconstruirlos
+        self.__dict__.update(state)
+        if '_rows_by_symbol' not in state:
+            self._reset_indexes()
+            for row in range(len(self)):
+                self._index_row(row)
+
+    def _index_row(self, row: int):
+        symbol_id = self.symbol_ids[row]
+        pnl = self.pnls[row]
+        win = 1 if pnl > 0 else 0
+
+        rows = self._rows_by_symbol.get(symbol_id)
+        if rows is None:
+            rows = self._rows_by_symbol[symbol_id] = array('I')
+        rows.append(row)
+
+        totals = self._symbol_totals.setdefault(symbol_id, [0.0, 0, 0])
+        totals[0] += pnl
+        totals[1] += 1
+        totals[2] += win
+
+        day = datetime.fromtimestamp(self.timestamps[row]).date().isoformat()
+        totals = self._daily_totals.setdefault(day, [0.0, 0, 0])
+        totals[0] += pnl
+        totals[1] += 1
+        totals[2] += win
+
+        if row and self.timestamps[row] < self.timestamps[row - 1]:
+            self._sorted = False
+
+    def _intern(self, value: str, values: List[str], index: Dict[str, int]) -> int:
+        idx = index.get(value)
+        if idx is None:
+            idx = index[value] = len(values)
+            values.append(value)
+        return idx
+
+    def append(self, trade: ClosedTrade):
+        self.symbol_ids.append(self._intern(trade.symbol, self._symbols, self._symbol_index))
+        self.sides.append(SIDES.index(trade.side))
+        self.entry_prices.append(trade.entry_price)
+        self.exit_prices.append(trade.exit_price)
+        self.amounts.append(trade.amount)
+        self.pnls.append(trade.pnl)
+        self.pnl_percentages.append(trade.pnl_percentage)
+        self.reason_ids.append(self._intern(trade.reason, self._reasons, self._reason_index))
+        self.durations.append(int(trade.duration_minutes))
+        self.timestamps.append(trade.timestamp)
+        self._index_row(len(self.pnls) - 1)
+
+    def extend(self, trades):
+        for trade in trades:
+            self.append(trade)
+
+    @classmethod
+    def from_dicts(cls, trades: List[Dict]) -> 'ClosedTradeStore':
+        """Construir desde el JSON del historial, sin duplicados (por timestamp) y en orden cronológico"""
+        seen = set()
+        records = []
+        for trade in trades:
+            timestamp = trade.get('timestamp', '')
+            if timestamp and timestamp not in seen:
+                seen.add(timestamp)
+                records.append(ClosedTrade.from_dict(trade))
+        records.sort(key=lambda trade: trade.timestamp)
+
+        store = cls()
+        store.extend(records)
+        return store
+
+    def __len__(self):
+        return len(self.pnls)
+
+    def __getitem__(self, i: int) -> ClosedTrade:
+        return ClosedTrade(self._symbols[self.symbol_ids[i]], SIDES[self.sides[i]],
+                           self.entry_prices[i], self.exit_prices[i], self.amounts[i],
+                           self.pnls[i], self.pnl_percentages[i],
+                           self._reasons[self.reason_ids[i]], self.durations[i],
+                           self.timestamps[i])
+
+    def __iter__(self) -> Iterator[ClosedTrade]:
+        for i in range(len(self)):
+            yield self[i]
+
+    # Agregaciones columnar: recorren sólo los arrays necesarios
+    def total_pnl(self) -> float:
+        return sum(self.pnls)
+
+    def winning_trades(self) -> int:
+        return sum(1 for pnl in self.pnls if pnl > 0)
+
+    def losing_trades(self) -> int:
+        return sum(1 for pnl in self.pnls if pnl < 0)
+
+    def pnl_by_symbol(self) -> Dict[str, float]:
+        return {self._symbols[symbol_id]: totals[0] for symbol_id, totals in self._symbol_totals.items()}
+
+    def aggregates_by_symbol(self) -> Dict[str, Dict]:
+        return {self._symbols[symbol_id]: self._totals_dict(totals)
+                for symbol_id, totals in self._symbol_totals.items()}
+
+    def aggregates_by_day(self, start: Optional[str] = None, end: Optional[str] = None) -> Dict[str, Dict]:
+        return {day: self._totals_dict(totals) for day, totals in sorted(self._daily_totals.items())
+                if (start is None or day >= start) and (end is None or day <= end)}
+
+    @staticmethod
+    def _totals_dict(totals: List[float]) -> Dict:
+        pnl, trades, wins = totals
+        return {'pnl': round(pnl, 2), 'trades': int(trades), 'winning_trades': int(wins),
+                'win_rate': round(wins / trades * 100, 2) if trades else 0.0}
+
+    def query(self, symbol: Optional[str] = None, side: Optional[str] = None,
+              start: Optional[float] = None, end: Optional[float] = None,
+              reason: Optional[str] = None, cursor: Optional[int] = None,
+              limit: int = 50, newest_first: bool = True) -> Tuple[List[Dict], Optional[int]]:
+        """Página de trades filtrada; devuelve (trades, siguiente cursor o None).
+
+        El cursor es el número de fila del último trade devuelto. El coste es
+        proporcional a las filas recorridas para llenar la página, no al
+        tamaño del historial (salvo filtros muy selectivos sobre side/razón).
+        """
+        if symbol is not None:
+            symbol_id = self._symbol_index.get(symbol)
+            if symbol_id is None:
+                return [], None
+            rows = self._rows_by_symbol[symbol_id]
+        else:
+            rows = range(len(self))
+
+        # Posiciones [lo, hi) dentro de `rows` que cumplen rango de fechas y cursor
+        lo, hi = 0, len(rows)
+        if self._sorted and (start is not None or end is not None):
+            timestamps = self.timestamps
+            if start is not None:
+                lo = self._bisect_rows(rows, lambda row: timestamps[row] >= start)
+            if end is not None:
+                hi = self._bisect_rows(rows, lambda row: timestamps[row] > end)
+        if cursor is not None:
+            if newest_first:
+                hi = min(hi, bisect_left(rows, cursor))
+            else:
+                lo = max(lo, bisect_right(rows, cursor))
+
+        side_id = SIDES.index(side) if side in SIDES else None
+        reason_ids = None
+        if reason:
+            needle = reason.lower()
+            reason_ids = {i for i, text in enumerate(self._reasons) if needle in text.lower()}
+        check_dates = not self._sorted and (start is not None or end is not None)
+
+        positions = range(hi - 1, lo - 1, -1) if newest_first else range(lo, hi)
+        page = []
+        last_row = None
+        for position in positions:
+            row = rows[position]
+            if side_id is not None and self.sides[row] != side_id:
+                continue
+            if reason_ids is not None and self.reason_ids[row] not in reason_ids:
+                continue
+            if check_dates and ((start is not None and self.timestamps[row] < start) or
+                                (end is not None and self.timestamps[row] > end)):
+                continue
+            if len(page) == limit:
+                return page, last_row
+            trade = self[row].to_dict()
+            trade['id'] = row
+            page.append(trade)
+            last_row = row
+
+        return page, None
+
+    @staticmethod
+    def _bisect_rows(rows, predicate) -> int:
+        """Primera posición de `rows` que cumple un predicado monótono"""
+        lo, hi = 0, len(rows)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if predicate(rows[mid]):
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def to_dicts(self, newest_first: bool = True) -> List[Dict]:
+        order = sorted(range(len(self)), key=self.timestamps.__getitem__, reverse=newest_first)
+        return [self[i].to_dict() for i in order]
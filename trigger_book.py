@@ -0,0 +1,210 @@
+"""
+Libro de disparadores de stop loss / take profit indexado por precio
+
+Cada símbolo mantiene sus niveles ordenados, de forma que una actualización de
+precio sólo localiza (bisect) y extrae los disparadores cruzados: O(log n + k).
+Los precios se guardan con signo (+1 largos, -1 cortos) para que todos los
+casos se reduzcan a "disparar cuando x <= nivel", siempre como sufijo de la
+lista ordenada.
+"""
+import logging
+from bisect import bisect_left, bisect_right
+from typing import Callable, Dict, List, Optional, Tuple
+
+STOP_LOSS = 'stop_loss'
+TAKE_PROFIT = 'take_profit'
+BREAK_EVEN = 'break_even'
+
+
+def _side_sign(side: str) -> int:
+    return 1 if side == 'buy' else -1
+
+
+class _Ladder:
+    """Niveles ascendentes con sus ids; los cruzados siempre forman un sufijo"""
+
+    __slots__ = ('levels', 'ids')
+
+    def __init__(self):
+        self.levels: List[float] = []
+        self.ids: List[str] = []
+
+    def insert(self, level: float, trigger_id: str):
+        idx = bisect_right(self.levels, level)
+        self.levels.insert(idx, level)
+        self.ids.insert(idx, trigger_id)
+
+    def remove(self, trigger_id: str, level: Optional[float] = None) -> bool:
+        if level is not None:
+            lo = bisect_left(self.levels, level)
+            hi = bisect_right(self.levels, level)
+            for idx in range(lo, hi):
+                if self.ids[idx] == trigger_id:
+                    del self.levels[idx]
+                    del self.ids[idx]
+                    return True
+        # Nivel desconocido (stop móvil ya desplazado): búsqueda lineal
+        try:
+            idx = self.ids.index(trigger_id)
+        except ValueError:
+            return False
+        del self.levels[idx]
+        del self.ids[idx]
+        return True
+
+    def pop_crossed(self, x: float) -> List[Tuple[float, str]]:
+        """Extraer los niveles >= x"""
+        idx = bisect_left(self.levels, x)
+        if idx == len(self.levels):
+            return []
+        crossed = list(zip(self.levels[idx:], self.ids[idx:]))
+        del self.levels[idx:]
+        del self.ids[idx:]
+        return crossed
+
+    def raise_to(self, level: float) -> List[str]:
+        """Subir a `level` todos los niveles inferiores (prefijo, sin desplazar memoria)"""
+        idx = bisect_left(self.levels, level)
+        if idx == 0:
+            return []
+        self.levels[:idx] = [level] * idx
+        return self.ids[:idx]
+
+    def level_of(self, trigger_id: str) -> Optional[float]:
+        try:
+            return self.levels[self.ids.index(trigger_id)]
+        except ValueError:
+            return None
+
+    def __len__(self):
+        return len(self.levels)
+
+
+class TriggerBook:
+    def __init__(self, on_ratchet: Optional[Callable[[str, float], None]] = None):
+        self.logger = logging.getLogger(__name__)
+        # (símbolo, signo) -> escalera de stops fijos / objetivos
+        self._stops: Dict[Tuple[str, int], _Ladder] = {}
+        self._targets: Dict[Tuple[str, int], _Ladder] = {}
+        # (símbolo, signo) -> niveles que activan el paso a break-even
+        self._break_even: Dict[Tuple[str, int], _Ladder] = {}
+        # (símbolo, signo) -> {porcentaje: escalera de stops móviles}
+        self._trailing: Dict[Tuple[str, int], Dict[float, _Ladder]] = {}
+        # (id, tipo) -> (escalera, nivel con signo, signo)
+        self._index: Dict[Tuple[str, str], Tuple[_Ladder, float, int]] = {}
+        # Notificación cuando un stop móvil sube: callback(id, nuevo nivel)
+        self.on_ratchet = on_ratchet
+
+    def add_stop(self, trigger_id: str, symbol: str, side: str, level: float,
+                 trailing_percentage: Optional[float] = None):
+        """Registrar stop loss (móvil si se indica trailing_percentage)"""
+        self.remove(trigger_id, STOP_LOSS)
+        sign = _side_sign(side)
+        key = (symbol, sign)
+
+        if trailing_percentage:
+            groups = self._trailing.setdefault(key, {})
+            ladder = groups.get(trailing_percentage)
+            if ladder is None:
+                ladder = groups[trailing_percentage] = _Ladder()
+        else:
+            ladder = self._stops.setdefault(key, _Ladder())
+
+        signed_level = sign * level
+        ladder.insert(signed_level, trigger_id)
+        self._index[(trigger_id, STOP_LOSS)] = (ladder, signed_level, sign)
+
+    def add_target(self, trigger_id: str, symbol: str, side: str, level: float):
+        """Registrar take profit"""
+        self.remove(trigger_id, TAKE_PROFIT)
+        sign = _side_sign(side)
+        ladder = self._targets.setdefault((symbol, sign), _Ladder())
+
+        # Objetivo: disparar cuando precio >= nivel  <=>  -precio <= -nivel
+        key_level = -sign * level
+        ladder.insert(key_level, trigger_id)
+        self._index[(trigger_id, TAKE_PROFIT)] = (ladder, key_level, sign)
+
+    def add_break_even(self, trigger_id: str, symbol: str, side: str, level: float):
+        """Registrar el nivel a partir del cual el stop pasa al precio de entrada"""
+        self.remove(trigger_id, BREAK_EVEN)
+        sign = _side_sign(side)
+        ladder = self._break_even.setdefault((symbol, sign), _Ladder())
+
+        key_level = -sign * level
+        ladder.insert(key_level, trigger_id)
+        self._index[(trigger_id, BREAK_EVEN)] = (ladder, key_level, sign)
+
+    def remove(self, trigger_id: str, kind: Optional[str] = None):
+        """Eliminar los disparadores de un id (todos los tipos si no se indica)"""
+        kinds = (kind,) if kind else (STOP_LOSS, TAKE_PROFIT, BREAK_EVEN)
+        for k in kinds:
+            entry = self._index.pop((trigger_id, k), None)
+            if entry is not None:
+                ladder, key_level, _ = entry
+                ladder.remove(trigger_id, key_level)
+
+    def move_stop(self, trigger_id: str, symbol: str, side: str, level: float):
+        """Mover un stop a un nuevo nivel conservando su carácter móvil"""
+        trailing_percentage = self._trailing_percentage(trigger_id, symbol, side)
+        self.add_stop(trigger_id, symbol, side, level, trailing_percentage)
+
+    def stop_level(self, trigger_id: str) -> Optional[float]:
+        """Nivel actual del stop (incluye desplazamientos del stop móvil)"""
+        entry = self._index.get((trigger_id, STOP_LOSS))
+        if entry is None:
+            return None
+        ladder, _, sign = entry
+        level = ladder.level_of(trigger_id)
+        return None if level is None else sign * level
+
+    def on_price(self, symbol: str, price: float) -> List[Dict]:
+        """Procesar un precio y devolver (y retirar) sólo los disparadores cruzados"""
+        triggered = []
+
+        for sign in (1, -1):
+            key = (symbol, sign)
+            x = sign * price
+
+            ladder = self._stops.get(key)
+            if ladder:
+                self._collect(triggered, ladder.pop_crossed(x), STOP_LOSS, sign)
+
+            ladder = self._targets.get(key)
+            if ladder:
+                self._collect(triggered, ladder.pop_crossed(-x), TAKE_PROFIT, -sign)
+
+            ladder = self._break_even.get(key)
+            if ladder:
+                self._collect(triggered, ladder.pop_crossed(-x), BREAK_EVEN, -sign)
+
+            groups = self._trailing.get(key)
+            if groups:
+                for percentage, ladder in groups.items():
+                    self._collect(triggered, ladder.pop_crossed(x), STOP_LOSS, sign)
+                    # Subir los stops que quedan por debajo del nuevo máximo
+                    new_level = x * (1 - sign * percentage / 100)
+                    raised = ladder.raise_to(new_level)
+                    if raised and self.on_ratchet:
+                        for trigger_id in raised:
+                            self.on_ratchet(trigger_id, sign * new_level)
+
+        return triggered
+
+    def _collect(self, triggered: List[Dict], crossed: List[Tuple[float, str]], kind: str, sign: int):
+        for key_level, trigger_id in crossed:
+            self._index.pop((trigger_id, kind), None)
+            triggered.append({'id': trigger_id, 'kind': kind, 'level': sign * key_level})
+
+    def _trailing_percentage(self, trigger_id: str, symbol: str, side: str) -> Optional[float]:
+        entry = self._index.get((trigger_id, STOP_LOSS))
+        if entry is None:
+            return None
+        ladder = entry[0]
+        for percentage, group in self._trailing.get((symbol, _side_sign(side)), {}).items():
+            if group is ladder:
+                return percentage
+        return None
+
+    def __len__(self):
+        return len(self._index)
@@ -0,0 +1,402 @@
+"""
+Puente publicar/suscribir por socket Unix entre el proceso del bot y la web
+
+El proceso del bot abre un BridgeServer y publica por tema (indicadores,
+estado, eventos); cada worker web se conecta con un BridgeClient y recibe
+las publicaciones en cuanto ocurren, sin pasar por disco ni esperar a un
+intervalo de sondeo.
+
+Trama binaria: [tipo B][longitud del tema H][longitud del payload I][tema][payload]
+con el payload en JSON compacto. El servidor guarda la última trama de cada
+tema y la reenvía al suscribirse, así que un worker que arranca o se
+reconecta recibe el estado actual sin esperar a la siguiente publicación.
+El cliente se reconecta solo con backoff exponencial.
+"""
+import asyncio
+import json
+import logging
+import os
+import selectors
+import socket
+import struct
+import threading
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from config import Config
+
+FRAME_PUBLISH = 1
+FRAME_SUBSCRIBE = 2
+
+_HEADER = struct.Struct('<BHI')
+HEADER_SIZE = _HEADER.size  # 7 bytes
+
+MAX_PAYLOAD = 16 * 1024 * 1024
+# Datos pendientes de enviar a un cliente antes de desconectarlo por lento
+MAX_CLIENT_BUFFER = 4 * 1024 * 1024
+
+
+def encode_frame(kind: int, topic: str, data: Any = None) -> bytes:
+    topic_bytes = topic.encode('utf-8')
+    payload = b'' if data is None else json.dumps(data, default=str, separators=(',', ':')).encode('utf-8')
+    return _HEADER.pack(kind, len(topic_bytes), len(payload)) + topic_bytes + payload
+
+
+def decode_frames(buffer: bytearray) -> List[Tuple[int, str, Any]]:
+    """Extraer las tramas completas del buffer (lo incompleto se queda en él)"""
+    frames = []
+    offset = 0
+    while len(buffer) - offset >= HEADER_SIZE:
+        kind, topic_length, payload_length = _HEADER.unpack_from(buffer, offset)
+        if payload_length > MAX_PAYLOAD:
+            raise ValueError(f"Trama demasiado grande: {payload_length} bytes")
+        end = offset + HEADER_SIZE + topic_length + payload_length
+        if len(buffer) < end:
+            break
+        start = offset + HEADER_SIZE
+        topic = bytes(buffer[start:start + topic_length]).decode('utf-8')
+        payload = buffer[start + topic_length:end]
+        frames.append((kind, topic, json.loads(payload) if payload else None))
+        offset = end
+    del buffer[:offset]
+    return frames
+
+
+def _matches(topics: Iterable[str], topic: str) -> bool:
+    # '' suscribe a todo; 'event' recibe también 'event.trade', etc.
+    return any(not prefix or topic == prefix or topic.startswith(prefix + '.') for prefix in topics)
+
+
+class _Peer:
+    __slots__ = ('sock', 'inbox', 'outbox', 'topics')
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.inbox = bytearray()
+        self.outbox = bytearray()
+        self.topics: List[str] = []
+
+
+class BridgeServer:
+    """Servidor del puente (proceso del bot); todo el E/S ocurre en un hilo propio"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.logger = logging.getLogger(__name__)
+        self.path = path or Config.BRIDGE_SOCKET
+        self._selector = selectors.DefaultSelector()
+        self._listener: Optional[socket.socket] = None
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_w.setblocking(False)
+        self._peers: Dict[int, _Peer] = {}
+        self._last: Dict[str, bytes] = {}
+        self._handlers: Dict[str, List[Callable[[str, Any], None]]] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+        # Estadísticas
+        self.published = 0
+        self.dropped_clients = 0
+
+    @property
+    def clients(self) -> int:
+        return len(self._peers)
+
+    def start(self) -> bool:
+        """Abrir el socket; False si otro proceso ya sirve el puente"""
+        if self._running:
+            return True
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+                self.logger.warning(f"⚠️ El puente {self.path} ya está en uso por otro proceso")
+                return False
+            except OSError:
+                os.remove(self.path)  # socket huérfano de una ejecución anterior
+            finally:
+                probe.close()
+
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            listener.bind(self.path)
+            listener.listen(16)
+        except OSError as e:
+            listener.close()
+            self.logger.warning(f"⚠️ No se pudo abrir el puente de eventos {self.path}: {e}")
+            return False
+        listener.setblocking(False)
+        self._listener = listener
+        self._selector.register(listener, selectors.EVENT_READ, 'accept')
+        self._wake_r.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, 'wake')
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='uds-bridge', daemon=True)
+        self._thread.start()
+        self.logger.info(f"🔌 Puente de eventos escuchando en {self.path}")
+        return True
+
+    def stop(self):
+        if not self._running:
+            return
+        self._running = False
+        self._wake()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        for peer in list(self._peers.values()):
+            self._drop(peer)
+        # Dejar el selector vacío para que un start() posterior pueda volver a registrar
+        self._selector.unregister(self._wake_r)
+        if self._listener is not None:
+            self._selector.unregister(self._listener)
+            self._listener.close()
+            self._listener = None
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def on(self, topic: str, callback: Callable[[str, Any], None]):
+        """Registrar un callback(tema, datos) para lo que publiquen los clientes (p. ej. control)"""
+        self._handlers.setdefault(topic, []).append(callback)
+
+    def publish(self, topic: str, data: Any):
+        """Publicar a los clientes suscritos (no bloquea: se encola y escribe el hilo del puente)"""
+        self._fan_out(topic, encode_frame(FRAME_PUBLISH, topic, data))
+
+    def _fan_out(self, topic: str, frame: bytes, origin: Optional[_Peer] = None):
+        with self._lock:
+            self._last[topic] = frame
+            self.published += 1
+            for peer in self._peers.values():
+                if peer is not origin and _matches(peer.topics, topic):
+                    peer.outbox += frame
+        self._wake()
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass  # ya hay un aviso pendiente
+
+    def _run(self):
+        while self._running:
+            with self._lock:
+                for peer in list(self._peers.values()):
+                    if len(peer.outbox) > MAX_CLIENT_BUFFER:
+                        self.logger.warning("⚠️ Cliente del puente demasiado lento, desconectado")
+                        self.dropped_clients += 1
+                        self._drop(peer)
+                        continue
+                    events = selectors.EVENT_READ | (selectors.EVENT_WRITE if peer.outbox else 0)
+                    self._selector.modify(peer.sock, events, peer)
+
+            for key, mask in self._selector.select(timeout=1.0):
+                try:
+                    if key.data == 'accept':
+                        self._accept()
+                    elif key.data == 'wake':
+                        self._wake_r.recv(4096)
+                    else:
+                        if mask & selectors.EVENT_READ:
+                            self._read(key.data)
+                        if mask & selectors.EVENT_WRITE and key.data.sock.fileno() >= 0:
+                            self._write(key.data)
+                except Exception as e:
+                    self.logger.error(f"Error en el puente de eventos: {e}")
+                    if isinstance(key.data, _Peer):
+                        with self._lock:
+                            self._drop(key.data)
+
+    def _accept(self):
+        sock, _ = self._listener.accept()
+        sock.setblocking(False)
+        peer = _Peer(sock)
+        with self._lock:
+            self._peers[sock.fileno()] = peer
+        self._selector.register(sock, selectors.EVENT_READ, peer)
+
+    def _read(self, peer: _Peer):
+        data = peer.sock.recv(65536)
+        if not data:
+            with self._lock:
+                self._drop(peer)
+            return
+        peer.inbox += data
+        for kind, topic, payload in decode_frames(peer.inbox):
+            if kind == FRAME_SUBSCRIBE:
+                with self._lock:
+                    peer.topics.append(topic)
+                    # Último valor de cada tema suscrito: el cliente no espera a la siguiente publicación
+                    for last_topic, frame in self._last.items():
+                        if _matches((topic,), last_topic):
+                            peer.outbox += frame
+            elif kind == FRAME_PUBLISH:
+                for callback in self._handlers.get(topic, ()):
+                    try:
+                        callback(topic, payload)
+                    except Exception as e:
+                        self.logger.error(f"Error procesando {topic} del puente: {e}")
+                self._fan_out(topic, encode_frame(FRAME_PUBLISH, topic, payload), origin=peer)
+
+    def _write(self, peer: _Peer):
+        with self._lock:
+            if not peer.outbox:
+                return
+            try:
+                sent = peer.sock.send(peer.outbox)
+            except BlockingIOError:
+                return
+            del peer.outbox[:sent]
+
+    def _drop(self, peer: _Peer):
+        """Cerrar un cliente (con el lock tomado)"""
+        if self._peers.pop(peer.sock.fileno(), None) is None:
+            return
+        try:
+            self._selector.unregister(peer.sock)
+        except (KeyError, ValueError):
+            pass
+        peer.sock.close()
+
+
+class BridgeClient:
+    """Cliente asyncio del puente (workers web) con reconexión automática"""
+
+    def __init__(self, path: Optional[str] = None, topics: Iterable[str] = ('',),
+                 on_message: Optional[Callable[[str, Any], Awaitable[None]]] = None):
+        self.logger = logging.getLogger(__name__)
+        self.path = path or Config.BRIDGE_SOCKET
+        self.topics = list(topics)
+        self.on_message = on_message
+        self.last: Dict[str, Any] = {}
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._closed = False
+
+        # Estadísticas
+        self.connected = False
+        self.reconnects = 0
+        self.received = 0
+
+    async def run(self, max_backoff: float = 5.0):
+        """Mantener la conexión (reintentando) y entregar los mensajes a on_message"""
+        backoff = 0.1
+        while not self._closed:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except OSError:
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, max_backoff)
+                continue
+
+            self._writer = writer
+            self.connected = True
+            backoff = 0.1
+            self.logger.info(f"🔌 Conectado al puente de eventos {self.path}")
+            try:
+                for topic in self.topics:
+                    writer.write(encode_frame(FRAME_SUBSCRIBE, topic))
+                await writer.drain()
+                await self._receive(reader)
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"⚠️ Puente de eventos desconectado: {e}")
+            finally:
+                self.connected = False
+                self._writer = None
+                writer.close()
+            if not self._closed:
+                self.reconnects += 1
+                await asyncio.sleep(backoff)
+
+    async def _receive(self, reader: asyncio.StreamReader):
+        buffer = bytearray()
+        while True:
+            chunk = await reader.read(65536)
+            if not chunk:
+                raise ConnectionResetError("el servidor cerró la conexión")
+            buffer += chunk
+            for kind, topic, data in decode_frames(buffer):
+                if kind != FRAME_PUBLISH:
+                    continue
+                self.received += 1
+                self.last[topic] = data
+                if self.on_message is not None:
+                    try:
+                        await self.on_message(topic, data)
+                    except Exception as e:
+                        self.logger.error(f"Error procesando {topic} del puente: {e}")
+
+    async def publish(self, topic: str, data: Any) -> bool:
+        """Publicar hacia el proceso del bot (False si no hay conexión)"""
+        writer = self._writer
+        if writer is None:
+            return False
+        writer.write(encode_frame(FRAME_PUBLISH, topic, data))
+        await writer.drain()
+        return True
+
+    def close(self):
+        self._closed = True
+        if self._writer is not None:
+            self._writer.close()
+
+    def stats(self) -> Dict:
+        return {'connected': self.connected, 'reconnects': self.reconnects,
+                'received': self.received, 'path': self.path}
+
+
+if __name__ == "__main__":
+    # Benchmark: latencia publicación -> recepción y prueba de reconexión con reenvío del último valor
+    import tempfile
+    import time
+
+    path = os.path.join(tempfile.mkdtemp(), 'bridge.sock')
+    server = BridgeServer(path)
+    server.start()
+    server.publish('status', {'running': True})
+
+    async def main():
+        latencies = []
+        received = asyncio.Event()
+
+        async def on_message(topic, data):
+            if topic == 'tick':
+                latencies.append(time.perf_counter() - data['sent'])
+                received.set()
+
+        rounds = 2000
+        client = BridgeClient(path, topics=('status', 'tick'), on_message=on_message)
+        task = asyncio.create_task(client.run())
+        while not client.last.get('status'):
+            await asyncio.sleep(0.01)
+        print(f"Último valor reenviado al conectar: {client.last['status']}")
+
+        for n in range(rounds):
+            received.clear()
+            server.publish('tick', {'n': n, 'sent': time.perf_counter()})
+            await asyncio.wait_for(received.wait(), 5)
+        latencies.sort()
+        print(f"{rounds} mensajes: p50 {latencies[len(latencies) // 2] * 1e3:.3f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1e3:.3f} ms")
+
+        # Reinicio del servidor: el cliente se reconecta y recibe el último valor de nuevo
+        server.stop()
+        restarted = BridgeServer(path)
+        restarted.start()
+        restarted.publish('status', {'running': False})
+        for _ in range(100):
+            if client.last.get('status') == {'running': False}:
+                break
+            await asyncio.sleep(0.05)
+        print(f"Tras reiniciar el servidor: {client.last['status']} (reconexiones: {client.reconnects})")
+        assert client.last['status'] == {'running': False}
+        client.close()
+        task.cancel()
+        restarted.stop()
+        print("✅ Reconexión y reenvío del último valor correctos")
+
+    asyncio.run(main())
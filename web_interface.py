@@ -1,23 +1,43 @@
 """
 Interfaz web para control y monitoreo del bot de trading
+
+El módulo se importa sin cargar el bot, ccxt, pandas ni matplotlib: el
+CryptoTradingBot se construye en segundo plano tras el arranque del servidor
+y el resto de componentes pesados se importan en su primer uso, de modo que
+"/" responde en cuanto uvicorn escucha.
 """
+import time
+_import_started = time.perf_counter()
+
 import asyncio
+import contextlib
+import functools
 import json
+import os
 from datetime import datetime
-from typing import Dict, List
+from typing import TYPE_CHECKING, ContextManager, Dict, List, Optional, Tuple
 import logging
 
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
 from config import Config
-from crypto_trading_bot import CryptoTradingBot
-from backtesting import BacktestingEngine
-from exchange_manager import ExchangeManager
-from risk_manager import RiskManager
+from response_cache import TTLCache
+from trade_records import ClosedTradeStore, to_epoch
+from async_utils import BlockingPool, LoopLatencyProbe
+from http_cache import HTTPCache, static_payload
+from ws_manager import ConnectionManager, TOPIC_INTERVALS, LOG_LINES
+from shared_state import SharedStateStore, EventBroker, EngineLock
+from dashboard_snapshot import DashboardSnapshot
+from event_bus import CycleCompleted, FillRecorded
+from uds_bridge import BridgeClient
+import metrics
+
+if TYPE_CHECKING:
+    from exchange_manager import ExchangeManager
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -35,17 +55,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Variables globales
+# Variables globales (propias de este worker)
 bot_instance = None
-bot_status = {"running": False, "last_update": None}
 connected_clients = []
 
-# Importar el bot funcional
-try:
-    from dashboard_bot import get_bot_instance
-    dashboard_bot = get_bot_instance()
-except:
-    dashboard_bot = None
+# Estado compartido entre workers: sólo el worker con engine_lock aloja el motor
+shared_store = SharedStateStore()
+broker = EventBroker()
+engine_lock = EngineLock()
 
 # Importar el log streamer
 try:
@@ -54,51 +71,321 @@ try:
 except:
     log_streamer = None
 
-# Importar el performance tracker
-try:
-    from performance_tracker import performance_tracker
-except:
-    performance_tracker = None
-
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-    
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-    
-    def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-    
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
-    
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except:
-                self.active_connections.remove(connection)
+@functools.lru_cache(maxsize=None)
+def _performance_tracker():
+    """Performance tracker (importa pandas): se carga en el primer uso"""
+    try:
+        from performance_tracker import performance_tracker
+        return performance_tracker
+    except Exception as e:
+        logger.warning(f"⚠️ Performance tracker no disponible: {e}")
+        return None
 
 manager = ConnectionManager()
 
-@app.on_event("startup")
-async def startup_event():
-    """Inicializar componentes en el startup"""
+# Pool para el trabajo bloqueante (exchange, archivos, parada del bot) y sonda de latencia del loop
+blocking_pool = BlockingPool(max_workers=Config.WEB_WORKER_THREADS)
+loop_probe = LoopLatencyProbe()
+
+# ETag / 304 / compresión para las respuestas de la API
+http_cache = HTTPCache()
+
+# Métricas de la interfaz web (expuestas en /metrics)
+HTTP_REQUEST_SECONDS = metrics.histogram('http_request_duration_seconds', 'Duración de las peticiones HTTP',
+                                         ['method', 'route', 'status'])
+metrics.gauge('ws_clients', 'Clientes WebSocket conectados').set_function(lambda: len(manager.channels))
+metrics.gauge('ws_queued_messages', 'Mensajes pendientes en las colas WebSocket').set_function(
+    lambda: manager.stats()['queued'])
+metrics.gauge('ws_dropped_messages', 'Mensajes WebSocket descartados por cola llena').set_function(
+    lambda: manager.stats()['dropped'])
+metrics.gauge('event_loop_lag_max_seconds', 'Retraso máximo del event loop').set_function(
+    lambda: loop_probe.max_lag_ms / 1000)
+
+# Serie del histograma por (método, ruta, status): evita labels() en cada petición
+_request_series: Dict[tuple, object] = {}
+
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Plantilla de la ruta (no la URL) para no crear una serie por parámetro
+    route = request.scope.get('route')
+    key = (request.method, getattr(route, 'path', 'unmatched'), response.status_code)
+    series = _request_series.get(key)
+    if series is None:
+        series = _request_series[key] = HTTP_REQUEST_SECONDS.labels(*key)
+    series.observe(time.perf_counter() - started)
+    return response
+
+# Caché de /api/portfolio y del balance (se invalidan al producirse un fill)
+portfolio_cache = TTLCache(Config.PORTFOLIO_CACHE_TTL_SECONDS)
+balance_cache = TTLCache(Config.BALANCE_CACHE_TTL_SECONDS)
+_exchange = None
+
+def _get_exchange() -> 'ExchangeManager':
+    """Reutilizar el exchange del bot (o uno propio) en lugar de crear uno por petición"""
+    global _exchange
+    if bot_instance is not None and getattr(bot_instance, 'exchange', None) is not None:
+        return bot_instance.exchange
+    if _exchange is None:
+        from exchange_manager import ExchangeManager
+        _exchange = ExchangeManager()
+    return _exchange
+
+def _cached_balance() -> float:
+    return balance_cache.get_or_compute('USDC', lambda: _get_exchange().get_usdc_balance())
+
+def _on_fill(event: str, symbol: str):
+    """Un fill cambia posiciones y balance: descartar las respuestas cacheadas (en todos los workers)"""
+    balance_cache.clear()
+    portfolio_cache.clear()
+    broker.publish('fill', {'event': event, 'symbol': symbol})
+
+def _share_portfolio() -> Dict:
+    data = _build_portfolio()
+    shared_store.put('portfolio', data)
+    return data
+
+def _portfolio_snapshot() -> Dict:
+    """El worker del motor calcula el portafolio y lo comparte; el resto lo lee"""
+    if engine_lock.owned:
+        return portfolio_cache.get_or_compute('portfolio', _share_portfolio)
+    return shared_store.get('portfolio') or portfolio_cache.get_or_compute('portfolio', _build_portfolio)
+
+def _engine_state() -> Dict:
+    return shared_store.get('engine', {"running": False, "last_update": None})
+
+async def _announce(payload: Dict):
+    """Mensaje para los dashboards de todos los workers (se entrega vía broker)"""
+    await blocking_pool.run(broker.publish, 'broadcast', payload)
+
+publisher_task = None
+bridge_task = None
+bot_init_task = None
+startup_times: Dict[str, Optional[float]] = {"import_seconds": None, "bot_ready_seconds": None}
+
+def _build_bot():
+    """Importar y construir el bot (ccxt, pandas, load_markets, RiskManager): en el pool"""
+    from crypto_trading_bot import CryptoTradingBot
+    return CryptoTradingBot()
+
+async def _init_bot():
+    """Inicializar componentes en segundo plano; el servidor ya está respondiendo"""
     global bot_instance
+    started = time.perf_counter()
     try:
-        # Inicializar componentes
-        bot_instance = CryptoTradingBot()
-        logger.info("✅ Componentes inicializados")
+        bot = await blocking_pool.run(_build_bot)
+        bot.events.subscribe('web', _on_bot_event, (FillRecorded, CycleCompleted))
+        bot_instance = bot
+        startup_times["bot_ready_seconds"] = round(time.perf_counter() - started, 3)
+        logger.info(f"✅ Componentes inicializados en {startup_times['bot_ready_seconds']:.2f}s")
     except Exception as e:
         logger.error(f"❌ Error inicializando componentes: {e}")
+    # Precargar el performance tracker (pandas) fuera del event loop
+    await blocking_pool.run(_performance_tracker)
 
-@app.get("/", response_class=HTMLResponse)
-async def get_dashboard():
-    """Servir el dashboard principal"""
-    return """
+# Motor entregado por el supervisor (bot y web en un solo proceso): sustituye al bot propio
+engine_controller = None
+
+def attach_engine(controller):
+    """Usar el motor del supervisor en lugar de construir un CryptoTradingBot en este worker"""
+    global engine_controller
+    engine_controller = controller
+
+async def _attach_engine_bot():
+    global bot_instance
+    started = time.perf_counter()
+    await engine_controller.ready.wait()
+    # Mismos avisos que con el bot propio: snapshot por ciclo e invalidación de cachés por fill
+    engine_controller.bot.events.subscribe('web', _on_bot_event, (FillRecorded, CycleCompleted))
+    bot_instance = engine_controller.bot
+    startup_times["bot_ready_seconds"] = round(time.perf_counter() - started, 3)
+    logger.info(f"✅ Motor del supervisor disponible en {startup_times['bot_ready_seconds']:.2f}s")
+    await blocking_pool.run(_performance_tracker)
+
+async def _require_bot():
+    """Bot ya construido, esperando a la inicialización en curso si hace falta"""
+    if bot_instance is None and bot_init_task is not None and not bot_init_task.done():
+        await asyncio.shield(bot_init_task)
+    return bot_instance
+
+@app.on_event("startup")
+async def startup_event():
+    """Arrancar tareas de fondo sin esperar a la construcción del bot"""
+    global publisher_task, bridge_task, bot_init_task
+    loop_probe.start()
+    broker.seek_end()
+    if engine_lock.acquire():
+        # Este worker aloja el motor; el resto sólo lee el estado compartido
+        shared_store.put('engine', {"running": False, "last_update": datetime.now().isoformat(),
+                                    "pid": os.getpid()})
+        bot_init_task = asyncio.create_task(_init_bot() if engine_controller is None else _attach_engine_bot())
+        logger.info(f"⚙️ Worker {os.getpid()} aloja el motor de trading")
+    else:
+        logger.info(f"📖 Worker {os.getpid()} en modo lectura (el motor está en otro worker)")
+    publisher_task = asyncio.create_task(dashboard_publisher())
+    bridge_task = asyncio.create_task(bridge_client.run())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Detener el publicador del dashboard, las conexiones WebSocket y el pool de hilos"""
+    bridge_client.close()
+    for task in (publisher_task, bridge_task, bot_init_task):
+        if task:
+            task.cancel()
+    await manager.close_all()
+    await loop_probe.stop()
+    blocking_pool.shutdown()
+    engine_lock.release()
+
+def _status_snapshot() -> Dict:
+    from bot_status import load_status
+    status_data = load_status()
+    return {
+        "running": status_data.get("running", False),
+        "last_update": status_data.get("last_update", datetime.now().isoformat())
+    }
+
+def _indicators_snapshot() -> Dict:
+    from indicators_store import get_indicators_with_timestamp
+    return get_indicators_with_timestamp()
+
+def _performance_snapshot() -> Dict:
+    tracker = _performance_tracker()
+    return {"metrics": tracker.get_performance_metrics() if tracker else {}}
+
+def _logs_snapshot() -> Dict:
+    return {"lines": log_streamer.get_recent_logs(LOG_LINES) if log_streamer else []}
+
+# Todas las secciones del dashboard en un único documento versionado
+dashboard_snapshot = DashboardSnapshot({
+    'status': _status_snapshot,
+    'portfolio': _portfolio_snapshot,
+    'indicators': _indicators_snapshot,
+    'performance': _performance_snapshot,
+    'logs': _logs_snapshot,
+}, max_age=Config.SNAPSHOT_MAX_AGE_SECONDS)
+_shared_snapshot_version = 0
+
+def _current_snapshot() -> Dict:
+    """Snapshot del motor (en memoria o compartido por el worker del motor)"""
+    global _shared_snapshot_version
+    if not engine_lock.owned:
+        version = shared_store.version('snapshot')
+        if (version is not None and time.time_ns() - version[0] <= Config.SNAPSHOT_MAX_AGE_SECONDS * 1e9
+                and version[0] >= dashboard_snapshot.built_at * 1e9):
+            return shared_store.get('snapshot')
+    
+    version, data = dashboard_snapshot.get()
+    if engine_lock.owned and version != _shared_snapshot_version:
+        _shared_snapshot_version = version
+        shared_store.put('snapshot', data)
+    return data
+
+def _on_cycle(result: str):
+    """Fin de un ciclo del motor: reconstruir el snapshot una vez para todos los clientes"""
+    portfolio_cache.clear()
+    dashboard_snapshot.rebuild()
+    _current_snapshot()
+
+def _on_bot_event(event):
+    """Consumidor del bus de eventos del motor (en su propio hilo, fuera del ciclo)"""
+    if isinstance(event, FillRecorded):
+        _on_fill(event.event, event.symbol)
+    elif isinstance(event, CycleCompleted):
+        _on_cycle(event.result)
+
+def _rebuild_snapshot_topic() -> Dict:
+    dashboard_snapshot.rebuild()
+    return _snapshot_topic()
+
+async def _on_bridge_message(topic: str, data: Dict):
+    """Publicación del proceso del bot: llevarla a los dashboards sin esperar al intervalo"""
+    # El bot escribe el canal de memoria compartida antes de avisar: basta reconstruir
+    if topic in ('indicators', 'status') and manager.has_subscribers('snapshot'):
+        await manager.publish('snapshot', await blocking_pool.run(_rebuild_snapshot_topic))
+
+# Eventos del proceso del bot (dashboard_bot) por socket Unix
+bridge_client = BridgeClient(topics=('indicators', 'status'), on_message=_on_bridge_message)
+
+def _snapshot_topic() -> Dict:
+    # Los logs tienen su propio tema de sólo-añadir; la versión va en el mensaje
+    return {key: value for key, value in _current_snapshot().items() if key not in ('logs', 'version')}
+
+TOPIC_BUILDERS = {
+    'status': _status_snapshot,
+    'indicators': _indicators_snapshot,
+    'performance': _performance_snapshot,
+    'portfolio': _portfolio_snapshot,
+    'snapshot': _snapshot_topic,
+}
+
+async def _dispatch_events():
+    """Procesar los eventos publicados por cualquier worker"""
+    for event in await blocking_pool.run(broker.poll):
+        topic, data = event.get('topic'), event.get('data') or {}
+        if topic == 'broadcast':
+            await manager.broadcast(json.dumps(data, default=str))
+        elif topic == 'fill' and event.get('origin') != broker.pid:
+            balance_cache.clear()
+            portfolio_cache.clear()
+        elif topic == 'control' and engine_lock.owned:
+            command = data.get('command')
+            if command not in ('start', 'stop'):
+                continue
+            result = await (_start_engine() if command == 'start' else _stop_engine())
+            if not result.get("success"):
+                # Quien envió la orden ya respondió: informar del fallo a los dashboards
+                await _announce({"log": f"❌ {result.get('error')}"})
+
+async def _refresh_logs():
+    """Publicar sólo las líneas nuevas del log"""
+    if not log_streamer:
+        return
+    if 'logs' not in manager.snapshots:
+        lines = await blocking_pool.run(log_streamer.get_recent_logs, LOG_LINES)
+        log_streamer.seek_end()
+        await manager.publish('logs', {'lines': lines})
+    else:
+        lines = await blocking_pool.run(log_streamer.read_new_lines)
+        await manager.publish_append('logs', lines)
+
+async def dashboard_publisher():
+    """Recalcular cada tema una vez por intervalo y publicar los cambios.
+    
+    El coste es constante: no depende del número de dashboards abiertos.
+    """
+    last_run: Dict[str, float] = {}
+    
+    while True:
+        try:
+            await _dispatch_events()
+        except Exception as e:
+            logger.error(f"Error procesando eventos compartidos: {e}")
+        
+        now = time.monotonic()
+        for topic, interval in TOPIC_INTERVALS.items():
+            if now - last_run.get(topic, 0) < interval:
+                continue
+            if not manager.has_subscribers(topic):
+                # El worker del motor mantiene el portafolio compartido aunque no tenga dashboards
+                if topic == 'portfolio' and engine_lock.owned:
+                    last_run[topic] = now
+                    await blocking_pool.run(_portfolio_snapshot)
+                continue
+            last_run[topic] = now
+            try:
+                if topic == 'logs':
+                    await _refresh_logs()
+                else:
+                    data = await blocking_pool.run(TOPIC_BUILDERS[topic])
+                    await manager.publish(topic, data)
+            except Exception as e:
+                logger.error(f"Error publicando tema {topic}: {e}")
+        
+        await asyncio.sleep(0.5)
+
+DASHBOARD_HTML = """
     <!DOCTYPE html>
     <html lang="es">
     <head>
@@ -599,17 +886,29 @@ async def get_dashboard():
         <script>
             let ws = null;
             
+            // Temas publicados por el servidor: snapshot inicial + deltas versionadas
+            // 'snapshot' agrupa estado, portafolio, indicadores y rendimiento en un solo mensaje
+            const TOPICS = ['snapshot', 'logs'];
+            const SNAPSHOT_SECTIONS = ['status', 'portfolio', 'indicators', 'performance'];
+            const topicState = {};
+            const topicVersion = {};
+            
             function connectWebSocket() {
                 const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
                 ws = new WebSocket(`${protocol}//${window.location.host}/ws`);
                 
                 ws.onopen = function(event) {
                     console.log('WebSocket conectado');
+                    ws.send(JSON.stringify({action: 'subscribe', topics: TOPICS}));
                 };
                 
                 ws.onmessage = function(event) {
                     const data = JSON.parse(event.data);
-                    updateDashboard(data);
+                    if (data.topic) {
+                        handleTopicMessage(data);
+                    } else {
+                        updateDashboard(data);
+                    }
                 };
                 
                 ws.onclose = function(event) {
@@ -622,6 +921,62 @@ async def get_dashboard():
                 };
             }
             
+            function isPlainObject(value) {
+                return value !== null && typeof value === 'object' && !Array.isArray(value);
+            }
+            
+            function mergeDelta(target, delta) {
+                Object.entries(delta).forEach(([key, value]) => {
+                    if (value === null) {
+                        delete target[key];
+                    } else if (isPlainObject(value) && isPlainObject(target[key])) {
+                        mergeDelta(target[key], value);
+                    } else {
+                        target[key] = value;
+                    }
+                });
+            }
+            
+            function handleTopicMessage(message) {
+                const topic = message.topic;
+                
+                if (message.type === 'snapshot') {
+                    topicState[topic] = message.data;
+                } else if (topicState[topic] === undefined || topicVersion[topic] !== message.version - 1) {
+                    // Se perdió una versión: pedir de nuevo el snapshot
+                    ws.send(JSON.stringify({action: 'resync', topics: [topic]}));
+                    return;
+                } else if (message.type === 'append') {
+                    const lines = topicState[topic].lines.concat(message.data.lines);
+                    topicState[topic].lines = lines.slice(-50);
+                } else {
+                    mergeDelta(topicState[topic], message.data);
+                }
+                
+                topicVersion[topic] = message.version;
+                renderTopic(topic, topicState[topic]);
+            }
+            
+            function renderTopic(topic, state) {
+                if (topic === 'snapshot') {
+                    SNAPSHOT_SECTIONS.forEach(section => {
+                        if (state[section]) {
+                            renderTopic(section, state[section]);
+                        }
+                    });
+                } else if (topic === 'status') {
+                    updateBotStatus(state);
+                } else if (topic === 'portfolio') {
+                    updatePortfolioFromTracker(state);
+                } else if (topic === 'logs') {
+                    renderLogs(state.lines || []);
+                } else if (topic === 'indicators') {
+                    updateIndicatorsTable(state.indicators);
+                } else if (topic === 'performance' && state.metrics) {
+                    updatePerformanceDisplay(state.metrics);
+                }
+            }
+            
             function updateDashboard(data) {
                 if (data.status) {
                     updateBotStatus(data.status);
@@ -808,18 +1163,20 @@ async def get_dashboard():
                 }
             }
             
+            function renderLogs(lines) {
+                const logsContainer = document.getElementById('logs');
+                if (lines.length > 0) {
+                    logsContainer.innerHTML = lines.map(log => `<div>${log}</div>`).join('');
+                    logsContainer.scrollTop = logsContainer.scrollHeight;
+                }
+            }
+            
             // Función para cargar logs desde el servidor
             function loadLogsFromServer() {
                 fetch('/api/logs')
                     .then(response => response.json())
                     .then(data => {
-                        const logsContainer = document.getElementById('logs');
-                        if (data.logs && data.logs.length > 0) {
-                            logsContainer.innerHTML = data.logs.map(log => 
-                                `<div>${log}</div>`
-                            ).join('');
-                            logsContainer.scrollTop = logsContainer.scrollHeight;
-                        }
+                        renderLogs(data.logs || []);
                     })
                     .catch(error => {
                         console.error('Error cargando logs:', error);
@@ -1041,59 +1398,85 @@ async def get_dashboard():
             }
             
             async function refreshData() {
+                if (ws && ws.readyState === WebSocket.OPEN) {
+                    // Pedir de nuevo los snapshots de todos los temas
+                    ws.send(JSON.stringify({action: 'resync', topics: TOPICS}));
+                    addLogEntry('Datos actualizados');
+                    return;
+                }
                 try {
-                    const response = await fetch('/api/status');
+                    // Sin WebSocket: todo el dashboard en una sola petición
+                    const response = await fetch('/api/snapshot');
                     const data = await response.json();
-                    updateDashboard(data);
+                    renderTopic('snapshot', data);
+                    if (data.logs) {
+                        renderLogs(data.logs.lines || []);
+                    }
                     addLogEntry('Datos actualizados');
                 } catch (error) {
                     addLogEntry(`Error actualizando datos: ${error.message}`);
                 }
             }
             
-            // Inicializar
+            // Inicializar: los datos llegan por /ws (snapshot al suscribirse y después deltas)
             connectWebSocket();
-            refreshData();
-            loadLogsFromServer(); // Cargar logs iniciales
-            loadPerformanceMetrics(); // Cargar métricas de rendimiento
-            loadPortfolioData(); // Cargar datos del portafolio
-            
-            // Actualizar datos cada 30 segundos
-            setInterval(refreshData, 30000);
-            // Actualizar logs cada 3 segundos
-            setInterval(loadLogsFromServer, 3000);
-            // Actualizar indicadores cada 30 segundos
-            setInterval(loadIndicators, 30000);
-            // Actualizar rendimiento cada 60 segundos
-            setInterval(loadPerformanceMetrics, 60000);
-            // Actualizar portafolio cada 30 segundos
-            setInterval(loadPortfolioData, 30000);
-            
-            // Cargar indicadores inicialmente
-            loadIndicators();
         </script>
     </body>
     </html>
     """
 
+# El HTML no cambia en tiempo de ejecución: ETag por contenido y gzip/brotli precalculados
+dashboard_payload = static_payload(DASHBOARD_HTML)
+
+@app.get("/", response_class=HTMLResponse)
+async def get_dashboard(request: Request):
+    """Servir el dashboard principal"""
+    return dashboard_payload.response(
+        request, cache_control=f"public, max-age={Config.DASHBOARD_CACHE_MAX_AGE_SECONDS}"
+    )
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket para actualizaciones en tiempo real"""
     await manager.connect(websocket)
     try:
         while True:
-            # Mantener conexión activa
-            await websocket.receive_text()
+            # Mensajes del cliente: {"action": "subscribe"|"unsubscribe"|"resync", "topics": [...]}
+            text = await websocket.receive_text()
+            try:
+                request = json.loads(text)
+            except ValueError:
+                continue
+            if not isinstance(request, dict):
+                continue
+            
+            topics = request.get('topics') or []
+            action = request.get('action')
+            if action in ('subscribe', 'resync'):
+                await manager.subscribe(websocket, topics)
+            elif action == 'unsubscribe':
+                manager.unsubscribe(websocket, topics)
     except WebSocketDisconnect:
         manager.disconnect(websocket)
 
+@app.get("/api/snapshot")
+async def get_snapshot(request: Request):
+    """Estado, portafolio, indicadores, rendimiento y logs en una sola respuesta versionada"""
+    try:
+        data = await blocking_pool.run(_current_snapshot)
+        return await http_cache.respond(request, 'snapshot', (data['version'], data['built_at']),
+                                        lambda: data, run=blocking_pool.run)
+    except Exception as e:
+        logger.error(f"Error obteniendo snapshot: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/status")
 async def get_status():
     """Obtener estado actual del bot"""
     try:
         # Leer estado desde archivo compartido
         from bot_status import load_status
-        status_data = load_status()
+        status_data = await blocking_pool.run(load_status)
         
         return {
             "status": {
@@ -1102,7 +1485,14 @@ async def get_status():
             },
             "portfolio": {},
             "balance": {},
-            "positions": []
+            "positions": [],
+            "event_loop": loop_probe.stats(),
+            "websocket": manager.stats(),
+            "events": bot_instance.events.stats() if bot_instance is not None else {},
+            "bridge": bridge_client.stats(),
+            "supervisor": engine_controller.stats() if engine_controller is not None else None,
+            "startup": {**startup_times, "bot_ready": bot_instance is not None},
+            "worker": {"pid": os.getpid(), "engine_owner": engine_lock.owned}
         }
         
     except Exception as e:
@@ -1114,7 +1504,7 @@ async def get_logs():
     """Obtener logs recientes del bot"""
     try:
         if log_streamer:
-            logs = log_streamer.get_recent_logs(20)
+            logs = await blocking_pool.run(log_streamer.get_recent_logs, 20)
             return {"logs": logs}
         else:
             return {"logs": ["Sistema de logs no disponible"]}
@@ -1125,55 +1515,47 @@ async def get_logs():
 @app.get("/api/portfolio")
 async def get_portfolio():
     """Obtener balance y resumen del portafolio"""
+    return await blocking_pool.run(_portfolio_snapshot)
+
+def _build_portfolio() -> Dict:
+    """Calcular el resumen del portafolio (compartido por la API y el tema 'portfolio')"""
     try:
-        from exchange_manager import ExchangeManager
-        
         # Obtener balance inicial de config
         initial_balance = Config.INVESTMENT_AMOUNT
         
-        # Obtener balance real de Binance
-        exchange = ExchangeManager()
-        cash_balance = exchange.get_usdc_balance()
+        # Balance real de Binance (cacheado BALANCE_CACHE_TTL_SECONDS)
+        cash_balance = _cached_balance()
         
         # Obtener datos del RiskManager del bot
         if bot_instance and hasattr(bot_instance, 'risk_manager'):
             rm = bot_instance.risk_manager
             
-            # Calcular valor de posiciones abiertas
+            # Copia bajo el lock: el ciclo y el motor de stops abren y cierran posiciones
+            # desde sus hilos; la respuesta se construye fuera con esta foto
             positions_value = 0
             open_positions_list = []
-            
-            for symbol, pos in rm.open_positions.items():
-                current_value = pos['current_price'] * pos['amount']
-                positions_value += current_value
-                
-                open_positions_list.append({
-                    'symbol': symbol,
-                    'side': pos['side'],
-                    'amount': pos['amount'],
-                    'entry_price': pos['entry_price'],
-                    'current_price': pos['current_price'],
-                    'unrealized_pnl': pos.get('unrealized_pnl', 0),
-                    'pnl_percentage': (pos.get('unrealized_pnl', 0) / (pos['entry_price'] * pos['amount']) * 100) if pos['entry_price'] * pos['amount'] > 0 else 0
-                })
+            with rm.lock:
+                for symbol, pos in rm.open_positions.items():
+                    positions_value += pos.current_value
+                    
+                    open_positions_list.append({
+                        'symbol': symbol,
+                        'side': pos.side,
+                        'amount': pos.amount,
+                        'entry_price': pos.entry_price,
+                        'current_price': pos.current_price,
+                        'unrealized_pnl': pos.unrealized_pnl,
+                        'pnl_percentage': pos.pnl_percentage
+                    })
+                total_pnl = rm.total_pnl
+                daily_pnl = rm.daily_pnl
+                # Contador mantenido por el almacén de trades (sin releer el archivo)
+                total_trades = len(rm.closed_trades)
             
             # Calcular totales
             total_value = cash_balance + positions_value
-            total_pnl = rm.total_pnl
             total_pnl_percentage = (total_pnl / initial_balance * 100) if initial_balance > 0 else 0
             
-            # Contar trades del historial
-            try:
-                import os
-                trades_file = "data/trades_history.json"
-                total_trades = 0
-                if os.path.exists(trades_file):
-                    with open(trades_file, 'r') as f:
-                        trades = json.load(f)
-                        total_trades = len(trades) if isinstance(trades, list) else 0
-            except:
-                total_trades = 0
-            
             return {
                 'cash': cash_balance,
                 'positions_value': positions_value,
@@ -1181,9 +1563,9 @@ async def get_portfolio():
                 'initial_balance': initial_balance,
                 'total_pnl': total_pnl,
                 'total_pnl_percentage': total_pnl_percentage,
-                'daily_pnl': rm.daily_pnl,
+                'daily_pnl': daily_pnl,
                 'total_trades': total_trades,
-                'open_positions': len(rm.open_positions),
+                'open_positions': len(open_positions_list),
                 'positions_detail': open_positions_list,
                 'last_update': datetime.now().isoformat()
             }
@@ -1228,11 +1610,13 @@ async def get_portfolio():
         }
 
 @app.get("/api/indicators")
-async def get_indicators():
+async def get_indicators(request: Request):
     """Obtener indicadores técnicos de todas las criptomonedas"""
     try:
-        from indicators_store import get_indicators_with_timestamp
-        return get_indicators_with_timestamp()
+        from indicators_store import get_indicators_with_timestamp, indicators_version
+        # La versión es la secuencia del canal: si no cambió se responde 304 sin leerlo
+        version = indicators_version()
+        return await http_cache.respond(request, 'indicators', version, get_indicators_with_timestamp)
     except Exception as e:
         logger.error(f"Error obteniendo indicadores: {e}")
         return {
@@ -1241,16 +1625,15 @@ async def get_indicators():
         }
 
 @app.get("/api/performance")
-async def get_performance():
+async def get_performance(request: Request):
     """Obtener métricas de rendimiento"""
     try:
-        if performance_tracker:
-            metrics = performance_tracker.get_performance_metrics()
-            chart_data = performance_tracker.get_performance_chart_data()
-            return {
-                "metrics": metrics,
-                "chart_data": chart_data
-            }
+        tracker = await blocking_pool.run(_performance_tracker)
+        if tracker:
+            # Los retornos diarios dependen de la fecha además de los datos guardados
+            version = (tracker.version, datetime.now().date().isoformat())
+            return await http_cache.respond(request, 'performance', version, _performance_payload,
+                                            run=blocking_pool.run)
         else:
             return {
                 "metrics": {
@@ -1271,55 +1654,131 @@ async def get_performance():
         logger.error(f"Error obteniendo rendimiento: {e}")
         return {"error": str(e)}
 
+def _performance_payload() -> Dict:
+    tracker = _performance_tracker()
+    return {
+        "metrics": tracker.get_performance_metrics(),
+        "chart_data": tracker.get_performance_chart_data()
+    }
+
 @app.get("/api/trades/history")
-async def get_trades_history():
-    """Obtener historial de trades"""
+async def get_trades_history(
+    symbol: Optional[str] = None,
+    side: Optional[str] = None,
+    start: Optional[str] = Query(None, description="Fecha/hora ISO inicial"),
+    end: Optional[str] = Query(None, description="Fecha/hora ISO final"),
+    reason: Optional[str] = Query(None, description="Texto contenido en la razón de salida"),
+    cursor: Optional[int] = Query(None, description="'next_cursor' de la página anterior"),
+    limit: int = Query(50, ge=1, le=500),
+    order: str = Query('desc', pattern='^(asc|desc)$')
+):
+    """Obtener historial de trades paginado y filtrado, con agregados por símbolo y día"""
     try:
-        import os
-        trades_file = "data/trades_history.json"
-        
-        if not os.path.exists(trades_file):
-            return []
-        
-        with open(trades_file, 'r') as f:
-            trades = json.load(f)
-        
-        # Asegurarse de que sea una lista
-        if not isinstance(trades, list):
-            return []
-        
-        return trades
+        return await blocking_pool.run(
+            _query_trades_history, symbol, side, start, end, reason, cursor, limit, order == 'desc'
+        )
         
     except Exception as e:
         logger.error(f"Error obteniendo historial de trades: {e}")
-        return []
+        return {'trades': [], 'next_cursor': None, 'total_trades': 0, 'by_symbol': {}, 'by_day': {}}
 
-@app.post("/api/bot/start")
-async def start_bot():
-    """Iniciar el bot de trading"""
-    try:
-        global bot_status
-        
-        if bot_status["running"]:
-            return {"success": False, "error": "Bot ya está ejecutándose"}
-        
-        if not bot_instance:
+_trades_file_store = {'mtime': None, 'store': ClosedTradeStore()}
+
+def _trades_store() -> Tuple[ClosedTradeStore, ContextManager]:
+    """Historial indexado y el bloqueo con el que leerlo: el del RiskManager del bot
+    (lo modifican el ciclo y el motor de stops) o, sin bot, el archivo (reindexado sólo si cambia)"""
+    if bot_instance is not None and hasattr(bot_instance, 'risk_manager'):
+        rm = bot_instance.risk_manager
+        return rm.closed_trades, rm.lock
+    
+    trades_file = "data/trades_history.json"
+    if not os.path.exists(trades_file):
+        return _trades_file_store['store'], contextlib.nullcontext()
+    
+    mtime = os.path.getmtime(trades_file)
+    if mtime != _trades_file_store['mtime']:
+        with open(trades_file, 'r') as f:
+            trades = json.load(f)
+        _trades_file_store['store'] = ClosedTradeStore.from_dicts(trades if isinstance(trades, list) else [])
+        _trades_file_store['mtime'] = mtime
+    # El almacén del archivo se sustituye, nunca se modifica: no necesita bloqueo
+    return _trades_file_store['store'], contextlib.nullcontext()
+
+def _query_trades_history(symbol, side, start, end, reason, cursor, limit, newest_first) -> Dict:
+    store, lock = _trades_store()
+    start_ts = to_epoch(start) if start else None
+    end_ts = to_epoch(end) if end else None
+    day_start = start[:10] if start else None
+    day_end = end[:10] if end else None
+    
+    # Consulta acotada por `limit`: se resuelve entera bajo el lock del RiskManager
+    with lock:
+        trades, next_cursor = store.query(symbol=symbol, side=side, start=start_ts, end=end_ts, reason=reason,
+                                          cursor=cursor, limit=limit, newest_first=newest_first)
+        total_trades = len(store)
+        by_symbol = store.aggregates_by_symbol()
+        by_day = store.aggregates_by_day(day_start, day_end)
+    
+    return {
+        'trades': trades,
+        'next_cursor': next_cursor,
+        'total_trades': total_trades,
+        'by_symbol': by_symbol,
+        'by_day': by_day
+    }
+
+async def _start_engine() -> Dict:
+    """Arrancar el motor alojado en este worker"""
+    if _engine_state().get("running"):
+        return {"success": False, "error": "Bot ya está ejecutándose"}
+    
+    if engine_controller is not None:
+        # El supervisor ejecuta el bot como una tarea más del event loop
+        await engine_controller.start()
+    else:
+        if not await _require_bot():
             return {"success": False, "error": "Bot no inicializado"}
         
         # Iniciar bot en hilo separado
         import threading
         bot_thread = threading.Thread(target=bot_instance.start, daemon=True)
         bot_thread.start()
-        
-        bot_status["running"] = True
-        bot_status["last_update"] = datetime.now().isoformat()
-        
-        await manager.broadcast(json.dumps({
-            "status": bot_status,
-            "log": "Bot iniciado exitosamente"
-        }))
-        
-        return {"success": True, "message": "Bot iniciado"}
+    
+    state = {"running": True, "last_update": datetime.now().isoformat(), "pid": os.getpid()}
+    await blocking_pool.run(shared_store.put, 'engine', state)
+    await _announce({"status": state, "log": "Bot iniciado exitosamente"})
+    return {"success": True, "message": "Bot iniciado"}
+
+async def _stop_engine() -> Dict:
+    """Detener el motor alojado en este worker"""
+    if not _engine_state().get("running"):
+        return {"success": False, "error": "Bot no está ejecutándose"}
+    
+    if engine_controller is not None:
+        await engine_controller.stop()
+    elif bot_instance:
+        # stop() espera a los hilos del bot y guarda el snapshot
+        await blocking_pool.run(bot_instance.stop)
+    
+    state = {"running": False, "last_update": datetime.now().isoformat(), "pid": os.getpid()}
+    await blocking_pool.run(shared_store.put, 'engine', state)
+    await _announce({"status": state, "log": "Bot detenido"})
+    return {"success": True, "message": "Bot detenido"}
+
+async def _forward_control(command: str) -> Dict:
+    """Reenviar una orden al worker que aloja el motor"""
+    await blocking_pool.run(broker.publish, 'control', {'command': command})
+    return {"success": True, "message": "Orden enviada al worker del motor"}
+
+@app.post("/api/bot/start")
+async def start_bot():
+    """Iniciar el bot de trading"""
+    try:
+        if not engine_lock.owned:
+            if _engine_state().get("running"):
+                return {"success": False, "error": "Bot ya está ejecutándose"}
+            return await _forward_control('start')
+        return await _start_engine()
         
     except Exception as e:
         logger.error(f"Error iniciando bot: {e}")
@@ -1329,42 +1788,35 @@ async def start_bot():
 async def stop_bot():
     """Detener el bot de trading"""
     try:
-        global bot_status
-        
-        if not bot_status["running"]:
-            return {"success": False, "error": "Bot no está ejecutándose"}
-        
-        if bot_instance:
-            bot_instance.stop()
-        
-        bot_status["running"] = False
-        bot_status["last_update"] = datetime.now().isoformat()
-        
-        await manager.broadcast(json.dumps({
-            "status": bot_status,
-            "log": "Bot detenido"
-        }))
-        
-        return {"success": True, "message": "Bot detenido"}
+        if not engine_lock.owned:
+            if not _engine_state().get("running"):
+                return {"success": False, "error": "Bot no está ejecutándose"}
+            return await _forward_control('stop')
+        return await _stop_engine()
         
     except Exception as e:
         logger.error(f"Error deteniendo bot: {e}")
         return {"success": False, "error": str(e)}
 
+def _backtesting_engine():
+    # backtesting importa matplotlib y seaborn: sólo se carga al ejecutar un backtest
+    from backtesting import BacktestingEngine
+    return BacktestingEngine(initial_capital=Config.INVESTMENT_AMOUNT)
+
 @app.post("/api/backtest/run")
 async def run_backtest():
     """Ejecutar backtesting"""
     try:
-        engine = BacktestingEngine(initial_capital=Config.INVESTMENT_AMOUNT)
+        engine = await blocking_pool.run(_backtesting_engine)
         
         # Ejecutar backtesting en múltiples símbolos
         symbols = ['BTC/USDT', 'ETH/USDT', 'BNB/USDT']
-        result = engine.run_multi_symbol_backtest(symbols, '2023-01-01', '2023-12-31')
+        result = await blocking_pool.run(engine.run_multi_symbol_backtest, symbols, '2023-01-01', '2023-12-31')
         
         # Enviar resultados por WebSocket
-        await manager.broadcast(json.dumps({
+        await _announce({
             "log": f"Backtesting completado: {result.get('summary', 'Sin resumen')}"
-        }))
+        })
         
         return {"success": True, "result": result}
         
@@ -1373,10 +1825,10 @@ async def run_backtest():
         return {"success": False, "error": str(e)}
 
 @app.get("/api/config")
-async def get_config():
+async def get_config(request: Request):
     """Obtener configuración actual"""
     try:
-        return {
+        config = {
             "investment_amount": Config.INVESTMENT_AMOUNT,
             "target_profit_percentage": Config.TARGET_PROFIT_PERCENTAGE,
             "stop_loss_percentage": Config.STOP_LOSS_PERCENTAGE,
@@ -1385,10 +1837,25 @@ async def get_config():
             "symbols": Config.SYMBOLS,
             "testnet": Config.BINANCE_TESTNET
         }
+        # La versión es el propio contenido: sólo cambia si cambia la configuración
+        version = json.dumps(config, sort_keys=True)
+        return await http_cache.respond(request, 'config', version, lambda: config)
     except Exception as e:
         logger.error(f"Error obteniendo configuración: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/metrics")
+async def get_metrics():
+    """Métricas en formato de texto de Prometheus"""
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+IMPORT_SECONDS = time.perf_counter() - _import_started
+startup_times["import_seconds"] = round(IMPORT_SECONDS, 3)
+metrics.gauge('web_import_seconds', 'Tiempo de importación de la interfaz web').set(IMPORT_SECONDS)
+if IMPORT_SECONDS > Config.WEB_IMPORT_BUDGET_SECONDS:
+    logger.warning(f"⚠️ Importar la interfaz web tardó {IMPORT_SECONDS:.2f}s "
+                   f"(presupuesto {Config.WEB_IMPORT_BUDGET_SECONDS}s)")
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info")
 
@@ -17,6 +17,7 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from config import Config
 from exchange_manager import ExchangeManager
 from technical_analysis import TechnicalAnalysis
+from market_data import get_pipeline
 from risk_manager import RiskManager
 from logger_config import setup_logger
 
@@ -25,6 +26,7 @@ class WorkingTradingBot:
         self.logger = setup_logger('working_bot')
         self.exchange = ExchangeManager()
         self.ta = TechnicalAnalysis()
+        self.market_data = get_pipeline(self.exchange, self.ta)
         self.risk_manager = RiskManager()
         self.is_running = False
         self.last_activity = datetime.now()
@@ -55,23 +57,19 @@ class WorkingTradingBot:
         try:
             self.logger.info("🔄 Ejecutando ciclo de trading...")
             
+            # Una sola actualización de velas e indicadores para todos los símbolos
+            updates = self.market_data.refresh()
+            
             for symbol in Config.SYMBOLS:
                 try:
                     self.logger.info(f"📊 Analizando {symbol}...")
                     
-                    # Obtener datos OHLCV
-                    ohlcv_data = self.exchange.get_ohlcv(symbol, Config.TIMEFRAME, 100)
-                    if not ohlcv_data:
+                    # Señales del pipeline compartido (velas incrementales)
+                    update = updates.get(symbol)
+                    if update is None:
                         self.logger.warning(f"⚠️ No se pudieron obtener datos para {symbol}")
                         continue
-                    
-                    # Preparar DataFrame
-                    df = self.ta.prepare_dataframe(ohlcv_data)
-                    if df.empty:
-                        continue
-                    
-                    # Generar señales
-                    signals = self.ta.get_trading_signals(df)
+                    signals = update.signals
                     
                     # Log de señales
                     if signals['buy'] or signals['sell']:
@@ -103,7 +101,7 @@ class WorkingTradingBot:
                 },
                 "portfolio": portfolio_metrics,
                 "balance": {"USDT": {"free": account_balance}},
-                "positions": list(self.risk_manager.open_positions.values())
+                "positions": [pos.to_dict() for pos in self.risk_manager.open_positions.values()]
             }
         except Exception as e:
             self.logger.error(f"Error obteniendo estado: {e}")
@@ -0,0 +1,354 @@
+"""
+Canal publicación/suscripción por temas para el WebSocket del dashboard
+
+Cada cliente tiene su propia cola de envío acotada y una tarea escritora que
+la vacía: publicar sólo encola el mensaje (ya serializado) en los clientes
+suscritos, de modo que un cliente lento no retrasa a los demás. Si la cola de
+un cliente se llena se descarta el mensaje más antiguo, y un snapshot nuevo
+de un tema sustituye a los mensajes pendientes de ese tema. El cliente
+detecta el hueco de versión y pide un resync.
+"""
+import asyncio
+import json
+import logging
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from fastapi import WebSocket
+
+from config import Config
+
+# Temas publicados por /ws y cada cuántos segundos se recalcula su snapshot
+TOPIC_INTERVALS = {
+    'status': 5,
+    'logs': 1,
+    'indicators': 10,
+    'performance': 30,
+    'portfolio': 15,
+    'snapshot': 5,
+}
+
+# Claves que cambian siempre (marca de tiempo): no cuentan como cambio de datos
+VOLATILE_KEYS = {'last_update', 'timestamp', 'built_at'}
+
+LOG_LINES = 50
+
+
+def compute_delta(old: Any, new: Any) -> Optional[Any]:
+    """Diferencia entre dos snapshots (None si no hay cambios).
+
+    Los dicts se comparan recursivamente; una clave eliminada se envía como
+    null. Cualquier otro valor distinto se envía completo.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        delta = {}
+        for key, value in new.items():
+            if key not in old:
+                delta[key] = value
+            else:
+                sub = compute_delta(old[key], value)
+                if sub is not None:
+                    delta[key] = sub
+        for key in old:
+            if key not in new:
+                delta[key] = None
+        return delta or None
+    return None if old == new else new
+
+
+def _has_data_changes(delta: Dict) -> bool:
+    return any(key not in VOLATILE_KEYS for key in delta)
+
+
+class ClientChannel:
+    """Cola de envío acotada y tarea escritora de un cliente"""
+
+    __slots__ = ('websocket', 'queue', 'send_timeout', 'dropped', 'coalesced', 'sent',
+                 '_ready', '_task', '_on_error')
+
+    def __init__(self, websocket: WebSocket, max_queue: int, send_timeout: float,
+                 on_error: Callable[['ClientChannel'], None]):
+        self.websocket = websocket
+        # (tema, tipo, mensaje); tema None para mensajes sin tema (broadcast)
+        self.queue: Deque[Tuple[Optional[str], str, str]] = deque(maxlen=max_queue)
+        self.send_timeout = send_timeout
+        self.dropped = 0
+        self.coalesced = 0
+        self.sent = 0
+        self._ready = asyncio.Event()
+        self._on_error = on_error
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._writer())
+
+    def enqueue(self, topic: Optional[str], kind: str, message: str):
+        """Encolar sin bloquear: coalescer snapshots y descartar lo más antiguo si está llena"""
+        queue = self.queue
+        if kind == 'snapshot' and topic is not None and queue:
+            pending = len(queue)
+            kept = [item for item in queue if item[0] != topic]
+            if len(kept) != pending:
+                self.coalesced += pending - len(kept)
+                queue.clear()
+                queue.extend(kept)
+        if len(queue) == queue.maxlen:
+            self.dropped += 1
+        queue.append((topic, kind, message))
+        self._ready.set()
+
+    async def _writer(self):
+        queue = self.queue
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            while queue:
+                _, _, message = queue.popleft()
+                try:
+                    await asyncio.wait_for(self.websocket.send_text(message), self.send_timeout)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    self._on_error(self)
+                    return
+                self.sent += 1
+
+    async def drain(self):
+        """Esperar a que la cola se vacíe (o a que el escritor termine)"""
+        while self.queue and self._task is not None and not self._task.done():
+            await asyncio.sleep(0.001)
+
+    def close(self):
+        task = self._task
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+        self._task = None
+        self.queue.clear()
+
+
+class ConnectionManager:
+    """Canal publicación/suscripción por temas sobre /ws.
+
+    Cada snapshot se calcula una vez en el servidor y se serializa una sola vez
+    por publicación; los clientes reciben el snapshot completo al suscribirse y
+    después sólo deltas versionadas, a través de su propia cola de envío.
+    """
+
+    def __init__(self, max_queue: Optional[int] = None, send_timeout: Optional[float] = None):
+        self.logger = logging.getLogger(__name__)
+        self.max_queue = max_queue or Config.WS_CLIENT_QUEUE_SIZE
+        self.send_timeout = send_timeout or Config.WS_SEND_TIMEOUT_SECONDS
+        self.channels: Dict[WebSocket, ClientChannel] = {}
+        self.subscriptions: Dict[WebSocket, Set[str]] = {}
+        self.snapshots: Dict[str, Any] = {}
+        self.versions: Dict[str, int] = {}
+
+        # Estadísticas de clientes ya desconectados
+        self._closed_dropped = 0
+        self._closed_coalesced = 0
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.channels)
+
+    async def connect(self, websocket: WebSocket):
+        await websocket.accept()
+        channel = ClientChannel(websocket, self.max_queue, self.send_timeout, self._on_send_error)
+        self.channels[websocket] = channel
+        self.subscriptions[websocket] = set()
+        channel.start()
+
+    def disconnect(self, websocket: WebSocket):
+        channel = self.channels.pop(websocket, None)
+        if channel is not None:
+            self._closed_dropped += channel.dropped
+            self._closed_coalesced += channel.coalesced
+            channel.close()
+        self.subscriptions.pop(websocket, None)
+
+    def _on_send_error(self, channel: ClientChannel):
+        """El envío falló o superó el timeout: dar de baja al cliente y cerrar su socket"""
+        self.logger.warning("⚠️ Cliente WebSocket desconectado por error o lentitud en el envío")
+        self.disconnect(channel.websocket)
+        asyncio.get_running_loop().create_task(self._close_quietly(channel.websocket))
+
+    @staticmethod
+    async def _close_quietly(websocket: WebSocket):
+        try:
+            await asyncio.wait_for(websocket.close(code=1013), 1.0)
+        except Exception:
+            pass
+
+    def has_subscribers(self, topic: str) -> bool:
+        return any(topic in topics for topics in self.subscriptions.values())
+
+    async def subscribe(self, websocket: WebSocket, topics: List[str]):
+        """Suscribir a temas y encolar su snapshot actual"""
+        subscribed = self.subscriptions.setdefault(websocket, set())
+        channel = self.channels.get(websocket)
+        for topic in topics:
+            if topic not in TOPIC_INTERVALS:
+                continue
+            subscribed.add(topic)
+            if channel is not None and topic in self.snapshots:
+                channel.enqueue(topic, 'snapshot', self._message(topic, 'snapshot', self.snapshots[topic]))
+
+    def unsubscribe(self, websocket: WebSocket, topics: List[str]):
+        self.subscriptions.get(websocket, set()).difference_update(topics)
+
+    async def publish(self, topic: str, data: Any) -> bool:
+        """Publicar un snapshot; sólo se envía la diferencia con el anterior"""
+        previous = self.snapshots.get(topic)
+        if previous is None:
+            kind, payload = 'snapshot', data
+        else:
+            payload = compute_delta(previous, data)
+            if payload is None or (isinstance(payload, dict) and not _has_data_changes(payload)):
+                return False
+            kind = 'delta'
+
+        self.snapshots[topic] = data
+        await self._fan_out(topic, kind, self._next_message(topic, kind, payload))
+        return True
+
+    async def publish_append(self, topic: str, items: List, keep: int = LOG_LINES):
+        """Publicar elementos nuevos de un tema de sólo-añadir (logs)"""
+        if not items:
+            return
+        snapshot = self.snapshots.setdefault(topic, {'lines': []})
+        snapshot['lines'] = (snapshot['lines'] + items)[-keep:]
+        await self._fan_out(topic, 'append', self._next_message(topic, 'append', {'lines': items}))
+
+    def _next_message(self, topic: str, kind: str, payload: Any) -> str:
+        self.versions[topic] = self.versions.get(topic, 0) + 1
+        return self._message(topic, kind, payload)
+
+    def _message(self, topic: str, kind: str, payload: Any) -> str:
+        return json.dumps({
+            'topic': topic,
+            'type': kind,
+            'version': self.versions.get(topic, 0),
+            'data': payload
+        }, default=str)
+
+    async def _fan_out(self, topic: str, kind: str, message: str):
+        # Copia de la lista: los escritores pueden dar de baja clientes mientras tanto
+        for websocket, topics in list(self.subscriptions.items()):
+            if topic in topics:
+                channel = self.channels.get(websocket)
+                if channel is not None:
+                    channel.enqueue(topic, kind, message)
+
+    async def send_personal_message(self, message: str, websocket: WebSocket):
+        channel = self.channels.get(websocket)
+        if channel is not None:
+            channel.enqueue(None, 'message', message)
+
+    async def broadcast(self, message: str):
+        for channel in list(self.channels.values()):
+            channel.enqueue(None, 'message', message)
+
+    async def flush(self, timeout: Optional[float] = None):
+        """Esperar a que todas las colas se vacíen, en paralelo"""
+        drains = asyncio.gather(*(channel.drain() for channel in list(self.channels.values())))
+        try:
+            await asyncio.wait_for(drains, timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def close_all(self):
+        """Cerrar todas las conexiones (apagado de la interfaz web)"""
+        websockets = list(self.channels)
+        for websocket in websockets:
+            self.disconnect(websocket)
+        await asyncio.gather(*(self._close_quietly(ws) for ws in websockets))
+
+    def stats(self) -> Dict:
+        channels = list(self.channels.values())
+        return {
+            'clients': len(channels),
+            'queued': sum(len(channel.queue) for channel in channels),
+            'dropped': self._closed_dropped + sum(channel.dropped for channel in channels),
+            'coalesced': self._closed_coalesced + sum(channel.coalesced for channel in channels)
+        }
+
+
+if __name__ == "__main__":
+    # Prueba de carga: 1000 clientes simulados, un 5% de ellos lentos
+    import statistics
+    import time
+
+    CLIENTS = 1000
+    SLOW_EVERY = 20
+    SLOW_DELAY = 0.05
+    MESSAGES = 50
+
+    class FakeWebSocket:
+        def __init__(self, slow: bool):
+            self.slow = slow
+            self.latencies: List[float] = []
+            self.received = 0
+
+        async def accept(self):
+            pass
+
+        async def close(self, code: int = 1000):
+            pass
+
+        async def send_text(self, message: str):
+            if self.slow:
+                await asyncio.sleep(SLOW_DELAY)
+            else:
+                await asyncio.sleep(0)
+            self.received += 1
+            sent = json.loads(message)['data'].get('sent')
+            if sent is not None:
+                self.latencies.append((time.perf_counter() - sent) * 1000)
+
+    def percentile(values: List[float], q: float) -> float:
+        values = sorted(values)
+        return values[min(int(len(values) * q), len(values) - 1)] if values else 0.0
+
+    async def naive(clients: List[FakeWebSocket]):
+        """Envío secuencial anterior: un solo mensaje a todos los clientes"""
+        message = json.dumps({'data': {'sent': time.perf_counter()}})
+        for ws in clients:
+            await ws.send_text(message)
+
+    async def queued(clients: List[FakeWebSocket]) -> Dict:
+        manager = ConnectionManager(max_queue=10, send_timeout=5)
+        for ws in clients:
+            await manager.connect(ws)
+            await manager.subscribe(ws, ['status'])
+
+        started = time.perf_counter()
+        for seq in range(MESSAGES):
+            await manager.publish('status', {'seq': seq, 'sent': time.perf_counter()})
+            await asyncio.sleep(0.02)
+        publish_s = time.perf_counter() - started
+        await manager.flush(timeout=5)
+        stats = manager.stats()
+        await manager.close_all()
+        return {'publish_s': publish_s, **stats}
+
+    def fast_latencies(clients: List[FakeWebSocket]) -> List[float]:
+        return [lat for ws in clients if not ws.slow for lat in ws.latencies]
+
+    clients = [FakeWebSocket(slow=i % SLOW_EVERY == 0) for i in range(CLIENTS)]
+    asyncio.run(naive(clients))
+    naive_lat = fast_latencies(clients)
+    print(f"Envío secuencial (1 mensaje):  clientes rápidos p50 {percentile(naive_lat, 0.5):.1f} ms, "
+          f"máx {max(naive_lat):.1f} ms")
+
+    clients = [FakeWebSocket(slow=i % SLOW_EVERY == 0) for i in range(CLIENTS)]
+    result = asyncio.run(queued(clients))
+    lat = fast_latencies(clients)
+    slow = [ws for ws in clients if ws.slow]
+    print(f"Colas por cliente ({MESSAGES} mensajes, {CLIENTS} clientes, {len(slow)} lentos):")
+    print(f"  clientes rápidos: p50 {statistics.median(lat):.1f} ms, p99 {percentile(lat, 0.99):.1f} ms, "
+          f"máx {max(lat):.1f} ms ({len(lat)} entregas)")
+    print(f"  clientes lentos:  {sum(ws.received for ws in slow)} entregados, "
+          f"{result['dropped']} descartados por cola llena")
+    assert len(lat) == (CLIENTS - len(slow)) * MESSAGES, "Algún cliente rápido perdió mensajes"
+    assert percentile(lat, 0.99) < 100, "Latencia p99 de clientes rápidos > 100 ms"
+    print("✅ Latencia acotada para los clientes rápidos con clientes lentos conectados")